@@ -78,10 +78,18 @@ with app.app_context():
     if USE_GRIDFS_STORAGE:
         from utils.gridfs_utils import init_gridfs_storage
         init_gridfs_storage()
+    
+    # Replay journal writes made while MongoDB was unavailable
+    from models.journal import start_outbox_reconciler
+    start_outbox_reconciler(app)
 
 # Register routes with the application
 register_routes_with_app()
 
+# Register CLI commands with the application
+from commands import register_commands
+register_commands(app)
+
 # Application instance for Vercel (required for Vercel deployment)
 application = app
 
@@ -0,0 +1,19 @@
+"""
+Commands package initialization.
+This module registers all CLI commands with the Flask application.
+"""
+
+def register_commands(app):
+    """Register all command groups with the application
+    
+    Args:
+        app: Flask application instance
+    """
+    from commands.journal import journal_cli
+    from commands.gallery import gallery_cli
+    from commands.db import db_cli
+    
+    # Register command groups
+    app.cli.add_command(journal_cli)
+    app.cli.add_command(gallery_cli)
+    app.cli.add_command(db_cli)
@@ -0,0 +1,27 @@
+"""
+Database commands module.
+This module handles MongoDB maintenance commands run through the flask CLI,
+e.g. `flask db rebuild-indexes`.
+"""
+
+import click
+from flask.cli import AppGroup
+from utils.db import is_connected, rebuild_mismatched_indexes
+
+# Create command group
+db_cli = AppGroup('db', help='Database maintenance commands.')
+
+
+@db_cli.command('rebuild-indexes')
+def rebuild_indexes():
+    """Recreate required indexes whose options have changed"""
+    if not is_connected():
+        raise click.ClickException("MongoDB is not connected")
+    
+    result = rebuild_mismatched_indexes()
+    for collection_name, name, _ in result['rebuilt']:
+        click.echo(f"Rebuilt {name} on {collection_name}")
+    for collection_name, name, error in result['failed']:
+        click.echo(f"Could not rebuild {name} on {collection_name}, kept the old index: {error}",
+                   err=True)
+    click.echo(f"Rebuilt {len(result['rebuilt'])} indexes, {len(result['failed'])} failed")
@@ -0,0 +1,55 @@
+"""
+Gallery commands module.
+This module handles gallery maintenance commands run through the flask CLI,
+e.g. `flask gallery backfill-renditions`.
+"""
+
+import click
+from flask.cli import AppGroup
+from utils.image_renditions import renditions_enabled
+from config import USE_GRIDFS_STORAGE
+
+# Create command group
+gallery_cli = AppGroup('gallery', help='Gallery maintenance commands.')
+
+
+@gallery_cli.command('backfill-renditions')
+@click.option('--force', is_flag=True, help='Recreate renditions that already exist.')
+def backfill_renditions(force):
+    """Create thumbnail and medium renditions for existing images"""
+    if not renditions_enabled():
+        raise click.ClickException("Pillow is not installed; install it to create renditions")
+    
+    if USE_GRIDFS_STORAGE:
+        from utils.gridfs_utils import backfill_renditions as backfill
+    else:
+        from utils.local_storage import backfill_renditions as backfill
+    processed = backfill(force)
+    click.echo(f"Created renditions for {processed} images")
+
+
+@gallery_cli.command('rebuild-index')
+def rebuild_index():
+    """Rebuild the gallery image index from the stored images"""
+    if USE_GRIDFS_STORAGE:
+        from utils.gridfs_utils import rebuild_image_index
+    else:
+        from utils.local_storage import rebuild_image_index
+    indexed = rebuild_image_index()
+    click.echo(f"Indexed {indexed} images")
+
+
+@gallery_cli.command('dedup')
+@click.option('--apply', is_flag=True, help='Delete the duplicate copies instead of only listing them.')
+def dedup(apply):
+    """Find images stored more than once, by content hash"""
+    if USE_GRIDFS_STORAGE:
+        from utils.gridfs_utils import dedup_images
+    else:
+        from utils.local_storage import dedup_images
+    report = dedup_images(apply)
+    for kept, copies in report['groups']:
+        click.echo(f"{kept}: {', '.join(copies)}")
+    action = 'Removed' if apply else 'Found'
+    click.echo(f"{action} {report['duplicates']} duplicate images "
+               f"({report['bytes'] / 1024 / 1024:.1f} MB{'' if apply else ' reclaimable'})")
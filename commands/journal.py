@@ -0,0 +1,77 @@
+"""
+Journal commands module.
+This module handles journal maintenance commands run through the flask CLI,
+e.g. `flask journal backfill`.
+"""
+
+import click
+from flask.cli import AppGroup
+from models.journal import (
+    backfill_entry_fields, rebuild_search_index, export_entries, import_entries,
+    outbox_reconciler, get_outbox_backlog, get_outbox_rejected, rebuild_journal_stats
+)
+
+# Create command group
+journal_cli = AppGroup('journal', help='Journal maintenance commands.')
+
+
+@journal_cli.command('backfill')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Number of MongoDB updates per bulk write.')
+def backfill(batch_size):
+    """Store excerpts, content counts and normalized dates on existing entries"""
+    updated = backfill_entry_fields(batch_size)
+    click.echo(f"Updated {updated} entries")
+
+
+@journal_cli.command('reindex')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Number of MongoDB updates per bulk write.')
+def reindex(batch_size):
+    """Rebuild the search index for all entries"""
+    indexed = rebuild_search_index(batch_size)
+    click.echo(f"Indexed {indexed} entries")
+
+
+@journal_cli.command('export')
+@click.argument('output', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Number of entries fetched per round trip.')
+def export(output, batch_size):
+    """Write all entries to OUTPUT as NDJSON (stdout by default)"""
+    for line in export_entries(batch_size):
+        output.write(line)
+
+
+@journal_cli.command('import')
+@click.argument('input', type=click.File('rb'))
+@click.option('--batch-size', default=500, show_default=True,
+              help='Number of entries stored per batch.')
+def import_(input, batch_size):
+    """Import entries from an NDJSON file ('-' for stdin)"""
+    report = import_entries(input, batch_size)
+    for error in report['errors']:
+        click.echo(f"Line {error['line']}: {error['error']}", err=True)
+    click.echo(f"Imported {report['imported']} entries, {report['failed']} failed")
+
+
+@journal_cli.command('replay-outbox')
+def replay_outbox():
+    """Replay journal writes made while MongoDB was unavailable"""
+    replayed = outbox_reconciler.drain()
+    if replayed < 0:
+        click.echo("The outbox is being replayed by another process")
+        return
+    click.echo(f"Replayed {replayed} operations, {get_outbox_backlog()} pending")
+    rejected = get_outbox_rejected()
+    if rejected:
+        click.echo(f"{rejected} operations were rejected by MongoDB and kept in the dead-letter file",
+                   err=True)
+
+
+@journal_cli.command('rebuild-stats')
+def rebuild_stats():
+    """Recompute the journal statistics from the stored entries"""
+    totals = rebuild_journal_stats()
+    for store, total in totals.items():
+        click.echo(f"Rebuilt {store} statistics: {total} entries")
@@ -29,6 +29,20 @@ SECRET_KEY = os.getenv('SECRET_KEY', os.urandom(24))
 MONGODB_URI = os.getenv("MONGODB_URI")
 DB_NAME = os.getenv("MONGODB_DB", "journal_db")
 JOURNAL_COLLECTION = "entries"
+# Named counters (version stamps, sequences), one document per counter
+COUNTERS_COLLECTION = "counters"
+# Materialized statistics documents
+STATS_COLLECTION = "stats"
+# Gallery image index, one small document per original image
+IMAGE_META_COLLECTION = "image_meta"
+
+# MongoDB circuit breaker settings
+# Consecutive connection failures before the breaker opens
+MONGODB_FAILURE_THRESHOLD = int(os.getenv('MONGODB_FAILURE_THRESHOLD', '3'))
+# Seconds the breaker stays open before letting a single trial request through
+MONGODB_RECOVERY_TIMEOUT = float(os.getenv('MONGODB_RECOVERY_TIMEOUT', '30'))
+# Seconds between background health probes (0 disables the probe thread)
+MONGODB_PROBE_INTERVAL = float(os.getenv('MONGODB_PROBE_INTERVAL', '15'))
 
 # File paths and directories
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -44,13 +58,91 @@ if IS_VERCEL:
     UPLOAD_FOLDER = TEMP_UPLOAD_DIR
     JOURNAL_FILE = '/tmp/journal.json'
     MAX_CONTENT_LENGTH = 4 * 1024 * 1024  # 4MB (Vercel limit)
+    GALLERY_BATCH_MAX_LENGTH = MAX_CONTENT_LENGTH
 else:
     TEMP_UPLOAD_DIR = os.path.join(BASE_DIR, 'tmp')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    # Whole request of a batch upload; each file is still held to MAX_CONTENT_LENGTH
+    GALLERY_BATCH_MAX_LENGTH = int(os.getenv('GALLERY_BATCH_MAX_LENGTH', str(256 * 1024 * 1024)))
+# Files of a batch upload processed at the same time
+GALLERY_UPLOAD_WORKERS = int(os.getenv('GALLERY_UPLOAD_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# Local journal storage: append-only operation log plus its offset index.
+# An existing JOURNAL_FILE is migrated into the log on first use.
+JOURNAL_LOG_FILE = os.path.splitext(JOURNAL_FILE)[0] + '.ndjson'
+JOURNAL_INDEX_FILE = os.path.splitext(JOURNAL_FILE)[0] + '.idx.json'
+# Superseded log records tolerated before the log is compacted
+JOURNAL_COMPACT_MIN_DEAD = int(os.getenv('JOURNAL_COMPACT_MIN_DEAD', '100'))
+# Local journal backend: 'log' (append-only log) or 'sqlite'
+JOURNAL_STORAGE_BACKEND = os.getenv('JOURNAL_STORAGE_BACKEND', 'log').lower()
+JOURNAL_SQLITE_FILE = os.path.splitext(JOURNAL_FILE)[0] + '.sqlite3'
+# Inverted index used to search journal entries in local storage (append-only log)
+JOURNAL_SEARCH_INDEX_FILE = os.path.splitext(JOURNAL_FILE)[0] + '.search.ndjson'
+
+# Journal writes made while MongoDB is down, replayed into it once it is back
+JOURNAL_OUTBOX_FILE = os.path.splitext(JOURNAL_FILE)[0] + '.outbox.ndjson'
+# Seconds between outbox replay checks (0 disables the reconciler thread)
+JOURNAL_OUTBOX_INTERVAL = float(os.getenv('JOURNAL_OUTBOX_INTERVAL', '10'))
+# Operations replayed per MongoDB bulk write
+JOURNAL_OUTBOX_BATCH_SIZE = int(os.getenv('JOURNAL_OUTBOX_BATCH_SIZE', '100'))
+
+# In-process journal read caches, kept coherent across workers by a version stamp
+JOURNAL_CACHE_SIZE = int(os.getenv('JOURNAL_CACHE_SIZE', '256'))
+JOURNAL_LISTING_CACHE_SIZE = int(os.getenv('JOURNAL_LISTING_CACHE_SIZE', '64'))
+# Upper bound on how long a cached read is trusted, in seconds
+JOURNAL_CACHE_TTL = float(os.getenv('JOURNAL_CACHE_TTL', '300'))
+# Seconds a worker may reuse the MongoDB version stamp before reading it
+# again. 0 (the default) reads it once per request, so writes made by other
+# workers are seen at once; a higher value saves round trips but lets other
+# workers' writes stay invisible for up to this long
+JOURNAL_VERSION_TTL = float(os.getenv('JOURNAL_VERSION_TTL', '0'))
+
+# When local storage files are fsynced: 'always' (every write and log
+# append), 'replace' (atomic file replacements only) or 'never'
+FILE_FSYNC_POLICY = os.getenv('FILE_FSYNC_POLICY', 'replace').lower()
+
+# Journal statistics kept up to date on every local write
+JOURNAL_STATS_FILE = os.path.splitext(JOURNAL_FILE)[0] + '.stats.json'
+
+# Number of entries shown per page of the journal list
+JOURNAL_PAGE_SIZE = int(os.getenv('JOURNAL_PAGE_SIZE', '20'))
+
+# Gallery image index used with local storage
+IMAGE_META_FILE = os.path.join(os.path.dirname(JOURNAL_FILE), 'image_meta.json')
+# Last number handed out to an uploaded image with local storage
+IMAGE_SEQUENCE_FILE = os.path.join(os.path.dirname(JOURNAL_FILE), 'image_sequence.json')
+# Number of images shown per page of the gallery
+GALLERY_PAGE_SIZE = int(os.getenv('GALLERY_PAGE_SIZE', '24'))
+
+# Journal entry ID scheme: 'snowflake', 'objectid' or 'timestamp' (legacy)
+JOURNAL_ID_GENERATOR = os.getenv('JOURNAL_ID_GENERATOR', 'snowflake').lower()
+# Fixed Snowflake node ID (0-1023), only for a single writing process; if
+# unset each process reserves one (MongoDB counter plus a local lease file)
+JOURNAL_NODE_ID = int(os.environ['JOURNAL_NODE_ID']) if os.getenv('JOURNAL_NODE_ID') else None
+# Directory of the node ID lease files
+JOURNAL_NODE_LEASE_DIR = os.path.join(os.path.dirname(JOURNAL_FILE), 'node_ids')
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'JPG', 'JPEG', 'PNG', 'GIF'}
 
 # Storage Configuration
 USE_GRIDFS_STORAGE = os.getenv('USE_GRIDFS_STORAGE', 'true').lower() == 'true'
-GRIDFS_COLLECTION = 'images'
\ No newline at end of file
+GRIDFS_COLLECTION = 'images'
+
+# Fixed-width renditions generated for every gallery image, name -> width in pixels
+IMAGE_RENDITIONS = {'thumb': 480, 'medium': 960}
+# Encoder quality (1-100) for JPEG and WebP renditions
+IMAGE_RENDITION_QUALITY = int(os.getenv('IMAGE_RENDITION_QUALITY', '80'))
+# Local renditions are stored next to the originals, in this subdirectory
+IMAGE_RENDITION_DIR = os.path.join(UPLOAD_FOLDER, 'renditions')
+# Seconds browsers may cache versioned image URLs, whose content never changes
+IMAGE_CACHE_MAX_AGE = int(os.getenv('IMAGE_CACHE_MAX_AGE', str(365 * 24 * 3600)))
+# Local disk cache of GridFS images and its byte budget (0 disables it);
+# the least recently used images are evicted first
+IMAGE_DISK_CACHE_DIR = os.path.join(TEMP_UPLOAD_DIR, 'cache')
+IMAGE_DISK_CACHE_SIZE = int(os.getenv('IMAGE_DISK_CACHE_SIZE',
+                                      str((64 if IS_VERCEL else 256) * 1024 * 1024)))
+# In-process cache of small images and renditions, bounded by total bytes
+# (0 disables it); images larger than IMAGE_MEMORY_CACHE_MAX_ITEM are not kept
+IMAGE_MEMORY_CACHE_SIZE = int(os.getenv('IMAGE_MEMORY_CACHE_SIZE', str(32 * 1024 * 1024)))
+IMAGE_MEMORY_CACHE_MAX_ITEM = int(os.getenv('IMAGE_MEMORY_CACHE_MAX_ITEM', str(256 * 1024)))
@@ -4,20 +4,208 @@ This module handles all journal entry-related operations such as
 create, read, update, and delete (CRUD).
 """
 
-import os
+import re
 import json
+import time
+import logging
+import base64
 from datetime import datetime
-from flask import current_app
-from utils.db import get_collection, is_connected
-from utils.file_utils import read_json_file, write_json_file
-from utils.date_utils import get_current_time
-from config import JOURNAL_COLLECTION, IS_VERCEL
-
-# Journal file path - used when MongoDB is not available
-JOURNAL_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data/journal.json')
-if IS_VERCEL:
-    # Use /tmp directory on Vercel when MongoDB is not available
-    JOURNAL_FILE = '/tmp/journal.json'
+from flask import current_app, g, has_request_context
+from pymongo import UpdateOne, ReplaceOne, DeleteOne, ReturnDocument
+from pymongo.errors import PyMongoError, ConnectionFailure, OperationFailure, BulkWriteError
+from utils.db import (
+    get_collection, is_connected, record_success, record_failure, ensure_indexes,
+    get_counter, increment_counter, get_db, get_failure_count, get_connection_state
+)
+from utils.journal_store import JournalLogStore
+from utils.search_index import SearchIndex, CJK_CHARS, tokenize
+from utils.id_generator import get_id_generator, lease_node_id, MAX_NODE_ID
+from utils.outbox import Outbox, OutboxReconciler
+from utils.cache import LRUCache
+from utils.file_utils import read_json_file, write_json_file, file_lock, update_json_file
+from utils.journal_stats import (
+    STATS_VERSION, empty_stats, entry_delta, merge_deltas, apply_delta, format_stats
+)
+from utils.date_utils import get_current_time, get_date_fields
+from config import (
+    JOURNAL_COLLECTION,
+    JOURNAL_FILE,
+    JOURNAL_LOG_FILE,
+    JOURNAL_INDEX_FILE,
+    JOURNAL_COMPACT_MIN_DEAD,
+    JOURNAL_STORAGE_BACKEND,
+    JOURNAL_SQLITE_FILE,
+    JOURNAL_SEARCH_INDEX_FILE,
+    JOURNAL_PAGE_SIZE,
+    JOURNAL_ID_GENERATOR,
+    JOURNAL_NODE_ID,
+    JOURNAL_NODE_LEASE_DIR,
+    JOURNAL_OUTBOX_FILE,
+    JOURNAL_OUTBOX_INTERVAL,
+    JOURNAL_OUTBOX_BATCH_SIZE,
+    JOURNAL_CACHE_SIZE,
+    JOURNAL_LISTING_CACHE_SIZE,
+    JOURNAL_CACHE_TTL,
+    JOURNAL_VERSION_TTL,
+    JOURNAL_STATS_FILE,
+    STATS_COLLECTION,
+    MONGODB_URI,
+    CHINA_TIMEZONE
+)
+
+
+def create_local_store(backend=JOURNAL_STORAGE_BACKEND):
+    """Create the local journal store for the configured backend
+    
+    Args:
+        backend (str): 'log' for the append-only log, 'sqlite' for SQLite
+        
+    Returns:
+        object: Store exposing get, exists, all, count, put and delete
+    """
+    log_store = JournalLogStore(
+        JOURNAL_LOG_FILE,
+        JOURNAL_INDEX_FILE,
+        legacy_path=JOURNAL_FILE,
+        compact_min_dead=JOURNAL_COMPACT_MIN_DEAD
+    )
+    if backend == 'sqlite':
+        from utils.sqlite_store import SQLiteJournalStore
+        # A new database is seeded from the log (or journal.json)
+        return SQLiteJournalStore(JOURNAL_SQLITE_FILE, migrate_from=log_store)
+    return log_store
+
+
+# Local journal store - used when MongoDB is not available
+journal_store = create_local_store()
+
+# Inverted index over the local store; MongoDB uses its own text index
+search_index = SearchIndex(JOURNAL_SEARCH_INDEX_FILE, compact_min_dead=JOURNAL_COMPACT_MIN_DEAD)
+
+# Counter handing out Snowflake node IDs to worker processes on all hosts
+NODE_ID_COUNTER = 'journal_node_id'
+
+
+def _allocate_node_id():
+    """Reserve a Snowflake node ID for this process
+    
+    With MongoDB the ID comes from a shared counter, so processes on every
+    host get distinct IDs; it is also leased locally so a process that had
+    to lease an ID while MongoDB was down is skipped. Without MongoDB the
+    first free local lease is used, which is only unique on this host.
+    
+    Returns:
+        int: Node ID, or None if none could be reserved
+    """
+    if is_connected():
+        try:
+            for _ in range(MAX_NODE_ID + 1):
+                node_id = increment_counter(NODE_ID_COUNTER) % (MAX_NODE_ID + 1)
+                if lease_node_id(JOURNAL_NODE_LEASE_DIR, node_id) is not None:
+                    record_success()
+                    return node_id
+        except ConnectionFailure as e:
+            record_failure(e)
+    
+    node_id = lease_node_id(JOURNAL_NODE_LEASE_DIR)
+    if node_id is not None:
+        message = (f"Leased Snowflake node ID {node_id} without MongoDB; it is only "
+                   f"unique among processes on this host")
+        try:
+            current_app.logger.warning(message)
+        except RuntimeError:
+            logging.warning(message)
+    return node_id
+
+
+# Generates IDs for new entries; existing IDs of any scheme keep working
+generate_entry_id = get_id_generator(JOURNAL_ID_GENERATOR, JOURNAL_NODE_ID, _allocate_node_id)
+
+# Local writes made while MongoDB is configured but unavailable, pending replay
+journal_outbox = Outbox(JOURNAL_OUTBOX_FILE)
+
+# Read caches; values are stored with the journal version they were read at
+entry_cache = LRUCache(JOURNAL_CACHE_SIZE, ttl=JOURNAL_CACHE_TTL)
+listing_cache = LRUCache(JOURNAL_LISTING_CACHE_SIZE, ttl=JOURNAL_CACHE_TTL)
+# MongoDB version stamp last read in this process, and when it expires
+_version_stamp = (None, 0.0)
+
+# Counter bumped on every MongoDB journal write, shared by all workers
+JOURNAL_VERSION_COUNTER = 'journal_version'
+
+# ID of the journal statistics document in STATS_COLLECTION
+JOURNAL_STATS_ID = 'journal'
+
+# Fields needed to work out an entry's contribution to the statistics
+STATS_PROJECTION = {'_id': 0, 'id': 1, 'author': 1, 'timestamp': 1, 'word_count': 1}
+
+# Number of content characters kept in an entry's excerpt
+EXCERPT_LENGTH = 200
+
+# Fields loaded for list views; the full content is only read for single entries
+LIST_FIELDS = ('id', 'title', 'author', 'date', 'time', 'timestamp', 'ymd', 'excerpt',
+               'content_length')
+
+# A word is a run of letters/digits, or a single CJK character
+WORD_PATTERN = re.compile(rf'[{CJK_CHARS}]|[^\W_{CJK_CHARS}]+')
+
+# Tokenized copies of the searchable fields, stored on MongoDB documents only
+SEARCH_FIELDS = ('search_title', 'search_body')
+
+# Fields every imported record must have
+IMPORT_REQUIRED_FIELDS = ('title', 'content', 'author')
+
+# Maximum number of per-record errors kept in an import report
+MAX_IMPORT_ERRORS = 100
+
+
+def count_words(text):
+    """Count the words in a text, counting each CJK character as a word
+    
+    Args:
+        text (str): Text to count
+        
+    Returns:
+        int: Number of words
+    """
+    return len(WORD_PATTERN.findall(text or ''))
+
+
+def summarize_content(content):
+    """Compute the derived fields stored alongside an entry's content
+    
+    Args:
+        content (str): Entry content
+        
+    Returns:
+        dict: 'excerpt', 'content_length' and 'word_count'
+    """
+    content = content or ''
+    return {
+        'excerpt': content[:EXCERPT_LENGTH],
+        'content_length': len(content),
+        'word_count': count_words(content)
+    }
+
+
+def mongo_search_fields(entry):
+    """Compute the pre-tokenized fields used by the MongoDB text index
+    
+    MongoDB's text index does not segment Chinese, so it indexes the
+    tokens produced by tokenize() instead of the raw text.
+    
+    Args:
+        entry (dict): Entry with title, content and author
+        
+    Returns:
+        dict: 'search_title' and 'search_body' strings of space separated tokens
+    """
+    body = f"{entry.get('content') or ''} {entry.get('author') or ''}"
+    return {
+        'search_title': ' '.join(tokenize(entry.get('title'))),
+        'search_body': ' '.join(tokenize(body))
+    }
+
 
 class JournalEntry:
     """Journal entry model class"""
@@ -27,7 +215,7 @@ class JournalEntry:
         """Initialize a journal entry
         
         Args:
-            id (str): Entry ID, defaults to current timestamp
+            id (str): Entry ID, defaults to a new generated ID
             title (str): Entry title
             content (str): Entry content
             author (str): Entry author
@@ -35,15 +223,19 @@ class JournalEntry:
             time (str): Formatted time string
             timestamp (float): Unix timestamp
         """
-        now = get_current_time()
+        # Imported entries keep their own time; new ones use the current time
+        if timestamp is not None:
+            now = datetime.fromtimestamp(timestamp, CHINA_TIMEZONE)
+        else:
+            now = get_current_time()
         
-        self.id = id if id else str(int(now.timestamp()))
+        self.id = id if id else generate_entry_id()
         self.title = title
         self.content = content
         self.author = author
         self.date = date if date else now.strftime('%Y年%m月%d日')
         self.time = time if time else now.strftime('%H:%M:%S')
-        self.timestamp = timestamp if timestamp else now.timestamp()
+        self.timestamp = timestamp if timestamp is not None else now.timestamp()
     
     def to_dict(self):
         """Convert entry to dictionary
@@ -51,7 +243,7 @@ class JournalEntry:
         Returns:
             dict: Dictionary representation of entry
         """
-        return {
+        entry = {
             'id': self.id,
             'title': self.title,
             'content': self.content,
@@ -60,6 +252,9 @@ class JournalEntry:
             'time': self.time,
             'timestamp': self.timestamp
         }
+        entry.update(get_date_fields(self.timestamp))
+        entry.update(summarize_content(self.content))
+        return entry
     
     @classmethod
     def from_dict(cls, data):
@@ -82,57 +277,600 @@ class JournalEntry:
         )
 
 
-def get_all_entries(sort_key='timestamp', sort_desc=True):
-    """Get all journal entries
+def get_journal_version():
+    """Get a stamp that changes whenever the journal is written to
+    
+    With MongoDB this is a shared counter bumped by every write, read at
+    most once per request. If JOURNAL_VERSION_TTL is set, a worker also
+    reuses it across requests for that many seconds, trading that much
+    staleness for fewer round trips; writes in this worker drop the reused
+    stamp at once. Otherwise the stamp comes from the local store's files.
+    
+    Returns:
+        tuple: (source, version) stamp
+    """
+    global _version_stamp
+    if is_connected():
+        if has_request_context() and 'journal_version' in g:
+            return g.journal_version
+        version, expires = _version_stamp
+        if version is not None and JOURNAL_VERSION_TTL > 0 and time.monotonic() < expires:
+            if has_request_context():
+                g.journal_version = version
+            return version
+        try:
+            version = ('mongo', get_counter(JOURNAL_VERSION_COUNTER))
+            record_success()
+            _version_stamp = (version, time.monotonic() + JOURNAL_VERSION_TTL)
+            if has_request_context():
+                g.journal_version = version
+            return version
+        except ConnectionFailure as e:
+            # Fall back to file storage
+            record_failure(e)
+    
+    return ('local', journal_store.version())
+
+
+def journal_changed(mongodb=False):
+    """Invalidate cached reads after a journal write
     
     Args:
-        sort_key (str): Key to sort by
+        mongodb (bool): True if MongoDB was written, which bumps the shared
+            version counter so other workers drop their caches too
+    """
+    global _version_stamp
+    entry_cache.clear()
+    listing_cache.clear()
+    _version_stamp = (None, 0.0)
+    if has_request_context():
+        g.pop('journal_version', None)
+    if mongodb:
+        try:
+            increment_counter(JOURNAL_VERSION_COUNTER)
+            record_success()
+        except ConnectionFailure as e:
+            record_failure(e)
+
+
+def _cached(cache, key, load):
+    """Read through a cache, reloading when the journal version changed
+    
+    Args:
+        cache (LRUCache): Cache to use
+        key: Cache key
+        load (callable): Loads the value on a miss
+        
+    Returns:
+        The cached or freshly loaded value
+    """
+    version = get_journal_version()
+    hit = cache.get(key)
+    if hit is not None and hit[0] == version:
+        return hit[1]
+    
+    failures = get_failure_count()
+    value = load()
+    # Only cache values read from the source the version stamp belongs to:
+    # a MongoDB read that fell back to local storage records a failure, and
+    # a local read may have raced MongoDB coming back
+    if version[0] == 'mongo':
+        same_source = get_failure_count() == failures
+    else:
+        same_source = get_connection_state() in ('open', 'disabled')
+    if value is not None and same_source:
+        cache.set(key, (version, value))
+    return value
+
+
+def get_cache_stats():
+    """Get hit and miss counts of the journal read caches
+    
+    Returns:
+        dict: Statistics per cache
+    """
+    return {'entries': entry_cache.stats(), 'listings': listing_cache.stats()}
+
+
+def encode_cursor(entry, direction='next'):
+    """Encode an opaque page cursor from an entry's (timestamp, id) key
+    
+    Args:
+        entry (dict): Entry at the edge of the current page
+        direction (str): 'next' for the page after it, 'prev' for the page before it
+        
+    Returns:
+        str: URL-safe cursor string
+    """
+    payload = json.dumps([direction, entry.get('timestamp') or 0, entry.get('id')])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a page cursor created by encode_cursor
+    
+    Args:
+        cursor (str): Cursor string
+        
+    Returns:
+        tuple: (direction, (timestamp, id)) or None if the cursor is missing or invalid
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, timestamp, entry_id = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in ('next', 'prev') or not isinstance(timestamp, (int, float)):
+            return None
+        return direction, (timestamp, str(entry_id))
+    except (ValueError, TypeError):
+        return None
+
+
+def _projection(fields=None):
+    """Build a MongoDB projection that loads only the given fields"""
+    projection = {'_id': 0}
+    if fields:
+        projection.update({field: 1 for field in fields})
+    else:
+        projection.update({field: 0 for field in SEARCH_FIELDS})
+    return projection
+
+
+def _find_page(collection, sort_desc, limit, after=None, before=None, fields=None,
+               start=None, end=None):
+    """Query one page of entries from MongoDB ordered by (timestamp, id)
+    
+    Args:
+        collection: MongoDB journal collection
+        sort_desc (bool): Newest first if True, oldest first if False
+        limit (int): Maximum number of entries to return
+        after (tuple, optional): (timestamp, id) key the page starts after
+        before (tuple, optional): (timestamp, id) key the page ends before
+        fields (tuple, optional): Fields to load, all fields if None
+        start (float, optional): Only entries at or after this timestamp
+        end (float, optional): Only entries before this timestamp
+        
+    Returns:
+        list: Up to limit entries, in display order
+    """
+    key = after if after is not None else before
+    # Paging backwards walks the index in the opposite direction
+    descending = sort_desc if before is None else not sort_desc
+    sort_direction = -1 if descending else 1
+    query = {}
+    if key is not None:
+        op = '$lt' if descending else '$gt'
+        query = {'$or': [
+            {'timestamp': {op: key[0]}},
+            {'timestamp': key[0], 'id': {op: key[1]}}
+        ]}
+    if start is not None or end is not None:
+        query['timestamp'] = {}
+        if start is not None:
+            query['timestamp']['$gte'] = start
+        if end is not None:
+            query['timestamp']['$lt'] = end
+    cursor = collection.find(query, _projection(fields)).sort(
+        [('timestamp', sort_direction), ('id', sort_direction)]
+    ).limit(limit)
+    entries = list(cursor)
+    if before is not None:
+        entries.reverse()
+    if fields and 'excerpt' in fields:
+        _fill_list_fields(collection, entries)
+    return entries
+
+
+def _fill_list_fields(collection, entries):
+    """Fill in the list fields of entries stored before they existed
+    
+    Such entries have no excerpt, so their content is loaded in one extra
+    query and the derived fields are computed and stored on them. Once
+    every old entry has been listed or `flask journal backfill` has run,
+    this costs nothing.
+    
+    Args:
+        collection: MongoDB journal collection
+        entries (list): Entries loaded with LIST_FIELDS, updated in place
+    """
+    missing = [entry for entry in entries if 'excerpt' not in entry]
+    if not missing:
+        return
+    documents = collection.find({'id': {'$in': [entry['id'] for entry in missing]}},
+                                {'_id': 0, 'id': 1, 'content': 1, 'timestamp': 1})
+    derived = {document['id']: _derived_fields(document) for document in documents}
+    updates = []
+    for entry in missing:
+        if entry['id'] in derived:
+            entry.update({field: value for field, value in derived[entry['id']].items()
+                          if field in LIST_FIELDS})
+            updates.append(UpdateOne({'id': entry['id']}, {'$set': derived[entry['id']]}))
+    if updates:
+        try:
+            collection.bulk_write(updates, ordered=False)
+        except OperationFailure as e:
+            # The page is still complete; the fields are stored next time
+            current_app.logger.warning(f"Could not store derived entry fields: {e}")
+
+
+def get_all_entries(sort_key='timestamp', sort_desc=True, page_size=None, cursor=None,
+                    fields=None, start=None, end=None):
+    """Get journal entries
+    
+    Without a page size every entry is returned. With a page size, entries
+    are ordered by (timestamp, id) and only the page next to the cursor is
+    loaded.
+    
+    Args:
+        sort_key (str): Key to sort by when not paging
         sort_desc (bool): Sort in descending order if True, ascending if False
+        page_size (int, optional): Maximum number of entries to return
+        cursor (str, optional): Page cursor created by encode_cursor
+        fields (tuple, optional): Fields to load when paging, e.g. LIST_FIELDS
+        start (float, optional): When paging, only entries at or after this timestamp
+        end (float, optional): When paging, only entries before this timestamp
         
     Returns:
         list: List of journal entries as dictionaries
     """
+    after = before = None
+    if page_size is not None:
+        parsed = decode_cursor(cursor)
+        if parsed:
+            direction, key = parsed
+            if direction == 'prev':
+                before = key
+            else:
+                after = key
+    
     # If MongoDB is available, load from database
     if is_connected():
-        collection = get_collection(JOURNAL_COLLECTION)
-        sort_direction = -1 if sort_desc else 1
-        entries = list(collection.find({}, {'_id': 0}).sort(sort_key, sort_direction))
-        return entries
+        try:
+            collection = get_collection(JOURNAL_COLLECTION)
+            if page_size is None:
+                sort_direction = -1 if sort_desc else 1
+                entries = list(collection.find({}, _projection()).sort(sort_key, sort_direction))
+            else:
+                entries = _find_page(collection, sort_desc, page_size, after, before, fields,
+                                     start, end)
+            record_success()
+            return entries
+        except ConnectionFailure as e:
+            # Fall back to file storage
+            record_failure(e)
+    
+    # Otherwise load from local storage
+    if page_size is None:
+        return journal_store.all(sort_key, sort_desc)
+    return journal_store.page(sort_desc, page_size, after, before, fields, start, end)
+
+
+def get_entries_page(page_size=JOURNAL_PAGE_SIZE, cursor=None, sort_desc=True,
+                     start=None, end=None):
+    """Get one page of journal entries with links to its neighbours
+    
+    Only the fields in LIST_FIELDS are loaded. Pages are cached until the
+    journal changes.
+    
+    Args:
+        page_size (int): Number of entries per page
+        cursor (str, optional): Page cursor, first page if missing or invalid
+        sort_desc (bool): Newest first if True, oldest first if False
+        start (float, optional): Only entries at or after this timestamp
+        end (float, optional): Only entries before this timestamp
+        
+    Returns:
+        dict: 'entries' for the page plus 'next_cursor' and 'prev_cursor',
+            which are None when there is no such page
+    """
+    page = _cached(listing_cache, ('page', page_size, cursor, sort_desc, start, end),
+                   lambda: _load_entries_page(page_size, cursor, sort_desc, start, end))
+    return {**page, 'entries': [dict(entry) for entry in page['entries']]}
+
+
+def _load_entries_page(page_size, cursor, sort_desc, start=None, end=None):
+    """Load one page of journal entries, see get_entries_page"""
+    parsed = decode_cursor(cursor)
+    backward = parsed is not None and parsed[0] == 'prev'
+    
+    # Fetch one extra entry to find out whether there is another page
+    entries = get_all_entries('timestamp', sort_desc, page_size + 1,
+                              cursor if parsed else None, LIST_FIELDS, start, end)
+    has_more = len(entries) > page_size
+    if has_more:
+        entries = entries[1:] if backward else entries[:page_size]
     
-    # Otherwise load from local file
-    entries = read_json_file(JOURNAL_FILE)
+    if parsed and (not entries or (backward and not has_more)):
+        # Back at the start, or the entries around the cursor are gone
+        return _load_entries_page(page_size, None, sort_desc, start, end)
     
-    # Sort entries
-    if sort_desc:
-        entries.sort(key=lambda x: x.get(sort_key, 0), reverse=True)
+    if backward:
+        has_next, has_prev = True, True
     else:
-        entries.sort(key=lambda x: x.get(sort_key, 0))
+        has_next, has_prev = has_more, parsed is not None
+    
+    return {
+        'entries': entries,
+        'next_cursor': encode_cursor(entries[-1], 'next') if has_next and entries else None,
+        'prev_cursor': encode_cursor(entries[0], 'prev') if has_prev and entries else None
+    }
+
+
+def get_entries_on_this_day(day=None):
+    """Get the entries written on the same calendar day in earlier years
+    
+    The lookup is a single probe of the month-day index (MongoDB) or the
+    local store's month-day index. Results are cached until the journal
+    changes.
+    
+    Args:
+        day (datetime, optional): Day to look back from, today if None
         
-    return entries
+    Returns:
+        list: Entries (list fields plus 'years_ago'), newest first
+    """
+    day = day or get_current_time()
+    month_day = day.strftime('%m-%d')
+    day_start = CHINA_TIMEZONE.localize(
+        datetime(day.year, day.month, day.day)).timestamp()
+    entries = _cached(listing_cache, ('on_day', month_day, day_start),
+                      lambda: _load_entries_on_day(month_day, day_start))
+    return [{**entry, 'years_ago': day.year - int(entry['ymd'][:4])} for entry in entries]
+
+
+def _load_entries_on_day(month_day, before):
+    """Load the entries on a month-day written before a timestamp, see get_entries_on_this_day"""
+    # If MongoDB is available, query the month-day index
+    if is_connected():
+        try:
+            collection = get_collection(JOURNAL_COLLECTION)
+            entries = list(collection.find({'month_day': month_day, 'timestamp': {'$lt': before}},
+                                           _projection(LIST_FIELDS))
+                           .sort([('timestamp', -1), ('id', -1)]))
+            record_success()
+            return entries
+        except ConnectionFailure as e:
+            # Fall back to file storage
+            record_failure(e)
+    
+    # Otherwise use the local store's month-day index
+    return [entry for entry in journal_store.on_day(month_day, LIST_FIELDS)
+            if (entry.get('timestamp') or 0) < before]
+
+
+def search_entries(query, page=1, page_size=JOURNAL_PAGE_SIZE):
+    """Search journal entries by title, content and author
+    
+    MongoDB answers through its text index, local storage through the
+    inverted index in utils.search_index. Results are ranked by relevance.
+    If the MongoDB text index cannot be used, MongoDB is scanned instead
+    and results come newest first.
+    
+    Args:
+        query (str): Search query
+        page (int): 1-based page number
+        page_size (int): Number of results per page
+        
+    Returns:
+        dict: 'entries' (list fields only) for the page, 'total' matches,
+            'page' and 'has_next'
+    """
+    page = max(1, page)
+    offset = (page - 1) * page_size
+    tokens = tokenize(query)
+    if not tokens:
+        return {'entries': [], 'total': 0, 'page': page, 'has_next': False}
+    
+    # If MongoDB is available, search the text index
+    if is_connected():
+        try:
+            collection = get_collection(JOURNAL_COLLECTION)
+            text_query = {'$text': {'$search': ' '.join(dict.fromkeys(tokens))}}
+            projection = _projection(LIST_FIELDS)
+            projection['score'] = {'$meta': 'textScore'}
+            entries = list(collection.find(text_query, projection)
+                           .sort([('score', {'$meta': 'textScore'}), ('timestamp', -1)])
+                           .skip(offset).limit(page_size))
+            total = collection.count_documents(text_query)
+            _fill_list_fields(collection, entries)
+            record_success()
+            for entry in entries:
+                entry.pop('score', None)
+            return {'entries': entries, 'total': total, 'page': page,
+                    'has_next': offset + len(entries) < total}
+        except ConnectionFailure as e:
+            # Fall back to file storage
+            record_failure(e)
+        except OperationFailure as e:
+            # The text index is created at startup; without it $text fails.
+            # The local index only holds local writes, so stay on MongoDB
+            current_app.logger.warning(f"MongoDB text search failed, scanning instead: {e}")
+            try:
+                return _scan_search(get_collection(JOURNAL_COLLECTION), tokens, page, page_size)
+            except ConnectionFailure as e:
+                record_failure(e)
+    
+    # Otherwise search the local inverted index
+    ranked, total = search_index.search(query, page_size, offset)
+    entries = []
+    for entry_id, _ in ranked:
+        entry = journal_store.get(entry_id)
+        if entry is not None:
+            entries.append({field: entry[field] for field in LIST_FIELDS if field in entry})
+    return {'entries': entries, 'total': total, 'page': page,
+            'has_next': offset + len(ranked) < total}
+
+
+def _scan_search(collection, tokens, page, page_size):
+    """Search MongoDB without the text index, see search_entries
+    
+    Every token must appear in the title, content or author. This scans
+    the collection, so results are newest first rather than ranked.
+    """
+    offset = (page - 1) * page_size
+    query = {'$and': [
+        {'$or': [{field: {'$regex': re.escape(token), '$options': 'i'}}
+                 for field in ('title', 'content', 'author')]}
+        for token in dict.fromkeys(tokens)
+    ]}
+    entries = list(collection.find(query, _projection(LIST_FIELDS))
+                   .sort([('timestamp', -1), ('id', -1)])
+                   .skip(offset).limit(page_size))
+    total = collection.count_documents(query)
+    _fill_list_fields(collection, entries)
+    record_success()
+    return {'entries': entries, 'total': total, 'page': page,
+            'has_next': offset + len(entries) < total}
 
 
 def get_entry_by_id(entry_id):
     """Get journal entry by ID
     
+    Entries are cached until the journal changes.
+    
     Args:
         entry_id (str): Entry ID
         
     Returns:
         dict: Journal entry or None if not found
     """
+    entry = _cached(entry_cache, entry_id, lambda: _load_entry(entry_id))
+    return dict(entry) if entry is not None else None
+
+
+def _load_entry(entry_id):
+    """Load a journal entry by ID, see get_entry_by_id"""
     # If MongoDB is available, query from database
     if is_connected():
-        collection = get_collection(JOURNAL_COLLECTION)
-        entry = collection.find_one({'id': entry_id}, {'_id': 0})
-        return entry
-    
-    # Otherwise search in file
-    entries = read_json_file(JOURNAL_FILE)
-    for entry in entries:
-        if entry.get('id') == entry_id:
+        try:
+            collection = get_collection(JOURNAL_COLLECTION)
+            entry = collection.find_one({'id': entry_id}, _projection())
+            record_success()
             return entry
+        except ConnectionFailure as e:
+            # Fall back to file storage
+            record_failure(e)
     
-    return None
+    # Otherwise look up in file
+    return journal_store.get(entry_id)
+
+
+def queue_for_mongodb(records):
+    """Queue local writes for replay into MongoDB
+    
+    Nothing is queued when MongoDB is not configured, since the local store
+    is then the only store.
+    
+    Args:
+        records (list): Outbox operation records
+    """
+    if MONGODB_URI and records:
+        journal_outbox.append(records)
+
+
+def replay_outbox_batch(records):
+    """Apply a batch of outbox operations to MongoDB
+    
+    Puts become upserts keyed on id and deletes are idempotent, so a batch
+    can safely be replayed again after a failure. Operations MongoDB rejects
+    are moved to the outbox's dead-letter file and the rest of the batch is
+    applied and acknowledged.
+    
+    Args:
+        records (list): Outbox operation records, oldest first
+        
+    Returns:
+        bool: True if the batch was applied, False to retry it later
+    """
+    # Only the last operation on each entry matters
+    latest = {}
+    for record in records:
+        entry_id = record['entry']['id'] if record.get('op') == 'put' else record.get('id')
+        latest.pop(entry_id, None)
+        latest[entry_id] = record
+    
+    operations = []
+    for entry_id, record in latest.items():
+        if record.get('op') == 'put':
+            entry = record['entry']
+            operations.append(ReplaceOne({'id': entry_id}, {**entry, **mongo_search_fields(entry)},
+                                         upsert=True))
+        else:
+            operations.append(DeleteOne({'id': entry_id}))
+    
+    collection = get_collection(JOURNAL_COLLECTION)
+    try:
+        # The documents being replaced or deleted, to update the statistics
+        previous = list(collection.find({'id': {'$in': list(latest)}}, STATS_PROJECTION))
+        try:
+            collection.bulk_write(operations, ordered=False)
+            rejected, stored = {}, True
+        except BulkWriteError as e:
+            # Retrying cannot fix a rejected document; keep it as a dead letter
+            # so it does not block the outbox, and apply the rest as usual
+            ids = list(latest)
+            rejected = {ids[error['index']]: error.get('errmsg')
+                        for error in e.details.get('writeErrors', [])}
+            stored = journal_outbox.reject([{**latest[entry_id], 'error': error}
+                                            for entry_id, error in rejected.items()])
+            current_app.logger.error(f"Outbox replay rejected {len(rejected)} operations, "
+                                     f"kept in {journal_outbox.rejected_path}")
+        record_success()
+        journal_changed(mongodb=True)
+        added = [record['entry'] for entry_id, record in latest.items()
+                 if record.get('op') == 'put' and entry_id not in rejected]
+        record_stats_change([entry for entry in previous if entry.get('id') not in rejected],
+                            added, mongodb=True)
+        # Keep the batch queued if its dead letters could not be written
+        return stored
+    except ConnectionFailure as e:
+        record_failure(e)
+        return False
+    except PyMongoError as e:
+        current_app.logger.error(f"Outbox replay failed: {e}")
+        return False
+
+
+# Replays the outbox into MongoDB in the background
+outbox_reconciler = OutboxReconciler(
+    journal_outbox, replay_outbox_batch,
+    can_replay=lambda: is_connected() and get_collection(JOURNAL_COLLECTION) is not None,
+    interval=JOURNAL_OUTBOX_INTERVAL,
+    batch_size=JOURNAL_OUTBOX_BATCH_SIZE
+)
+
+
+def start_outbox_reconciler(app):
+    """Start replaying the outbox into MongoDB in the background
+    
+    Args:
+        app (Flask): Flask application instance
+        
+    Returns:
+        bool: True if the reconciler is running
+    """
+    if not MONGODB_URI:
+        return False
+    return outbox_reconciler.start(app)
+
+
+def get_outbox_backlog():
+    """Get the number of local writes waiting to be replayed into MongoDB
+    
+    Returns:
+        int: Number of pending outbox operations
+    """
+    return journal_outbox.pending()
+
+
+def get_outbox_rejected():
+    """Get the number of outbox operations MongoDB rejected
+    
+    Returns:
+        int: Number of operations in the outbox's dead-letter file
+    """
+    return journal_outbox.rejected()
 
 
 def create_entry(entry_data):
@@ -157,21 +895,29 @@ def create_entry(entry_data):
         
         # If MongoDB is available, save to database
         if is_connected():
-            collection = get_collection(JOURNAL_COLLECTION)
-            result = collection.insert_one(entry_dict)
-            if result.inserted_id:
-                current_app.logger.info(f"Entry successfully added to MongoDB: {entry_id}")
-                return True, entry_id, None
-            else:
-                error = "MongoDB insert did not return ID"
-                current_app.logger.warning(f"{error}: {entry_id}")
+            try:
+                collection = get_collection(JOURNAL_COLLECTION)
+                result = collection.insert_one({**entry_dict, **mongo_search_fields(entry_dict)})
+                record_success()
+                if result.inserted_id:
+                    journal_changed(mongodb=True)
+                    record_stats_change([], [entry_dict], mongodb=True)
+                    current_app.logger.info(f"Entry successfully added to MongoDB: {entry_id}")
+                    return True, entry_id, None
+                else:
+                    error = "MongoDB insert did not return ID"
+                    current_app.logger.warning(f"{error}: {entry_id}")
+                    # Fall back to file storage
+            except ConnectionFailure as e:
                 # Fall back to file storage
+                record_failure(e)
         
         # MongoDB unavailable or insert failed, use file storage
-        entries = read_json_file(JOURNAL_FILE)
-        entries.append(entry_dict)
-        
-        if write_json_file(JOURNAL_FILE, entries):
+        if journal_store.put(entry_dict):
+            search_index.index_entry(entry_dict)
+            queue_for_mongodb([{'op': 'put', 'entry': entry_dict}])
+            journal_changed()
+            record_stats_change([], [entry_dict])
             current_app.logger.info(f"Entry added to file storage: {entry_id}")
             return True, entry_id, None
         else:
@@ -198,54 +944,78 @@ def update_entry(entry_id, entry_data):
     try:
         # If MongoDB is available, update in database
         if is_connected():
-            collection = get_collection(JOURNAL_COLLECTION)
-            
-            # Update timestamp to current time
-            now = get_current_time()
-            entry_data['date'] = now.strftime('%Y年%m月%d日')
-            entry_data['time'] = now.strftime('%H:%M:%S')
-            entry_data['timestamp'] = now.timestamp()
-            
-            result = collection.update_one(
-                {'id': entry_id},
-                {'$set': entry_data}
-            )
-            
-            if result.modified_count > 0:
-                current_app.logger.info(f"Entry successfully updated in MongoDB: {entry_id}")
-                return True, None
-            elif result.matched_count > 0:
-                # Document found but not modified (no changes)
-                current_app.logger.info(f"Entry found but not modified in MongoDB: {entry_id}")
-                return True, None
-            else:
-                current_app.logger.warning(f"Entry to update not found in MongoDB: {entry_id}")
-                # Fall back to file storage
-        
-        # MongoDB unavailable or update failed, use file storage
-        entries = read_json_file(JOURNAL_FILE)
-        entry_found = False
-        
-        for i, entry in enumerate(entries):
-            if entry.get('id') == entry_id:
-                # Update entry fields while preserving id
-                entries[i].update(entry_data)
+            try:
+                collection = get_collection(JOURNAL_COLLECTION)
                 
-                # Update timestamp
+                # Keep the stored excerpt and counts in step with the content
+                if 'content' in entry_data:
+                    entry_data.update(summarize_content(entry_data['content']))
+                
+                # Update timestamp to current time
                 now = get_current_time()
-                entries[i]['date'] = now.strftime('%Y年%m月%d日')
-                entries[i]['time'] = now.strftime('%H:%M:%S')
-                entries[i]['timestamp'] = now.timestamp()
+                entry_data['date'] = now.strftime('%Y年%m月%d日')
+                entry_data['time'] = now.strftime('%H:%M:%S')
+                entry_data['timestamp'] = now.timestamp()
+                entry_data.update(get_date_fields(entry_data['timestamp']))
                 
-                entry_found = True
-                break
+                # Re-tokenize the searchable fields, reading any that are not being updated
+                update = dict(entry_data)
+                searchable = ('title', 'content', 'author')
+                if any(field in entry_data for field in searchable):
+                    current = entry_data
+                    if not all(field in entry_data for field in searchable):
+                        stored = collection.find_one({'id': entry_id}, {'_id': 0, 'title': 1,
+                                                                        'content': 1, 'author': 1})
+                        current = {**(stored or {}), **entry_data}
+                    update.update(mongo_search_fields(current))
+                
+                # Read the previous values in the same round trip to update the statistics
+                previous = collection.find_one_and_update(
+                    {'id': entry_id},
+                    {'$set': update},
+                    projection=STATS_PROJECTION,
+                    return_document=ReturnDocument.BEFORE
+                )
+                record_success()
+                
+                if previous is not None:
+                    journal_changed(mongodb=True)
+                    record_stats_change([previous], [{**previous, **update}], mongodb=True)
+                    current_app.logger.info(f"Entry successfully updated in MongoDB: {entry_id}")
+                    return True, None
+                else:
+                    current_app.logger.warning(f"Entry to update not found in MongoDB: {entry_id}")
+                    # Fall back to file storage
+            except ConnectionFailure as e:
+                # Fall back to file storage
+                record_failure(e)
         
-        if not entry_found:
+        # MongoDB unavailable or update failed, use file storage
+        entry = journal_store.get(entry_id)
+        
+        if entry is None:
             error = f"Entry to update not found: {entry_id}"
             current_app.logger.warning(error)
             return False, error
         
-        if write_json_file(JOURNAL_FILE, entries):
+        # Update entry fields while preserving id
+        previous = dict(entry)
+        entry.update(entry_data)
+        entry['id'] = entry_id
+        entry.update(summarize_content(entry.get('content')))
+        
+        # Update timestamp
+        now = get_current_time()
+        entry['date'] = now.strftime('%Y年%m月%d日')
+        entry['time'] = now.strftime('%H:%M:%S')
+        entry['timestamp'] = now.timestamp()
+        entry.update(get_date_fields(entry['timestamp']))
+        
+        if journal_store.put(entry):
+            search_index.index_entry(entry)
+            queue_for_mongodb([{'op': 'put', 'entry': entry}])
+            journal_changed()
+            record_stats_change([previous], [entry])
             current_app.logger.info(f"Entry updated in file storage: {entry_id}")
             return True, None
         else:
@@ -271,27 +1041,35 @@ def delete_entry(entry_id):
     try:
         # If MongoDB is available, delete from database
         if is_connected():
-            collection = get_collection(JOURNAL_COLLECTION)
-            result = collection.delete_one({'id': entry_id})
-            
-            if result.deleted_count > 0:
-                current_app.logger.info(f"Entry successfully deleted from MongoDB: {entry_id}")
-                return True, None
-            else:
-                current_app.logger.warning(f"Entry to delete not found in MongoDB: {entry_id}")
+            try:
+                collection = get_collection(JOURNAL_COLLECTION)
+                previous = collection.find_one_and_delete({'id': entry_id}, projection=STATS_PROJECTION)
+                record_success()
+                
+                if previous is not None:
+                    journal_changed(mongodb=True)
+                    record_stats_change([previous], [], mongodb=True)
+                    current_app.logger.info(f"Entry successfully deleted from MongoDB: {entry_id}")
+                    return True, None
+                else:
+                    current_app.logger.warning(f"Entry to delete not found in MongoDB: {entry_id}")
+                    # Fall back to file storage
+            except ConnectionFailure as e:
                 # Fall back to file storage
+                record_failure(e)
         
         # MongoDB unavailable or delete failed, use file storage
-        entries = read_json_file(JOURNAL_FILE)
-        original_count = len(entries)
-        entries = [entry for entry in entries if entry.get('id') != entry_id]
-        
-        if len(entries) == original_count:
+        previous = journal_store.get(entry_id)
+        if previous is None:
             error = f"Entry to delete not found in file storage: {entry_id}"
             current_app.logger.warning(error)
             return False, error
         
-        if write_json_file(JOURNAL_FILE, entries):
+        if journal_store.delete(entry_id):
+            search_index.remove_entry(entry_id)
+            queue_for_mongodb([{'op': 'del', 'id': entry_id}])
+            journal_changed()
+            record_stats_change([previous], [])
             current_app.logger.info(f"Entry deleted from file storage: {entry_id}")
             return True, None
         else:
@@ -308,19 +1086,463 @@ def delete_entry(entry_id):
 def get_entry_count():
     """Get the count of journal entries
     
+    The count comes from the materialized statistics, so it costs a single
+    document read.
+    
     Returns:
         int: Number of entries
     """
+    stats = get_journal_stats()
+    return stats['total'] if stats else 0
+
+
+def _stats_delta(entries, sign):
+    """Get the statistics delta for adding or removing entries"""
+    deltas = []
+    for entry in entries:
+        words = entry.get('word_count')
+        if words is None:
+            words = count_words(entry.get('content'))
+        deltas.append(entry_delta(entry.get('author'), entry.get('timestamp'), words, sign))
+    return deltas
+
+
+def _compute_stats(entries):
+    """Compute statistics from scratch over an iterable of entries"""
+    stats = empty_stats()
+    for delta in _stats_delta(entries, 1):
+        apply_delta(stats, delta)
+    return stats
+
+
+def _escape_key(key):
+    """Make an author or month usable as a MongoDB field name"""
+    return key.replace('.', '\uff0e').replace('$', '\uff04')
+
+
+def _unescape_key(key):
+    """Reverse _escape_key"""
+    return key.replace('\uff0e', '.').replace('\uff04', '$')
+
+
+def _local_bounds():
+    """Get the first and last entry timestamps of the local store"""
+    first = journal_store.page(sort_desc=False, limit=1, fields=('timestamp',))
+    last = journal_store.page(sort_desc=True, limit=1, fields=('timestamp',))
+    return ((first[0].get('timestamp') if first else None),
+            (last[0].get('timestamp') if last else None))
+
+
+def _mongo_bounds(collection):
+    """Get the first and last entry timestamps in MongoDB"""
+    bounds = []
+    for direction in (1, -1):
+        entry = collection.find_one({}, {'_id': 0, 'timestamp': 1}, sort=[('timestamp', direction)])
+        bounds.append(entry.get('timestamp') if entry else None)
+    return tuple(bounds)
+
+
+def record_stats_change(removed, added, mongodb=False):
+    """Update the materialized statistics after a write
+    
+    Missing or outdated statistics are rebuilt instead, which already
+    includes the write. Errors are logged rather than raised: the write
+    itself is already stored, and the statistics can be repaired with
+    `flask journal rebuild-stats`.
+    
+    Args:
+        removed (list): Entries as they were before the write
+        added (list): Entries as they are after the write
+        mongodb (bool): True to update the MongoDB statistics document,
+            False to update the local statistics file
+    """
+    if not removed and not added:
+        return
+    delta = merge_deltas(_stats_delta(removed, -1) + _stats_delta(added, 1))
+    try:
+        if mongodb:
+            update = {'$inc': {'total': delta['total'], 'words': delta['words']}}
+            for field in ('authors', 'months'):
+                for key, count in delta[field].items():
+                    update['$inc'][f'{field}.{_escape_key(key)}'] = count
+            if delta['added']:
+                update['$min'] = {'first_timestamp': min(delta['added'])}
+                update['$max'] = {'last_timestamp': max(delta['added'])}
+            stats_collection = get_db()[STATS_COLLECTION]
+            result = stats_collection.update_one(
+                {'_id': JOURNAL_STATS_ID, 'version': STATS_VERSION}, update)
+            if not result.matched_count:
+                rebuild_journal_stats(local=False)
+            elif delta['removed']:
+                # The first or last entry may be gone; the bounds are indexed lookups
+                first, last = _mongo_bounds(get_collection(JOURNAL_COLLECTION))
+                stats_collection.update_one({'_id': JOURNAL_STATS_ID}, {
+                    '$set': {'first_timestamp': first, 'last_timestamp': last}})
+            record_success()
+            return
+        
+        def apply(stats):
+            if not isinstance(stats, dict) or stats.get('version') != STATS_VERSION:
+                return _compute_stats(_iter_local_entries())
+            apply_delta(stats, delta)
+            if delta['removed']:
+                stats['first_timestamp'], stats['last_timestamp'] = _local_bounds()
+            return stats
+        
+        update_json_file(JOURNAL_STATS_FILE, apply)
+    except ConnectionFailure as e:
+        # The statistics can be repaired with the rebuild command
+        record_failure(e)
+        current_app.logger.warning(f"Journal statistics not updated: {e}")
+    except Exception as e:
+        # e.g. OperationFailure or an unwritable statistics file
+        current_app.logger.error(f"Journal statistics not updated: {e}")
+
+
+def rebuild_journal_stats(mongodb=True, local=True):
+    """Recompute the materialized statistics from the stored entries
+    
+    Args:
+        mongodb (bool): Rebuild the MongoDB statistics document, if connected
+        local (bool): Rebuild the local statistics file
+        
+    Returns:
+        dict: Entry totals per rebuilt store, keyed 'mongodb' and 'local'
+    """
+    totals = {}
+    
+    if mongodb and is_connected():
+        collection = get_collection(JOURNAL_COLLECTION)
+        projection = {**STATS_PROJECTION, 'content': 1}
+        stats = _compute_stats(collection.find({}, projection).batch_size(500))
+        for field in ('authors', 'months'):
+            stats[field] = {_escape_key(k): v for k, v in stats[field].items()}
+        get_db()[STATS_COLLECTION].replace_one({'_id': JOURNAL_STATS_ID}, stats, upsert=True)
+        record_success()
+        totals['mongodb'] = stats['total']
+    
+    if local:
+        with file_lock(JOURNAL_STATS_FILE):
+            stats = _compute_stats(_iter_local_entries())
+            write_json_file(JOURNAL_STATS_FILE, stats)
+        totals['local'] = stats['total']
+    
+    return totals
+
+
+def get_journal_stats():
+    """Get the journal statistics
+    
+    Reads the materialized statistics document (or the local statistics
+    file), building it on first use.
+    
+    Returns:
+        dict: Totals, entries per author and per month, and the first and
+            last entry dates; None if the statistics could not be read
+    """
     try:
-        # If MongoDB is available, count from database
         if is_connected():
-            collection = get_collection(JOURNAL_COLLECTION)
-            count = collection.count_documents({})
-            return count
+            try:
+                stats_collection = get_db()[STATS_COLLECTION]
+                stats = stats_collection.find_one({'_id': JOURNAL_STATS_ID})
+                if not stats or stats.get('version') != STATS_VERSION:
+                    rebuild_journal_stats(local=False)
+                    stats = stats_collection.find_one({'_id': JOURNAL_STATS_ID})
+                record_success()
+                for field in ('authors', 'months'):
+                    stats[field] = {_unescape_key(k): v for k, v in stats[field].items()}
+                return format_stats(stats)
+            except ConnectionFailure as e:
+                # Fall back to file storage
+                record_failure(e)
         
-        # Otherwise count from file
-        entries = read_json_file(JOURNAL_FILE)
-        return len(entries)
+        stats = read_json_file(JOURNAL_STATS_FILE)
+        if not isinstance(stats, dict) or stats.get('version') != STATS_VERSION:
+            rebuild_journal_stats(mongodb=False)
+            stats = read_json_file(JOURNAL_STATS_FILE)
+        return format_stats(stats)
     except Exception as e:
-        current_app.logger.error(f"Error counting entries: {str(e)}")
-        return 0
\ No newline at end of file
+        current_app.logger.error(f"Error reading journal statistics: {str(e)}")
+        return None
+
+
+def iter_entries(batch_size=500):
+    """Iterate over all journal entries, oldest first
+    
+    Entries are fetched in batches from a MongoDB cursor or by paging the
+    local store, so the full list is never held in memory.
+    
+    Args:
+        batch_size (int): Number of entries fetched per round trip
+        
+    Yields:
+        dict: Journal entry
+    """
+    if is_connected():
+        collection = get_collection(JOURNAL_COLLECTION)
+        cursor = (collection.find({}, _projection())
+                  .sort([('timestamp', 1), ('id', 1)])
+                  .batch_size(batch_size))
+        started = False
+        try:
+            for entry in cursor:
+                started = True
+                yield entry
+            record_success()
+            return
+        except ConnectionFailure as e:
+            record_failure(e)
+            # Switching sources halfway would skip or repeat entries
+            if started:
+                raise
+            # Fall back to file storage
+    
+    yield from _iter_local_entries(batch_size)
+
+
+def _iter_local_entries(batch_size=500):
+    """Iterate over all entries in the local store, oldest first"""
+    after = None
+    while True:
+        entries = journal_store.page(sort_desc=False, limit=batch_size, after=after)
+        yield from entries
+        if len(entries) < batch_size:
+            return
+        after = (entries[-1].get('timestamp', 0), entries[-1]['id'])
+
+
+def export_entries(batch_size=500):
+    """Serialize all journal entries as NDJSON, one entry per line
+    
+    Args:
+        batch_size (int): Number of entries fetched per round trip
+        
+    Yields:
+        str: JSON encoded entry followed by a newline
+    """
+    for entry in iter_entries(batch_size):
+        yield json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+
+
+def _parse_import_record(line):
+    """Parse and normalize one NDJSON import line
+    
+    Args:
+        line (str): JSON object with at least title, content and author
+        
+    Returns:
+        dict: Journal entry ready to store
+    """
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("Record is not a JSON object")
+    missing = [field for field in IMPORT_REQUIRED_FIELDS
+               if not str(record.get(field) or '').strip()]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    if record.get('id') is not None:
+        record['id'] = str(record['id'])
+    if record.get('timestamp') is not None:
+        record['timestamp'] = float(record['timestamp'])
+        try:
+            datetime.fromtimestamp(record['timestamp'], CHINA_TIMEZONE)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f"Timestamp out of range: {record['timestamp']}")
+    return JournalEntry.from_dict(record).to_dict()
+
+
+def _import_batch(batch):
+    """Store a batch of parsed import records
+    
+    Records whose id already exists, in storage or earlier in the batch,
+    are rejected rather than overwritten.
+    
+    Args:
+        batch (list): (line_number, entry) pairs
+        
+    Returns:
+        tuple: (number of entries stored, list of (line_number, error) pairs)
+    """
+    failures = []
+    unique = []
+    seen = set()
+    for line_number, entry in batch:
+        if entry['id'] in seen:
+            failures.append((line_number, f"Duplicate id: {entry['id']}"))
+        else:
+            seen.add(entry['id'])
+            unique.append((line_number, entry))
+    
+    if is_connected():
+        try:
+            collection = get_collection(JOURNAL_COLLECTION)
+            documents = [{**entry, **mongo_search_fields(entry)} for _, entry in unique]
+            rejected = set()
+            try:
+                imported = len(collection.insert_many(documents, ordered=False).inserted_ids)
+            except BulkWriteError as e:
+                imported = e.details.get('nInserted', 0)
+                for error in e.details.get('writeErrors', []):
+                    rejected.add(error['index'])
+                    line_number, entry = unique[error['index']]
+                    if error.get('code') == 11000:
+                        failures.append((line_number, f"Duplicate id: {entry['id']}"))
+                    else:
+                        failures.append((line_number, error.get('errmsg', 'Write failed')))
+            record_success()
+            if imported:
+                journal_changed(mongodb=True)
+                record_stats_change([], [entry for i, (_, entry) in enumerate(unique)
+                                         if i not in rejected], mongodb=True)
+            return imported, sorted(failures)
+        except ConnectionFailure as e:
+            # Fall back to file storage
+            record_failure(e)
+    
+    fresh = []
+    for line_number, entry in unique:
+        if journal_store.exists(entry['id']):
+            failures.append((line_number, f"Duplicate id: {entry['id']}"))
+        else:
+            fresh.append((line_number, entry))
+    entries = [entry for _, entry in fresh]
+    if not journal_store.put_many(entries):
+        failures.extend((line_number, "Failed to save to file storage") for line_number, _ in fresh)
+        return 0, sorted(failures)
+    search_index.index_entries(entries)
+    queue_for_mongodb([{'op': 'put', 'entry': entry} for entry in entries])
+    journal_changed()
+    record_stats_change([], entries)
+    return len(entries), sorted(failures)
+
+
+def import_entries(lines, batch_size=500):
+    """Import journal entries from NDJSON lines
+    
+    Lines are parsed and stored in batches (insert_many on MongoDB, a
+    single append locally), so memory use does not grow with the input.
+    
+    Args:
+        lines (iterable): NDJSON lines as str or bytes
+        batch_size (int): Number of entries stored per batch
+        
+    Returns:
+        dict: 'imported' and 'failed' counts, and up to MAX_IMPORT_ERRORS
+            per-record 'errors' with their line numbers
+    """
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+    
+    def add_failures(failures):
+        report['failed'] += len(failures)
+        for line_number, error in failures:
+            if len(report['errors']) >= MAX_IMPORT_ERRORS:
+                break
+            report['errors'].append({'line': line_number, 'error': error})
+    
+    batch = []
+    for line_number, line in enumerate(lines, 1):
+        try:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            batch.append((line_number, _parse_import_record(line)))
+        except (ValueError, TypeError, OverflowError, OSError) as e:
+            add_failures([(line_number, str(e))])
+            continue
+        
+        if len(batch) >= batch_size:
+            imported, failures = _import_batch(batch)
+            report['imported'] += imported
+            add_failures(failures)
+            batch = []
+    
+    if batch:
+        imported, failures = _import_batch(batch)
+        report['imported'] += imported
+        add_failures(failures)
+    
+    return report
+
+
+def _derived_fields(entry):
+    """Get the fields derived from an entry's content and timestamp"""
+    return {**summarize_content(entry.get('content')), **get_date_fields(entry.get('timestamp'))}
+
+
+def backfill_entry_fields(batch_size=500):
+    """Store the excerpt, content counts and normalized dates on entries
+    that lack them
+    
+    Both MongoDB (when connected) and the local store are updated.
+    
+    Args:
+        batch_size (int): Number of MongoDB updates sent per bulk write
+        
+    Returns:
+        int: Number of entries updated
+    """
+    updated = 0
+    
+    if is_connected():
+        collection = get_collection(JOURNAL_COLLECTION)
+        missing = {'$or': [{field: {'$exists': False}}
+                           for field in ('excerpt', 'content_length', 'word_count',
+                                         'ymd', 'month_day')]}
+        batch = []
+        fields = {'_id': 0, 'id': 1, 'content': 1, 'timestamp': 1}
+        for entry in collection.find(missing, fields):
+            batch.append(UpdateOne({'id': entry['id']}, {'$set': _derived_fields(entry)}))
+            if len(batch) >= batch_size:
+                updated += collection.bulk_write(batch, ordered=False).modified_count
+                batch = []
+        if batch:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+    
+    changed = []
+    for entry in _iter_local_entries(batch_size):
+        derived = _derived_fields(entry)
+        if any(entry.get(key) != value for key, value in derived.items()):
+            entry.update(derived)
+            changed.append(entry)
+        if len(changed) >= batch_size:
+            if journal_store.put_many(changed):
+                updated += len(changed)
+            changed = []
+    if changed and journal_store.put_many(changed):
+        updated += len(changed)
+    
+    if updated:
+        journal_changed(mongodb=is_connected())
+        # Word counts were filled in, so the word total needs recounting
+        rebuild_journal_stats()
+    return updated
+
+
+def rebuild_search_index(batch_size=500):
+    """Rebuild the local search index and the MongoDB search fields
+    
+    Args:
+        batch_size (int): Number of MongoDB updates sent per bulk write
+        
+    Returns:
+        int: Number of entries indexed
+    """
+    indexed = search_index.rebuild(journal_store.all())
+    
+    if is_connected():
+        collection = get_collection(JOURNAL_COLLECTION)
+        ensure_indexes()
+        batch = []
+        fields = {'_id': 0, 'id': 1, 'title': 1, 'content': 1, 'author': 1}
+        for entry in collection.find({}, fields):
+            batch.append(UpdateOne({'id': entry['id']}, {'$set': mongo_search_fields(entry)}))
+            if len(batch) >= batch_size:
+                collection.bulk_write(batch, ordered=False)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            collection.bulk_write(batch, ordered=False)
+            indexed += len(batch)
+    
+    return indexed
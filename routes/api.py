@@ -3,12 +3,21 @@ API routes module.
 This module handles API endpoints for the application.
 """
 
-from flask import Blueprint, jsonify, redirect, url_for, session
+from flask import Blueprint, Response, jsonify, redirect, url_for, session, request, stream_with_context
 from datetime import datetime
-from utils.db import is_connected
-from models.journal import get_entry_count
+from utils.db import is_connected, get_connection_state, get_index_report
+from models.journal import (
+    get_entry_count, get_journal_stats, get_outbox_backlog, get_outbox_rejected, export_entries,
+    import_entries
+)
 from utils.date_utils import get_current_time
-from config import MONGODB_URI, IS_VERCEL
+from utils.gridfs_utils import get_image_cache_stats, get_image_flight_stats
+from config import MONGODB_URI, IS_VERCEL, USE_GRIDFS_STORAGE
+
+if USE_GRIDFS_STORAGE:
+    from utils.gridfs_utils import get_memory_cache_stats
+else:
+    from utils.local_storage import get_memory_cache_stats
 
 # Create blueprint
 api_bp = Blueprint('api', __name__)
@@ -32,7 +41,13 @@ def status():
     # Build status object
     status_data = {
         'mongodb_connected': is_connected(),
+        'mongodb_breaker_state': get_connection_state(),
         'entries_count': entries_count,
+        'outbox_pending': get_outbox_backlog(),
+        'outbox_rejected': get_outbox_rejected(),
+        'image_disk_cache': get_image_cache_stats(),
+        'image_memory_cache': get_memory_cache_stats(),
+        'image_single_flight': get_image_flight_stats(),
         'vercel': IS_VERCEL,
         'mongodb_uri_configured': MONGODB_URI is not None,
         'time': now.strftime('%Y-%m-%d %H:%M:%S'),
@@ -42,6 +57,23 @@ def status():
     return jsonify(status_data)
 
 
+@api_bp.route('/stats', methods=['GET'])
+def stats():
+    """Journal statistics
+    
+    Returns entry totals, entries per author and per month, total words
+    and the first and last entry dates
+    """
+    if not session.get('logged_in'):
+        return redirect(url_for('auth.login'))
+    
+    journal_stats = get_journal_stats()
+    if journal_stats is None:
+        return jsonify({'status': 'error'}), 500
+    
+    return jsonify({'status': 'ok', **journal_stats})
+
+
 @api_bp.route('/health', methods=['GET'])
 def health():
     """Health check endpoint
@@ -75,4 +107,56 @@ def test_db():
     else:
         result['connection_status'] = 'Not Connected'
     
-    return jsonify(result)
\ No newline at end of file
+    return jsonify(result)
+
+
+@api_bp.route('/journal/export', methods=['GET'])
+def journal_export():
+    """Export all journal entries as NDJSON
+    
+    The response is streamed one entry per line, oldest first
+    """
+    if not session.get('logged_in'):
+        return redirect(url_for('auth.login'))
+    
+    filename = f"journal-{get_current_time().strftime('%Y%m%d-%H%M%S')}.ndjson"
+    return Response(
+        stream_with_context(export_entries()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+@api_bp.route('/journal/import', methods=['POST'])
+def journal_import():
+    """Import journal entries from NDJSON
+    
+    Accepts the NDJSON as the request body or as an uploaded 'file', and
+    reports per-record errors by line number
+    """
+    if not session.get('logged_in'):
+        return redirect(url_for('auth.login'))
+    
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    report = import_entries(stream)
+    report['status'] = 'ok' if not report['failed'] else 'partial'
+    
+    return jsonify(report)
+
+
+@api_bp.route('/indexes', methods=['GET'])
+def indexes():
+    """MongoDB index diagnostics
+    
+    Reports required indexes that are missing and indexes that have not
+    been used since the server last restarted
+    """
+    if not session.get('logged_in'):
+        return redirect(url_for('auth.login'))
+    
+    report = get_index_report()
+    if report is None:
+        return jsonify({'status': 'unavailable', 'mongodb_connected': False}), 503
+    
+    return jsonify({'status': 'ok', 'collections': report})
@@ -4,12 +4,18 @@ This module handles all gallery-related routes such as displaying images,
 uploading images, deleting images, etc.
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app, send_file, Response, send_from_directory
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app, send_file, Response, send_from_directory, jsonify
+from werkzeug.wsgi import wrap_file
+from werkzeug.http import is_resource_modified
+from concurrent.futures import ThreadPoolExecutor
 from utils.date_utils import get_current_time
 import io
 import os
 
-from config import USE_GRIDFS_STORAGE
+from config import (
+    USE_GRIDFS_STORAGE, IMAGE_RENDITIONS, IMAGE_CACHE_MAX_AGE,
+    GALLERY_BATCH_MAX_LENGTH, GALLERY_UPLOAD_WORKERS
+)
 
 # Import appropriate storage module based on configuration
 if USE_GRIDFS_STORAGE:
@@ -17,7 +23,12 @@ if USE_GRIDFS_STORAGE:
         upload_image,
         delete_image,
         get_image_files,
+        get_images_page,
         get_image_file,
+        get_cached_image,
+        get_memory_image,
+        remember_image,
+        next_image_number,
         allowed_file, 
         check_file_size
     )
@@ -26,7 +37,9 @@ else:
         upload_image,
         delete_image,
         get_image_files,
+        get_images_page,
         get_image_file,
+        next_image_number,
         allowed_file, 
         check_file_size
     )
@@ -37,39 +50,163 @@ gallery_bp = Blueprint('gallery', __name__)
 
 @gallery_bp.route('/gallery')
 def gallery_view():
-    """Display the gallery page with all images"""
+    """Display one page of the gallery, newest images first"""
     if not session.get('logged_in'):
         return redirect(url_for('auth.login'))
     
-    # Get images from GridFS
-    images = get_image_files()
+    # Get the page from the image index; before/after are display order cursors
+    page = get_images_page(before=request.args.get('before', type=int),
+                           after=request.args.get('after', type=int))
     
     today = get_current_time()
     
     return render_template('gallery.html',
-                         images=images,
+                         images=page['images'],
+                         next_cursor=page['next_cursor'],
+                         prev_cursor=page['prev_cursor'],
                          current_year=today.year)
 
 
+def get_rendition_args():
+    """Get the requested rendition from the query string
+    
+    Returns:
+        tuple: (size, fmt); size is None for the original, fmt is 'webp' or None
+    """
+    size = request.args.get('size')
+    if size not in IMAGE_RENDITIONS:
+        size = None
+    fmt = 'webp' if request.args.get('format') == 'webp' else None
+    return size, fmt
+
+
+def set_image_cache_headers(response, immutable):
+    """Set the Cache-Control header of an image response
+    
+    Args:
+        response (Response): Image response, with its validators already set
+        immutable (bool): True if the URL always serves these bytes, so
+            browsers may keep them for IMAGE_CACHE_MAX_AGE without asking;
+            otherwise they revalidate with the ETag and Last-Modified first
+    """
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMAGE_CACHE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = None
+        response.cache_control.no_cache = True
+
+
+def send_memory_image(entry):
+    """Build the response for an image held in memory
+    
+    Args:
+        entry (dict): Entry of the in-memory image cache
+        
+    Returns:
+        Response: The image, or a 304 or 206 for conditional and Range requests
+    """
+    response = Response(entry['data'], mimetype=entry['content_type'])
+    response.set_etag(entry['etag'])
+    response.last_modified = entry['last_modified']
+    response.headers.set('Content-Disposition', 'inline', filename=entry['filename'])
+    version = entry['version']
+    set_image_cache_headers(response, entry['immutable'] or (
+        version is not None and request.args.get('v') == version))
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(entry['data']))
+
+
 @gallery_bp.route('/images/<file_id>')
 def serve_image(file_id):
     """Serve an image from storage by its ID
     
+    A ?size= of one of IMAGE_RENDITIONS (e.g. 'thumb') serves that rendition
+    instead of the original, as WebP with ?format=webp. Images without the
+    rendition fall back to the original.
+    
+    GridFS images are streamed one chunk at a time, Range requests get a
+    206 with just the requested bytes, and HEAD requests read no chunks.
+    The ETag is the GridFS file ID, so If-None-Match and If-Modified-Since
+    are answered with a 304 from the file document alone. Originals never
+    change and are cached for good; renditions are when the URL carries
+    their current version (?v=).
+    
+    Images up to IMAGE_MEMORY_CACHE_MAX_ITEM (thumbnails, mostly) are kept
+    in memory after their first GET, keyed by the version of the file
+    served. Rendition URLs carrying that version are then answered without
+    any database query; others still look the file up first, so changed or
+    deleted images are never served from memory. Larger images are served
+    from a local disk copy, made on their first full GET, so images shown
+    again do not read their chunks from MongoDB.
+    
     Args:
         file_id (str): The ID of the image to serve
         
     Returns:
         Response: The image file
     """
+    size, fmt = get_rendition_args()
     if USE_GRIDFS_STORAGE:
+        # Small hot renditions come straight from memory
+        entry = get_memory_image(file_id, size, fmt, request.args.get('v'))
+        if entry is not None:
+            return send_memory_image(entry)
+        
         # Serve from GridFS
-        result = get_image_file(file_id)
+        result = get_image_file(file_id, size, fmt)
         if not result:
             current_app.logger.error(f"Image not found: {file_id}")
             return "Image not found", 404
             
         grid_out, filename, content_type = result
-        response = Response(grid_out, mimetype=content_type)
+        metadata = grid_out.metadata or {}
+        if 'rendition_of' in metadata:
+            version = metadata.get('version')
+            immutable = version is not None and request.args.get('v') == version
+        else:
+            # A rendition URL that fell back to the original will change once
+            # the rendition exists
+            immutable = size is None
+        
+        # Requests that need the image's bytes are served from the local disk
+        # cache when possible; only full GETs fill it, as they read every chunk anyway
+        etag = str(grid_out._id)
+        if is_resource_modified(request.environ, etag=etag, last_modified=grid_out.upload_date):
+            if request.method == 'GET':
+                entry = remember_image(file_id, size, fmt, grid_out)
+                if entry is not None:
+                    return send_memory_image(entry)
+            path = get_cached_image(grid_out, fill=request.method == 'GET' and request.range is None)
+            if path:
+                try:
+                    # Sent with the server's zero-copy sendfile where available
+                    response = send_file(
+                        path,
+                        mimetype=content_type,
+                        download_name=filename,
+                        conditional=True,
+                        etag=etag,
+                        last_modified=grid_out.upload_date
+                    )
+                    set_image_cache_headers(response, immutable)
+                    return response
+                except FileNotFoundError:
+                    # Evicted by another worker meanwhile; read from GridFS
+                    pass
+        
+        response = Response(
+            wrap_file(request.environ, grid_out, buffer_size=grid_out.chunk_size),
+            mimetype=content_type,
+            direct_passthrough=True
+        )
+        response.content_length = grid_out.length
+        response.set_etag(etag)
+        response.last_modified = grid_out.upload_date
+        set_image_cache_headers(response, immutable)
+        # Answers 304s without reading chunks, and Range requests by seeking in the GridOut
+        response.make_conditional(request, accept_ranges=True, complete_length=grid_out.length)
         
         # Set content disposition header so browser knows how to handle the file
         if filename:
@@ -80,21 +217,56 @@ def serve_image(file_id):
         return response
     else:
         # For local storage, redirect to local_image route
-        return redirect(url_for('gallery.serve_local_image', filename=file_id))
+        return redirect(url_for('gallery.serve_local_image', filename=file_id,
+                                size=size, format=fmt, v=request.args.get('v')))
 
 
 @gallery_bp.route('/local-images/<filename>')
 def serve_local_image(filename):
     """Serve an image from local storage by its filename
     
+    Responses carry an ETag and Last-Modified from the file's modification
+    time and size. URLs with the file's current version (?v=) are cached
+    for good, others are revalidated. Images up to
+    IMAGE_MEMORY_CACHE_MAX_ITEM are kept in memory under that version, so
+    the file is still checked on every request but read only once.
+    
     Args:
         filename (str): The filename of the image to serve
         
     Returns:
         Response: The image file
     """
-    from config import UPLOAD_FOLDER
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    from config import UPLOAD_FOLDER, IMAGE_RENDITION_DIR
+    from utils.local_storage import (
+        get_rendition_file, get_image_version, get_memory_image, remember_image
+    )
+    
+    size, fmt = get_rendition_args()
+    version = request.args.get('v')
+    directory, name = UPLOAD_FOLDER, filename
+    current_version = None
+    if size:
+        rendition = get_rendition_file(filename, size, fmt)
+        # Otherwise fall back to the original; the URL will change once the rendition exists
+        if rendition:
+            directory, name = IMAGE_RENDITION_DIR, rendition
+            current_version = get_image_version(filename, size, fmt)
+    else:
+        current_version = get_image_version(filename)
+    immutable = version is not None and version == current_version
+    
+    # Small hot images come from memory; an original standing in for a
+    # missing rendition has no version and is not kept
+    if current_version is not None:
+        entry = (get_memory_image(filename, size, fmt, current_version) or
+                 remember_image(filename, size, fmt, directory, name))
+        if entry is not None:
+            return send_memory_image(entry)
+    
+    response = send_from_directory(directory, name)
+    set_image_cache_headers(response, immutable)
+    return response
     
     # Get image from GridFS
     result = get_image_file(file_id)
@@ -139,9 +311,8 @@ def upload():
             return redirect(url_for('gallery.gallery_view'))
         
         try:
-            # Get current images to determine next number
-            images = get_image_files()
-            next_number = len(images) + 1
+            # Allocate the next number; never reused, even after deletes
+            next_number = next_image_number()
             
             # Generate filename with sequential number
             new_filename = f"{next_number:02d}.jpg"
@@ -150,7 +321,7 @@ def upload():
             result = upload_image(file, new_filename)
             
             if result['success']:
-                flash('图片上传成功')
+                flash('这张图片已经上传过了' if result.get('duplicate') else '图片上传成功')
                 current_app.logger.info(f"Image upload successful: {result['filename']}")
             else:
                 flash(f'图片上传失败: {result["message"]}')
@@ -167,6 +338,90 @@ def upload():
     return redirect(url_for('gallery.gallery_view'))
 
 
+def upload_one(file):
+    """Validate, number and store one uploaded file
+    
+    Args:
+        file (FileStorage): The uploaded file
+        
+    Returns:
+        dict: Per-file result with 'name' (the uploaded file name),
+            'success', 'message' and, on success, 'id', 'filename' and
+            'duplicate' (True if the image was already stored)
+    """
+    result = {'name': file.filename, 'success': False}
+    if not file.filename or not allowed_file(file.filename):
+        result['message'] = '不支持的文件类型'
+        return result
+    
+    size_ok, message = check_file_size(file)
+    if not size_ok:
+        result['message'] = f'图片太大: {message}'
+        return result
+    
+    try:
+        upload = upload_image(file, f"{next_image_number():02d}.jpg")
+    except Exception as e:
+        current_app.logger.error(f"Image upload error: {str(e)}")
+        result['message'] = '服务器错误'
+        return result
+    
+    result.update(success=upload['success'], message=upload['message'])
+    if upload['success']:
+        result.update(id=upload['id'], filename=upload['filename'],
+                      duplicate=upload.get('duplicate', False))
+    return result
+
+
+@gallery_bp.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """Upload several images at once
+    
+    Takes the files in the 'images' field. At most GALLERY_UPLOAD_WORKERS
+    of them are processed at a time; decoding and resizing run in Pillow
+    without the GIL, so they use several cores. The request may be up to
+    GALLERY_BATCH_MAX_LENGTH and each file up to MAX_CONTENT_LENGTH.
+    
+    Returns:
+        Response: JSON with a result per file when the client accepts
+            JSON, otherwise a redirect to the gallery with a summary
+    """
+    if not session.get('logged_in'):
+        return redirect(url_for('auth.login'))
+    
+    # Must be set before the form is parsed
+    request.max_content_length = GALLERY_BATCH_MAX_LENGTH
+    files = [file for file in request.files.getlist('images') if file.filename]
+    
+    # Tasks run in a request context of their own over the same environ, for
+    # url_for and logging. A copy of this one would share its request, whose
+    # uploaded files are closed as soon as the first task pops it.
+    app = current_app._get_current_object()
+    environ = request.environ
+    
+    def upload_in_context(file):
+        with app.request_context(environ):
+            return upload_one(file)
+    
+    with ThreadPoolExecutor(max_workers=max(1, GALLERY_UPLOAD_WORKERS)) as executor:
+        results = list(executor.map(upload_in_context, files))
+    
+    uploaded = sum(1 for result in results if result['success'])
+    current_app.logger.info(f"Batch upload: {uploaded} of {len(results)} images stored")
+    
+    if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+        return jsonify({'uploaded': uploaded, 'failed': len(results) - uploaded, 'results': results})
+    
+    if not files:
+        flash('没有选择文件')
+    elif uploaded == len(results):
+        flash(f'{uploaded} 张图片上传成功')
+    else:
+        failed = [f"{result['name']}: {result['message']}" for result in results if not result['success']]
+        flash(f'{uploaded} 张图片上传成功, {len(failed)} 张失败 ({"; ".join(failed)})')
+    return redirect(url_for('gallery.gallery_view'))
+
+
 @gallery_bp.route('/storage-test')
 def storage_test():
     """Test the storage configuration"""
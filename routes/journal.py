@@ -5,9 +5,10 @@ adding entries, editing entries, etc.
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
-from utils.date_utils import get_current_time
+from utils.date_utils import get_current_time, parse_ymd, get_day_range
 from models.journal import (
-    get_all_entries, get_entry_by_id, create_entry, update_entry, delete_entry
+    get_entries_page, get_entry_by_id, create_entry, update_entry, delete_entry,
+    search_entries, get_entries_on_this_day
 )
 
 # Create blueprint
@@ -20,19 +21,69 @@ def journal_list():
     if not session.get('logged_in'):
         return redirect(url_for('auth.login'))
     
-    # Get sort parameter from query string
+    # Get sort, page cursor and date range parameters from query string
     sort = request.args.get('sort', 'newest')
+    cursor = request.args.get('cursor')
+    date_from = parse_ymd(request.args.get('from'))
+    date_to = parse_ymd(request.args.get('to'))
+    start, end = get_day_range(date_from, date_to)
     
-    # Get entries with appropriate sorting
+    # Get one page of entries with appropriate sorting
     if sort == 'oldest':
-        entries = get_all_entries('timestamp', False)
+        page = get_entries_page(cursor=cursor, sort_desc=False, start=start, end=end)
     else:  # default to newest
-        entries = get_all_entries('timestamp', True)
+        sort = 'newest'
+        page = get_entries_page(cursor=cursor, sort_desc=True, start=start, end=end)
     
     today = get_current_time()
     
     return render_template('journal.html',
+                         entries=page['entries'],
+                         sort=sort,
+                         date_from=date_from.strftime('%Y-%m-%d') if date_from else None,
+                         date_to=date_to.strftime('%Y-%m-%d') if date_to else None,
+                         next_cursor=page['next_cursor'],
+                         prev_cursor=page['prev_cursor'],
+                         current_year=today.year)
+
+
+@journal_bp.route('/journal/on-this-day')
+def on_this_day():
+    """Display entries written on this calendar day in earlier years"""
+    if not session.get('logged_in'):
+        return redirect(url_for('auth.login'))
+    
+    today = get_current_time()
+    # An optional ?date=YYYY-MM-DD looks back from another day
+    day = parse_ymd(request.args.get('date')) or today
+    
+    entries = get_entries_on_this_day(day)
+    
+    return render_template('on_this_day.html',
                          entries=entries,
+                         day=day.strftime('%m月%d日'),
+                         current_year=today.year)
+
+
+@journal_bp.route('/journal/search')
+def search():
+    """Search journal entries and display ranked results"""
+    if not session.get('logged_in'):
+        return redirect(url_for('auth.login'))
+    
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    
+    results = search_entries(query, page)
+    
+    today = get_current_time()
+    
+    return render_template('search.html',
+                         query=query,
+                         entries=results['entries'],
+                         total=results['total'],
+                         page=results['page'],
+                         has_next=results['has_next'],
                          current_year=today.year)
 
 
@@ -6,6 +6,7 @@ This module handles main page routes such as home page, etc.
 from flask import Blueprint, render_template, redirect, url_for, session
 from datetime import datetime
 from utils.date_utils import get_current_time, get_days_together, get_next_milestone
+from models.journal import get_journal_stats
 from config import LOVE_START_DATE
 
 # Create blueprint
@@ -31,8 +32,12 @@ def home():
     # Get next milestone
     next_milestone, days_to_milestone = get_next_milestone(LOVE_START_DATE)
     
+    # Journal statistics are materialized, so this is a single read
+    journal_stats = get_journal_stats()
+    
     return render_template('index.html', 
                          days_together=days_together,
+                         journal_stats=journal_stats,
                          today_date=today_date,
                          next_milestone=next_milestone,
                          days_to_milestone=days_to_milestone,
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Test script to verify that file locks serialize writers across processes.
+"""
+
+import os
+import sys
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+# Add the project directory to the Python path
+project_dir = Path(__file__).resolve().parent
+sys.path.append(str(project_dir))
+
+from utils.file_utils import read_json_file, write_json_file, update_json_file
+
+# Processes appending at the same time, and appends made by each
+WORKERS = 4
+APPENDS = 50
+
+
+def _append_items(path, worker):
+    """Append (worker, n) items to a JSON list, one read-modify-write each"""
+    for n in range(APPENDS):
+        update_json_file(path, lambda items: (items or []) + [[worker, n]])
+
+
+def test_multiprocess_append():
+    """Test that concurrent read-modify-write cycles lose no update"""
+    print("Starting multi-process append test...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'items.json')
+        write_json_file(path, [])
+
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        context = multiprocessing.get_context(method)
+        processes = [context.Process(target=_append_items, args=(path, worker))
+                     for worker in range(WORKERS)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            assert process.exitcode == 0, f"Worker exited with {process.exitcode}"
+
+        items = read_json_file(path)
+        print(f"Items written: {len(items)} of {WORKERS * APPENDS}")
+        assert len(items) == WORKERS * APPENDS
+        # Each worker's appends are all there, in the order it made them
+        for worker in range(WORKERS):
+            assert [n for w, n in items if w == worker] == list(range(APPENDS))
+
+    print("Multi-process append test completed successfully!")
+
+
+if __name__ == "__main__":
+    test_multiprocess_append()
+    print("All tests passed!")
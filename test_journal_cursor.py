@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Test script to verify that journal page cursors round-trip across pages.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add the project directory to the Python path
+project_dir = Path(__file__).resolve().parent
+sys.path.append(str(project_dir))
+
+import models.journal as journal
+from utils.journal_store import JournalLogStore
+from utils.sqlite_store import SQLiteJournalStore
+
+PAGE_SIZE = 4
+
+
+def _make_entries():
+    """Build entries whose timestamps repeat, so paging has to break ties by id"""
+    return [{
+        'id': f"{n:04d}",
+        'title': f"Entry {n}",
+        'content': f"Content {n}",
+        'excerpt': f"Content {n}",
+        'timestamp': 1700000000 + (n // 3) * 60
+    } for n in range(15)]
+
+
+def _walk_pages(sort_desc):
+    """Follow next cursors to the last page, then prev cursors back to the first"""
+    forward = [journal._load_entries_page(PAGE_SIZE, None, sort_desc)]
+    while forward[-1]['next_cursor']:
+        forward.append(journal._load_entries_page(PAGE_SIZE, forward[-1]['next_cursor'], sort_desc))
+
+    backward = [forward[-1]]
+    while backward[-1]['prev_cursor']:
+        backward.append(journal._load_entries_page(PAGE_SIZE, backward[-1]['prev_cursor'], sort_desc))
+    return forward, backward[::-1]
+
+
+def _ids(page):
+    return [entry['id'] for entry in page['entries']]
+
+
+def _check_store(store, entries):
+    """Page through one local store in both orders"""
+    for entry in entries:
+        assert store.put(entry)
+
+    saved_store, saved_connected = journal.journal_store, journal.is_connected
+    journal.journal_store, journal.is_connected = store, lambda: False
+    try:
+        for sort_desc in (True, False):
+            forward, backward = _walk_pages(sort_desc)
+            expected = sorted(entries, key=lambda e: (e['timestamp'], e['id']), reverse=sort_desc)
+            print(f"  sort_desc={sort_desc}: {[_ids(page) for page in forward]}")
+
+            # Forward pages cover every entry once, in order
+            assert [i for page in forward for i in _ids(page)] == [e['id'] for e in expected]
+            assert len(forward) == -(-len(entries) // PAGE_SIZE)
+            assert forward[0]['prev_cursor'] is None
+            # Coming back lands on the same pages
+            assert [_ids(page) for page in backward] == [_ids(page) for page in forward]
+    finally:
+        journal.journal_store, journal.is_connected = saved_store, saved_connected
+
+
+def test_cursor_round_trip():
+    """Test that prev cursors return exactly the pages next cursors went through"""
+    print("Starting journal cursor round-trip test...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        print("Log store:")
+        _check_store(JournalLogStore(os.path.join(directory, 'journal.ndjson'),
+                                     os.path.join(directory, 'journal.idx.json')),
+                     _make_entries())
+        print("SQLite store:")
+        _check_store(SQLiteJournalStore(os.path.join(directory, 'journal.sqlite3')),
+                     _make_entries())
+
+    # Bad cursors fall back to the first page instead of failing
+    assert journal.decode_cursor('not a cursor') is None
+
+    print("Journal cursor round-trip test completed successfully!")
+
+
+if __name__ == "__main__":
+    test_cursor_round_trip()
+    print("All tests passed!")
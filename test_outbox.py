@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Test script to verify that replaying outbox batches into MongoDB more than
+once is safe, and that rejected operations are kept as dead letters.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+from flask import Flask
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+# Add the project directory to the Python path
+project_dir = Path(__file__).resolve().parent
+sys.path.append(str(project_dir))
+
+import models.journal as journal
+from utils.outbox import Outbox, OutboxReconciler
+
+
+class StubCollection:
+    """Journal collection kept in a dict, supporting what the replay uses
+
+    Documents titled 'Rejected' fail validation like a bad document would.
+    """
+
+    def __init__(self):
+        self.docs = {}
+
+    def find(self, query, projection):
+        ids = query['id']['$in']
+        fields = [k for k, v in projection.items() if v and k != '_id']
+        return [{k: doc[k] for k in fields if k in doc}
+                for entry_id, doc in self.docs.items() if entry_id in ids]
+
+    def bulk_write(self, operations, ordered=True):
+        errors = []
+        for index, operation in enumerate(operations):
+            if isinstance(operation, ReplaceOne):
+                if operation._doc.get('title') == 'Rejected':
+                    errors.append({'index': index, 'code': 121, 'errmsg': 'Document failed validation'})
+                    continue
+                self.docs[operation._filter['id']] = dict(operation._doc)
+            else:
+                self.docs.pop(operation._filter['id'], None)
+        if errors:
+            raise BulkWriteError({'writeErrors': errors})
+
+
+def _make_records():
+    """Build puts, overwrites and deletes, a rejected put and a delete of a missing entry"""
+    return [
+        {'op': 'put', 'entry': {'id': '1', 'title': 'First', 'author': 'a', 'timestamp': 1}},
+        {'op': 'put', 'entry': {'id': '2', 'title': 'Second', 'author': 'a', 'timestamp': 2}},
+        {'op': 'put', 'entry': {'id': '1', 'title': 'First, edited', 'author': 'a', 'timestamp': 1}},
+        {'op': 'del', 'id': '2'},
+        {'op': 'put', 'entry': {'id': '3', 'title': 'Rejected', 'author': 'a', 'timestamp': 3}},
+        {'op': 'del', 'id': '4'},
+        {'op': 'put', 'entry': {'id': '2', 'title': 'Second, again', 'author': 'a', 'timestamp': 2}},
+    ]
+
+
+def _titles(collection):
+    return {entry_id: doc['title'] for entry_id, doc in collection.docs.items()}
+
+
+def test_replay_idempotency():
+    """Test that a batch replayed again after a crash before ack changes nothing"""
+    print("Starting outbox replay idempotency test...")
+
+    app = Flask(__name__)
+    collection = StubCollection()
+    stats_changes = []
+    saved = (journal.get_collection, journal.journal_changed, journal.record_stats_change,
+             journal.journal_outbox)
+
+    with tempfile.TemporaryDirectory() as directory, app.app_context():
+        outbox = Outbox(os.path.join(directory, 'journal.outbox.ndjson'))
+        journal.get_collection = lambda name: collection
+        journal.journal_changed = lambda mongodb=False: None
+        journal.record_stats_change = lambda removed, added, mongodb=False: stats_changes.append(
+            len(added) - len(removed))
+        journal.journal_outbox = outbox
+        try:
+            assert outbox.append(_make_records())
+            batches = []
+
+            def crash_before_ack(records):
+                # The second batch reaches MongoDB, but its ack never happens
+                applied = journal.replay_outbox_batch(records)
+                batches.append(len(records))
+                return applied and len(batches) < 2
+
+            reconciler = OutboxReconciler(outbox, crash_before_ack, lambda: True,
+                                          batch_size=2, pause=0)
+            assert reconciler.drain() == 2
+            print(f"After the crash: {outbox.pending()} pending, {_titles(collection)}")
+            assert outbox.pending() == len(_make_records()) - 2
+
+            # The unacknowledged batch is read again from the same offset
+            records, _ = outbox.read_batch(2)
+            assert records == _make_records()[2:4]
+
+            reconciler.replay = journal.replay_outbox_batch
+            assert reconciler.drain() == len(_make_records()) - 2
+            print(f"After the replay: {_titles(collection)}")
+            assert _titles(collection) == {'1': 'First, edited', '2': 'Second, again'}
+            # Documents carry the search fields, as after a normal write
+            assert 'search_title' in collection.docs['1']
+            # Replaying the batch twice did not count its entries twice
+            assert sum(stats_changes) == len(collection.docs)
+
+            # Drained completely: nothing pending and no queue files left behind
+            assert outbox.pending() == 0
+            assert not os.path.exists(outbox.path)
+            assert not os.path.exists(outbox.offset_path)
+
+            # The rejected put is kept as a dead letter with its error
+            dead_letters, _ = Outbox(outbox.rejected_path).read_batch(10)
+            print(f"Dead letters: {dead_letters}")
+            assert outbox.rejected() == 1
+            assert dead_letters[0]['entry']['id'] == '3'
+            assert dead_letters[0]['error'] == 'Document failed validation'
+
+            # Replaying the last batches once more leaves the same result
+            assert journal.replay_outbox_batch(_make_records()[5:])
+            assert _titles(collection) == {'1': 'First, edited', '2': 'Second, again'}
+            assert sum(stats_changes) == len(collection.docs)
+        finally:
+            (journal.get_collection, journal.journal_changed, journal.record_stats_change,
+             journal.journal_outbox) = saved
+
+    print("Outbox replay idempotency test completed successfully!")
+
+
+if __name__ == "__main__":
+    test_replay_idempotency()
+    print("All tests passed!")
@@ -0,0 +1,241 @@
+"""
+In-memory caching utilities.
+This module provides thread-safe LRU caches: one bounded by its number of
+entries, with an optional time-to-live, and one bounded by the total size
+of its values.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+# Returned by get() on a miss when no default is given
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded least-recently-used cache
+
+    When the cache is full, setting a new key evicts the entry that was
+    used least recently. Entries older than the TTL count as misses.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        """Initialize an empty cache
+
+        Args:
+            maxsize (int): Maximum number of entries
+            ttl (float, optional): Seconds an entry stays valid, forever if None
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Get a cached value and mark it as recently used
+
+        Args:
+            key: Cache key
+            default: Value returned on a miss
+
+        Returns:
+            The cached value, or default on a miss
+        """
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and self.ttl is not None and item[1] < time.monotonic():
+                del self._data[key]
+                item = _MISSING
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry if full
+
+        Args:
+            key: Cache key
+            value: Value to store
+        """
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Remove a key from the cache
+
+        Args:
+            key: Cache key
+
+        Returns:
+            bool: True if the key was cached
+        """
+        with self._lock:
+            return self._data.pop(key, _MISSING) is not _MISSING
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Get cache statistics
+
+        Returns:
+            dict: 'size', 'maxsize', 'hits' and 'misses'
+        """
+        with self._lock:
+            return {'size': len(self._data), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ByteLRUCache:
+    """Least-recently-used cache bounded by the total size of its values
+
+    When adding a value takes the cache over its byte budget, the entries
+    used least recently are evicted. Values larger than the per-item limit
+    are not cached at all, so a few large values cannot push out many
+    small ones. Entries stay valid until they are evicted or deleted.
+    """
+
+    def __init__(self, max_bytes, max_item_bytes=None, sizeof=len):
+        """Initialize an empty cache
+
+        Args:
+            max_bytes (int): Byte budget for all values together
+            max_item_bytes (int, optional): Largest value cached, max_bytes if None
+            sizeof (callable): Gets the size of a value in bytes
+        """
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_bytes if max_item_bytes is None else max_item_bytes
+        self.sizeof = sizeof
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def get(self, key, default=None):
+        """Get a cached value and mark it as recently used
+
+        Args:
+            key: Cache key
+            default: Value returned on a miss
+
+        Returns:
+            The cached value, or default on a miss
+        """
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def accepts(self, size):
+        """Check whether a value of a given size would be cached
+
+        Args:
+            size (int): Size of the value in bytes
+
+        Returns:
+            bool: True if the value is within the per-item limit
+        """
+        return size <= min(self.max_item_bytes, self.max_bytes)
+
+    def set(self, key, value):
+        """Store a value, evicting least recently used entries to make room
+
+        Args:
+            key: Cache key
+            value: Value to store
+
+        Returns:
+            bool: True if the value was cached, False if it is too large
+        """
+        size = self.sizeof(value)
+        with self._lock:
+            if not self.accepts(size):
+                self.rejected += 1
+                return False
+            old = self._data.pop(key, _MISSING)
+            if old is not _MISSING:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+            return True
+
+    def delete(self, key):
+        """Remove a key from the cache
+
+        Args:
+            key: Cache key
+
+        Returns:
+            bool: True if the key was cached
+        """
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+            if item is _MISSING:
+                return False
+            self._bytes -= item[1]
+            return True
+
+    def delete_matching(self, predicate):
+        """Remove every key a predicate matches
+
+        Args:
+            predicate (callable): Gets a key, returns True to remove it
+
+        Returns:
+            int: Number of keys removed
+        """
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                self._bytes -= self._data.pop(key)[1]
+            return len(keys)
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Get cache statistics
+
+        Returns:
+            dict: 'entries', 'bytes', 'max_bytes', 'max_item_bytes', 'hits',
+                'misses', 'evictions' and 'rejected' (values too large to cache)
+        """
+        with self._lock:
+            return {'entries': len(self._data), 'bytes': self._bytes,
+                    'max_bytes': self.max_bytes, 'max_item_bytes': self.max_item_bytes,
+                    'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'rejected': self.rejected}
+
+    def __len__(self):
+        return len(self._data)
@@ -89,4 +89,46 @@ def get_next_milestone(start_date=LOVE_START_DATE):
         next_hundred = hundreds_passed + 1
         milestone_text = f"{next_hundred * 100}天纪念日 ({format_date(next_milestone)})"
     
-    return milestone_text, days_to_milestone
\ No newline at end of file
+    return milestone_text, days_to_milestone
+
+def get_date_fields(timestamp):
+    """Get the normalized date fields stored on a journal entry
+    
+    Args:
+        timestamp (float): Unix timestamp
+        
+    Returns:
+        dict: 'ymd' as 'YYYY-MM-DD' and 'month_day' as 'MM-DD', in China timezone
+    """
+    date = datetime.fromtimestamp(timestamp or 0, CHINA_TIMEZONE)
+    return {'ymd': date.strftime('%Y-%m-%d'), 'month_day': date.strftime('%m-%d')}
+
+def parse_ymd(value):
+    """Parse a 'YYYY-MM-DD' date as the start of that day in China timezone
+    
+    Args:
+        value (str): Date string
+        
+    Returns:
+        datetime: Midnight of the day, or None if the value is missing or invalid
+    """
+    try:
+        return CHINA_TIMEZONE.localize(datetime.strptime(value or '', '%Y-%m-%d'))
+    except ValueError:
+        return None
+
+def get_day_range(start=None, end=None):
+    """Get the timestamp range covering whole days
+    
+    Args:
+        start (datetime, optional): First day, unbounded if None
+        end (datetime, optional): Last day (inclusive), unbounded if None
+        
+    Returns:
+        tuple: (start timestamp or None, end timestamp (exclusive) or None)
+    """
+    start_ts = start.timestamp() if start else None
+    end_ts = None
+    if end:
+        end_ts = CHINA_TIMEZONE.localize(end.replace(tzinfo=None) + timedelta(days=1)).timestamp()
+    return start_ts, end_ts
@@ -1,13 +1,171 @@
 import pymongo
+from pymongo import ReturnDocument
 import logging
+import threading
+import time
+from pymongo.errors import PyMongoError, OperationFailure
 from flask import current_app
-from config import MONGODB_URI, DB_NAME, JOURNAL_COLLECTION
+from config import (
+    MONGODB_URI,
+    DB_NAME,
+    JOURNAL_COLLECTION,
+    GRIDFS_COLLECTION,
+    COUNTERS_COLLECTION,
+    IMAGE_META_COLLECTION,
+    MONGODB_FAILURE_THRESHOLD,
+    MONGODB_RECOVERY_TIMEOUT,
+    MONGODB_PROBE_INTERVAL
+)
 
 # MongoDB global variables
 mongo_client = None
 db = None
 collections = {}
 
+# Indexes each collection needs, created idempotently once MongoDB is reachable
+REQUIRED_INDEXES = {
+    JOURNAL_COLLECTION: [
+        # Lookups, updates and deletes by entry id
+        {'keys': [('id', 1)], 'name': 'id_1', 'unique': True},
+        # Sorted and keyset-paginated listings
+        {'keys': [('timestamp', -1), ('id', -1)], 'name': 'timestamp_-1_id_-1'},
+        # Listings by author
+        {'keys': [('author', 1), ('timestamp', -1)], 'name': 'author_1_timestamp_-1'},
+        # "On this day" lookups; date ranges use the timestamp index
+        {'keys': [('month_day', 1), ('timestamp', -1)], 'name': 'month_day_1_timestamp_-1'},
+        # Full-text search over the pre-tokenized search fields
+        {'keys': [('search_title', 'text'), ('search_body', 'text')], 'name': 'journal_search',
+         'weights': {'search_title': 3, 'search_body': 1}, 'default_language': 'none'},
+    ],
+    f'{GRIDFS_COLLECTION}.files': [
+        # Image index rebuilds, in upload order
+        {'keys': [('uploadDate', -1)], 'name': 'uploadDate_-1'},
+        # Same index GridFS creates on first write
+        {'keys': [('filename', 1), ('uploadDate', 1)], 'name': 'filename_1_uploadDate_1'},
+        # Rendition lookups by original image, size and format
+        {'keys': [('metadata.rendition_of', 1), ('metadata.size', 1), ('metadata.format', 1)],
+         'name': 'rendition_of_1_size_1_format_1', 'sparse': True},
+    ],
+    IMAGE_META_COLLECTION: [
+        # Gallery pages, newest display order first
+        {'keys': [('display_order', -1)], 'name': 'display_order_-1', 'unique': True},
+        # One record per content hash, so concurrent uploads of the same
+        # image cannot both be listed; records without a hash are not indexed
+        {'keys': [('sha256', 1)], 'name': 'sha256_1', 'unique': True,
+         'partialFilterExpression': {'sha256': {'$type': 'string'}}},
+    ],
+}
+_indexes_ready = False
+
+
+class CircuitBreaker:
+    """Connection health state machine for MongoDB
+
+    The state is updated from the outcome of real operations and from a
+    low-rate background probe, so callers can check it without a round trip.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=3, recovery_timeout=30):
+        """Initialize the breaker in the closed state
+
+        Args:
+            failure_threshold (int): Consecutive failures before opening
+            recovery_timeout (float): Seconds to stay open before a trial request
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        # Thread sending the half-open trial request, and when it was let through
+        self._trial_in_flight = False
+        self._trial_thread = None
+        self._trial_started = 0.0
+        self.failure_count = 0
+
+    def _current_state(self):
+        """Get the state, moving from open to half-open once the recovery
+        timeout has elapsed; must be called with the lock held"""
+        if (self._state == self.OPEN and
+                time.monotonic() - self._opened_at >= self.recovery_timeout):
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    @property
+    def state(self):
+        """Current breaker state, moving from open to half-open once the
+        recovery timeout has elapsed"""
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self):
+        """Check whether an operation should be sent to MongoDB
+
+        While half-open only one caller, the trial, is let through until its
+        outcome is recorded; other callers are refused as if the breaker were
+        open. The trial's thread may check again before it records the
+        outcome. A trial whose outcome is never recorded is given up after
+        the recovery timeout, so the next caller becomes the trial.
+
+        Returns:
+            bool: True if the operation may be sent
+        """
+        with self._lock:
+            state = self._current_state()
+            if state != self.HALF_OPEN:
+                return state == self.CLOSED
+            now = time.monotonic()
+            if self._trial_in_flight:
+                if self._trial_thread == threading.get_ident():
+                    return True
+                if now - self._trial_started < self.recovery_timeout:
+                    return False
+            self._trial_in_flight = True
+            self._trial_thread = threading.get_ident()
+            self._trial_started = now
+            return True
+
+    def record_success(self):
+        """Record a successful operation and close the breaker"""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logging.info("MongoDB circuit breaker closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Record a failed operation, opening the breaker when the failure
+        threshold is reached or the half-open trial fails"""
+        with self._lock:
+            self._failures += 1
+            self.failure_count += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logging.warning("MongoDB circuit breaker opened")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def trip(self):
+        """Open the breaker immediately"""
+        with self._lock:
+            self._state = self.OPEN
+            self._failures = self.failure_threshold
+            self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+breaker = CircuitBreaker(MONGODB_FAILURE_THRESHOLD, MONGODB_RECOVERY_TIMEOUT)
+_probe_thread = None
+
+
 def init_mongodb_connection():
     """Initialize MongoDB connection"""
     global mongo_client, db, collections
@@ -15,23 +173,38 @@ def init_mongodb_connection():
         if MONGODB_URI:
             # Set shorter connection timeout to avoid long waits
             mongo_client = pymongo.MongoClient(
-                MONGODB_URI, 
+                MONGODB_URI,
                 serverSelectionTimeoutMS=5000,
                 connectTimeoutMS=5000,
                 socketTimeoutMS=5000
             )
-            # Verify connection success
-            mongo_client.server_info()
-            
             db = mongo_client[DB_NAME]
             # Initialize journal collection
             collections[JOURNAL_COLLECTION] = db[JOURNAL_COLLECTION]
-            
+
+            # Keep probing in the background so the breaker recovers on its own
+            start_health_probe()
+
+            # Verify connection success
+            try:
+                mongo_client.server_info()
+            except PyMongoError as e:
+                # Keep the client so the probe can close the breaker later
+                breaker.trip()
+                try:
+                    current_app.logger.error(f"MongoDB connection error: {e}")
+                except RuntimeError:
+                    logging.error(f"MongoDB connection error: {e}")
+                return False
+
+            breaker.record_success()
             try:
                 current_app.logger.info("MongoDB connection successful")
             except RuntimeError:
                 # If outside of app context, use regular logging
                 logging.info("MongoDB connection successful")
+
+            ensure_indexes()
             return True
         else:
             try:
@@ -51,7 +224,7 @@ def init_mongodb_connection():
 
 def get_db():
     """Get MongoDB database instance
-    
+
     Returns:
         Database: MongoDB database instance or None if not connected
     """
@@ -61,29 +234,302 @@ def get_db():
     return db
 
 def is_connected():
-    """Check if MongoDB is connected
-    
+    """Check if MongoDB is available
+
+    This only reads the circuit breaker state and never sends a command to
+    the server, so it is safe to call before every operation.
+
     Returns:
-        bool: True if connected, False otherwise
+        bool: True if MongoDB is configured and the breaker allows requests
+    """
+    if not mongo_client:
+        return False
+    return breaker.allow_request()
+
+def get_connection_state():
+    """Get the MongoDB connection health state
+
+    Returns:
+        str: 'closed', 'open' or 'half-open', or 'disabled' without a client
+    """
+    if not mongo_client:
+        return 'disabled'
+    return breaker.state
+
+def get_failure_count():
+    """Get the number of failed MongoDB operations recorded so far
+
+    Returns:
+        int: Failures since the process started
+    """
+    return breaker.failure_count
+
+def record_success():
+    """Record a successful MongoDB operation"""
+    breaker.record_success()
+
+def record_failure(error=None):
+    """Record a failed MongoDB operation
+
+    Args:
+        error (Exception, optional): The error raised by the operation
+    """
+    breaker.record_failure()
+    if error is not None:
+        try:
+            current_app.logger.warning(f"MongoDB operation failed: {error}")
+        except RuntimeError:
+            logging.warning(f"MongoDB operation failed: {error}")
+
+def ping_mongodb():
+    """Ping the MongoDB server and feed the result into the breaker
+
+    Returns:
+        bool: True if the server answered, False otherwise
     """
-    global mongo_client
     if not mongo_client:
         return False
     try:
-        # Try to ping database server
         mongo_client.admin.command('ping')
-        return True
-    except:
+        breaker.record_success()
+    except PyMongoError:
+        breaker.record_failure()
+        return False
+
+    # Provision indexes that could not be created while MongoDB was down
+    if not _indexes_ready:
+        ensure_indexes()
+    return True
+
+def _probe_loop(interval):
+    """Background loop that pings MongoDB at a low rate"""
+    while True:
+        time.sleep(interval)
+        ping_mongodb()
+
+def start_health_probe(interval=MONGODB_PROBE_INTERVAL):
+    """Start the background health probe thread if it is not running
+
+    Args:
+        interval (float): Seconds between probes, 0 disables the probe
+
+    Returns:
+        bool: True if the probe is running
+    """
+    global _probe_thread
+    if interval <= 0:
         return False
+    if _probe_thread is not None and _probe_thread.is_alive():
+        return True
+    _probe_thread = threading.Thread(
+        target=_probe_loop, args=(interval,), name='mongodb-health-probe', daemon=True
+    )
+    _probe_thread.start()
+    return True
 
 def get_collection(collection_name=JOURNAL_COLLECTION):
     """Get MongoDB collection
-    
+
     Args:
         collection_name: Name of collection to retrieve (defaults to journal collection)
-    
+
     Returns:
         MongoDB collection object or None if not connected
     """
     global collections
-    return collections.get(collection_name)
\ No newline at end of file
+    return collections.get(collection_name)
+
+def get_counter(name):
+    """Read a named counter
+
+    Args:
+        name (str): Counter name
+
+    Returns:
+        int: Current value, 0 if the counter does not exist yet
+    """
+    doc = db[COUNTERS_COLLECTION].find_one({'_id': name}, {'value': 1})
+    return doc['value'] if doc else 0
+
+def increment_counter(name, amount=1):
+    """Atomically increment a named counter, creating it if needed
+
+    Args:
+        name (str): Counter name
+        amount (int): Amount to add
+
+    Returns:
+        int: Value after the increment
+    """
+    doc = db[COUNTERS_COLLECTION].find_one_and_update(
+        {'_id': name},
+        {'$inc': {'value': amount}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc['value']
+
+def _find_index(existing, spec, any_options=False):
+    """Find the existing index matching a required index spec
+
+    Args:
+        existing (dict): Result of Collection.index_information()
+        spec (dict): Entry of REQUIRED_INDEXES
+        any_options (bool): Also match an index whose uniqueness differs
+            from the spec's
+
+    Returns:
+        str: Name of the matching index, or None if it is missing
+    """
+    keys = [tuple(key) for key in spec['keys']]
+    for name, info in existing.items():
+        if name != spec['name'] and [tuple(key) for key in info.get('key', [])] != keys:
+            continue
+        if any_options or bool(info.get('unique')) == bool(spec.get('unique')):
+            return name
+    return None
+
+def ensure_indexes():
+    """Create and verify the indexes listed in REQUIRED_INDEXES
+
+    Indexes that already exist (by name or by key pattern) are left alone,
+    so this is safe to run on every start. Existing indexes are never
+    dropped: one that differs only in uniqueness, e.g. an index made unique
+    later, is reported and left for `flask db rebuild-indexes`.
+
+    Returns:
+        dict: Mapping of collection name to the names of missing indexes
+    """
+    global _indexes_ready
+    if db is None:
+        return {}
+
+    missing = {}
+    mismatched = {}
+    for collection_name, specs in REQUIRED_INDEXES.items():
+        collection = db[collection_name]
+        try:
+            existing = collection.index_information()
+            for spec in specs:
+                if _find_index(existing, spec):
+                    continue
+                if _find_index(existing, spec, any_options=True):
+                    mismatched.setdefault(collection_name, []).append(spec['name'])
+                    continue
+                options = {k: v for k, v in spec.items() if k != 'keys'}
+                try:
+                    collection.create_index(spec['keys'], **options)
+                except OperationFailure as e:
+                    # e.g. duplicate ids prevent the unique index
+                    try:
+                        current_app.logger.error(f"Could not create index {spec['name']} on {collection_name}: {e}")
+                    except RuntimeError:
+                        logging.error(f"Could not create index {spec['name']} on {collection_name}: {e}")
+
+            # Verify what is actually there now
+            existing = collection.index_information()
+            absent = [spec['name'] for spec in specs
+                      if not _find_index(existing, spec, any_options=True)]
+            if absent:
+                missing[collection_name] = absent
+        except PyMongoError as e:
+            try:
+                current_app.logger.error(f"Index provisioning failed for {collection_name}: {e}")
+            except RuntimeError:
+                logging.error(f"Index provisioning failed for {collection_name}: {e}")
+            return None
+
+    _indexes_ready = not missing
+    if missing:
+        try:
+            current_app.logger.warning(f"Missing MongoDB indexes: {missing}")
+        except RuntimeError:
+            logging.warning(f"Missing MongoDB indexes: {missing}")
+    if mismatched:
+        try:
+            current_app.logger.warning(f"MongoDB indexes with outdated options: {mismatched}; "
+                                       f"run `flask db rebuild-indexes` to recreate them")
+        except RuntimeError:
+            logging.warning(f"MongoDB indexes with outdated options: {mismatched}; "
+                            f"run `flask db rebuild-indexes` to recreate them")
+    return missing
+
+def rebuild_mismatched_indexes():
+    """Recreate required indexes whose options differ from REQUIRED_INDEXES
+
+    Each outdated index is dropped and created again from its spec. If the
+    new index cannot be built, e.g. because duplicate values prevent a
+    unique index, the old one is restored so the collection is never left
+    without it.
+
+    Returns:
+        dict: 'rebuilt' and 'failed', lists of (collection, index name, error)
+            entries; error is None for rebuilt indexes
+    """
+    result = {'rebuilt': [], 'failed': []}
+    if db is None:
+        return result
+
+    for collection_name, specs in REQUIRED_INDEXES.items():
+        collection = db[collection_name]
+        existing = collection.index_information()
+        for spec in specs:
+            if _find_index(existing, spec):
+                continue
+            outdated = _find_index(existing, spec, any_options=True)
+            if not outdated:
+                continue
+            old = existing[outdated]
+            options = {k: v for k, v in spec.items() if k != 'keys'}
+            collection.drop_index(outdated)
+            try:
+                collection.create_index(spec['keys'], **options)
+                result['rebuilt'].append((collection_name, spec['name'], None))
+            except OperationFailure as e:
+                old_options = {k: v for k, v in old.items() if k not in ('key', 'v', 'ns')}
+                collection.create_index(old['key'], name=outdated, **old_options)
+                result['failed'].append((collection_name, spec['name'], str(e)))
+    return result
+
+def get_index_report():
+    """Report missing and unused indexes for the managed collections
+
+    Unused indexes are those with no recorded accesses in $indexStats since
+    the server last restarted.
+
+    Returns:
+        dict: Per-collection report, or None if MongoDB is not connected
+    """
+    if db is None or not is_connected():
+        return None
+
+    report = {}
+    for collection_name, specs in REQUIRED_INDEXES.items():
+        collection = db[collection_name]
+        try:
+            existing = collection.index_information()
+        except PyMongoError as e:
+            record_failure(e)
+            return None
+        required = {_find_index(existing, spec, any_options=True) for spec in specs} - {None}
+        entry = {
+            'indexes': sorted(existing),
+            'missing': [spec['name'] for spec in specs
+                        if not _find_index(existing, spec, any_options=True)],
+            'mismatched': [spec['name'] for spec in specs
+                           if not _find_index(existing, spec)
+                           and _find_index(existing, spec, any_options=True)],
+            'unrequired': sorted(set(existing) - required - {'_id_'}),
+        }
+        try:
+            stats = collection.aggregate([{'$indexStats': {}}])
+            entry['unused'] = sorted(
+                stat['name'] for stat in stats
+                if stat['name'] != '_id_' and stat['accesses']['ops'] == 0
+            )
+        except OperationFailure as e:
+            # $indexStats needs the indexStats privilege, which not every user has
+            entry['unused'] = None
+            entry['error'] = str(e)
+        report[collection_name] = entry
+    return report
@@ -0,0 +1,190 @@
+"""
+Disk caching utilities.
+This module provides a bounded LRU cache of files in a local directory,
+used to keep copies of remotely stored files on local disk.
+"""
+
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from flask import current_app
+from utils.file_utils import ensure_directory_exists
+
+# Temporary fill files older than this (in seconds) were left by a crash
+STALE_TEMP_AGE = 3600
+
+
+def _log(level, message):
+    """Log through the Flask app logger, or the logging module outside of an app context"""
+    try:
+        getattr(current_app.logger, level)(message)
+    except RuntimeError:
+        getattr(logging, level)(message)
+
+
+class DiskCache:
+    """Bounded least-recently-used cache of files on local disk
+
+    Each entry is a file named after its key, so keys must be safe file
+    names such as hex IDs. Entries are filled through a temporary file that
+    then replaces the target, so readers never see a partial file. Once the
+    total size goes over the byte budget the least recently used entries
+    are deleted. Hits touch the file's modification time, which keeps the
+    recency order across restarts and between processes sharing the
+    directory.
+    """
+
+    def __init__(self, directory, max_bytes):
+        """Initialize the cache; the directory is scanned on first use
+
+        Args:
+            directory (str): Directory holding the cached files
+            max_bytes (int): Byte budget for all entries together
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = None
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        """Get the path of an entry"""
+        return os.path.join(self.directory, key)
+
+    def _scan(self):
+        """Load the entries from the directory, least recently used first
+
+        Must be called with the lock held. Temporary files left by
+        interrupted fills are removed.
+        """
+        ensure_directory_exists(self.directory)
+        found = []
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                if entry.name.endswith('.tmp'):
+                    if now - st.st_mtime > STALE_TEMP_AGE:
+                        os.remove(entry.path)
+                    continue
+                found.append((st.st_mtime, entry.name, st.st_size))
+            except FileNotFoundError:
+                # Removed by another process meanwhile
+                continue
+        found.sort()
+        self._entries = OrderedDict((name, size) for _, name, size in found)
+        self._size = sum(self._entries.values())
+
+    def get(self, key):
+        """Look up an entry and mark it as recently used
+
+        Args:
+            key (str): Entry key
+
+        Returns:
+            str: Path of the cached file, or None on a miss
+        """
+        path = self._path(key)
+        with self._lock:
+            if self._entries is None:
+                self._scan()
+            try:
+                os.utime(path)
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                # Never cached, or evicted by another process
+                if key in self._entries:
+                    self._size -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            # Possibly filled by another process
+            self._size += size - self._entries.get(key, 0)
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return path
+
+    def put(self, key, source, length=None):
+        """Copy a file into the cache
+
+        Args:
+            key (str): Entry key
+            source (file): Readable file object, copied from its current position
+            length (int, optional): Size of the data, if known in advance
+
+        Returns:
+            str: Path of the cached file, or None if the file is larger than
+                the whole budget or could not be written
+        """
+        if length is not None and length > self.max_bytes:
+            return None
+        path = self._path(key)
+        try:
+            ensure_directory_exists(self.directory)
+            fd, tmp_path = tempfile.mkstemp(prefix=key + '.', suffix='.tmp', dir=self.directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    shutil.copyfileobj(source, f, 1024 * 1024)
+                    size = f.tell()
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            _log('warning', f"Could not cache {key}: {e}")
+            return None
+
+        with self._lock:
+            if self._entries is None:
+                self._scan()
+            self._size += size - self._entries.get(key, 0)
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            self.fills += 1
+            if self._size > self.max_bytes:
+                self._evict(keep=key)
+        return path
+
+    def _evict(self, keep=None):
+        """Delete least recently used entries until the cache fits its budget
+
+        Must be called with the lock held. The directory is rescanned first,
+        so entries filled and used by other processes are counted too.
+
+        Args:
+            keep (str, optional): Key that must not be evicted
+        """
+        self._scan()
+        for key in list(self._entries):
+            if self._size <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self._size -= self._entries.pop(key)
+            self.evictions += 1
+
+    def stats(self):
+        """Get cache statistics
+
+        Returns:
+            dict: 'entries', 'bytes', 'max_bytes', 'hits', 'misses',
+                'fills' and 'evictions'
+        """
+        with self._lock:
+            return {'entries': len(self._entries or {}), 'bytes': self._size,
+                    'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses,
+                    'fills': self.fills, 'evictions': self.evictions}
@@ -1,15 +1,110 @@
 import os
 import json
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
 from flask import current_app
-from config import BASE_DIR
+from config import BASE_DIR, FILE_FSYNC_POLICY
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; locks then only cover threads of this process
+    fcntl = None
+
+# Fallback locks used when fcntl is not available, keyed by path
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+# Paths whose lock the current thread already holds
+_held_locks = threading.local()
 
 def ensure_directory_exists(directory):
     """Ensure directory exists"""
     if not os.path.exists(directory):
         os.makedirs(directory, exist_ok=True)
 
+@contextmanager
+def file_lock(file_path, blocking=True):
+    """Hold an exclusive advisory lock for a file
+
+    The lock is taken on a separate ``<file_path>.lock`` file, so it stays
+    valid when the file itself is atomically replaced. It serializes writers
+    across processes; readers do not need it. A thread may take the same
+    lock again while holding it.
+
+    Args:
+        file_path (str): Path of the file to lock
+        blocking (bool): Wait for the lock if True, give up at once if False
+
+    Yields:
+        bool: True if the lock is held, False if it was busy (non-blocking only)
+    """
+    key = os.path.abspath(file_path)
+    held = _held_locks.__dict__.setdefault('paths', set())
+    if key in held:
+        yield True
+        return
+
+    if fcntl is None:
+        with _thread_locks_guard:
+            lock = _thread_locks.setdefault(key, threading.Lock())
+        if not lock.acquire(blocking):
+            yield False
+            return
+        held.add(key)
+        try:
+            yield True
+        finally:
+            held.discard(key)
+            lock.release()
+        return
+
+    directory = os.path.dirname(file_path)
+    if directory:
+        ensure_directory_exists(directory)
+    with open(file_path + '.lock', 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        held.add(key)
+        try:
+            yield True
+        finally:
+            held.discard(key)
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def sync_file(f, replace=False):
+    """Flush a file and fsync it as required by FILE_FSYNC_POLICY
+
+    Args:
+        f (file): Open file object
+        replace (bool): True if the file is about to replace another one
+    """
+    f.flush()
+    if FILE_FSYNC_POLICY == 'always' or (replace and FILE_FSYNC_POLICY == 'replace'):
+        os.fsync(f.fileno())
+
+def sync_directory(directory):
+    """Fsync a directory after a file in it was replaced, unless the
+    FILE_FSYNC_POLICY is 'never'"""
+    if FILE_FSYNC_POLICY == 'never' or not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory or '.', os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
 def read_json_file(file_path):
-    """Read JSON data from file"""
+    """Read JSON data from file
+
+    Files are only ever replaced atomically, so this never sees a partial
+    write and does not take a lock.
+    """
     try:
         if os.path.exists(file_path):
             with open(file_path, 'r', encoding='utf-8') as f:
@@ -19,16 +114,64 @@ def read_json_file(file_path):
         current_app.logger.error(f"Error reading JSON file: {e}")
         return []
 
-def write_json_file(file_path, data):
-    """Write JSON data to file"""
+def write_json_file(file_path, data, indent=2):
+    """Write JSON data to file
+
+    The data is written to a temporary file that then replaces the target,
+    so readers see either the old or the new content. Pass indent=None for
+    large machine-read files; compact output is written by the much faster
+    C encoder.
+    """
     try:
         directory = os.path.dirname(file_path)
         if directory and not os.path.exists(directory):
             os.makedirs(directory, exist_ok=True)
-            
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=os.path.basename(file_path) + '.', suffix='.tmp', dir=directory or None
+        )
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(data, ensure_ascii=False, indent=indent))
+                sync_file(f, replace=True)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        sync_directory(directory)
         return True
     except Exception as e:
         current_app.logger.error(f"Error writing JSON file: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def update_json_file(file_path, update):
+    """Read, modify and rewrite a JSON file under an exclusive lock
+
+    Args:
+        file_path (str): Path of the JSON file
+        update (callable): Receives the current data and returns the new data
+
+    Returns:
+        bool: True if the file was written, False otherwise
+    """
+    with file_lock(file_path):
+        return write_json_file(file_path, update(read_json_file(file_path)))
+
+def file_sha256(f, chunk_size=1024 * 1024):
+    """Compute the SHA-256 of a seekable file's content
+
+    The file is read from the start one chunk at a time and rewound again.
+
+    Args:
+        f (file): Binary file object
+        chunk_size (int): Bytes read at a time
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+        digest.update(chunk)
+    f.seek(0)
+    return digest.hexdigest()
@@ -1,34 +1,98 @@
 """
 GridFS storage utility functions.
 This module handles all image-related operations with MongoDB GridFS.
+Each original image is stored along with its renditions, which are GridFS
+files whose metadata points back to the original. The gallery is listed
+from the IMAGE_META_COLLECTION index, which is kept in sync on upload and
+delete and also finds images by content hash, so the same image is only
+stored once.
 """
 
 import os
 import uuid
 import io
+import hashlib
 import logging
+from datetime import datetime, timezone
 from flask import current_app, url_for
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
 from pymongo import MongoClient
-from gridfs.synchronous import GridFS
-from utils.db import get_db, is_connected
+from gridfs.synchronous import GridFS, GridFSBucket, GridOut
+from gridfs.errors import NoFile
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+from utils.db import get_db, is_connected, increment_counter
+from utils.image_renditions import (
+    create_renditions, rendition_filename, rendition_sources, image_dimensions
+)
+from utils.image_meta import page_records, rendition_sizes, image_number, group_duplicates
+from utils.file_utils import file_sha256
+from utils.disk_cache import DiskCache
+from utils.cache import ByteLRUCache
+from utils.singleflight import SingleFlight
 from config import (
     ALLOWED_EXTENSIONS, 
     GRIDFS_COLLECTION, 
     USE_GRIDFS_STORAGE,
-    TEMP_UPLOAD_DIR
+    TEMP_UPLOAD_DIR,
+    IMAGE_META_COLLECTION,
+    COUNTERS_COLLECTION,
+    GALLERY_PAGE_SIZE,
+    IMAGE_DISK_CACHE_DIR,
+    IMAGE_DISK_CACHE_SIZE,
+    IMAGE_MEMORY_CACHE_SIZE,
+    IMAGE_MEMORY_CACHE_MAX_ITEM
 )
 
-# MongoDB GridFS instances
+# MongoDB GridFS instances, created once per database handle. fs writes
+# files (it keeps their content type); bucket reads and deletes them.
 fs = None
+bucket = None
+_gridfs_db = None
+
+# Matches original images only, not their renditions
+ORIGINALS_QUERY = {'metadata.rendition_of': {'$exists': False}}
+
+# Counter handing out the display order of new images
+DISPLAY_ORDER_COUNTER = 'image_display_order'
+# Counter handing out the numbers in uploaded images' file names
+IMAGE_SEQUENCE_COUNTER = 'image_sequence'
+
+# Index fields loaded for a gallery listing
+LISTING_FIELDS = {
+    'filename': 1, 'content_type': 1, 'length': 1, 'width': 1, 'height': 1,
+    'upload_date': 1, 'display_order': 1, 'renditions': 1, 'rendition_version': 1
+}
+
+# Local disk copies of served GridFS files, keyed by file ID
+image_cache = (DiskCache(IMAGE_DISK_CACHE_DIR, IMAGE_DISK_CACHE_SIZE)
+               if USE_GRIDFS_STORAGE and IMAGE_DISK_CACHE_SIZE > 0 else None)
+# Small images kept in memory, keyed by (file ID, size, format, version)
+# of the file served; renditions change version whenever they are recreated
+memory_cache = (ByteLRUCache(IMAGE_MEMORY_CACHE_SIZE, IMAGE_MEMORY_CACHE_MAX_ITEM,
+                             sizeof=lambda entry: len(entry['data']))
+                if USE_GRIDFS_STORAGE and IMAGE_MEMORY_CACHE_SIZE > 0 else None)
+
+# Concurrent identical loads (file documents, chunk reads, listings) share one call
+image_flight = SingleFlight()
+
+# Set once the index was found populated (or rebuilt) in this process
+_index_checked = False
+# Set once the image sequence counter was found (or seeded) in this process
+_sequence_seeded = False
 
 def init_gridfs_storage():
     """Initialize GridFS storage
     
+    The GridFS handles are created on first use and reused afterwards, so
+    this is cheap enough to call before every operation. Checking the
+    connection only reads the circuit breaker state.
+    
     Returns:
         bool: True if GridFS initialized successfully, False otherwise
     """
-    global fs
+    global fs, bucket, _gridfs_db
     if not USE_GRIDFS_STORAGE:
         try:
             current_app.logger.info("GridFS storage is disabled in configuration")
@@ -47,8 +111,14 @@ def init_gridfs_storage():
                 logging.error("MongoDB connection not available for GridFS")
             return False
         
-        # Create GridFS instance
+        # Reuse the handles unless the connection was re-established
+        if fs is not None and db is _gridfs_db:
+            return True
+        
+        # Create GridFS instances
         fs = GridFS(db, collection=GRIDFS_COLLECTION)
+        bucket = GridFSBucket(db, bucket_name=GRIDFS_COLLECTION)
+        _gridfs_db = db
         try:
             current_app.logger.info("GridFS storage initialized successfully")
         except RuntimeError:
@@ -110,9 +180,51 @@ def ensure_temp_directory():
         os.makedirs(TEMP_UPLOAD_DIR, exist_ok=True)
     return TEMP_UPLOAD_DIR
 
+def _seed_image_sequence():
+    """Raise the image sequence to the highest number already stored
+    
+    This reads the file name of every original image.
+    """
+    files = get_db()[f'{GRIDFS_COLLECTION}.files'].find(ORIGINALS_QUERY, {'filename': 1})
+    highest = max((image_number(doc.get('filename')) for doc in files), default=0)
+    # $max only ever raises the counter, so seeding twice is harmless
+    get_db()[COUNTERS_COLLECTION].update_one(
+        {'_id': IMAGE_SEQUENCE_COUNTER}, {'$max': {'value': highest}}, upsert=True
+    )
+
+def next_image_number():
+    """Allocate the number for the next uploaded image's file name
+    
+    Numbers come from an atomic $inc on a counter document, so concurrent
+    uploads never share one and deleted images' numbers are not reused.
+    Only a missing counter is seeded from the stored images; once it
+    exists it is ahead of every stored number, so cold starts read just the
+    counter document.
+    
+    Returns:
+        int: The allocated number
+    """
+    global _sequence_seeded
+    if not _sequence_seeded:
+        counter = get_db()[COUNTERS_COLLECTION].find_one({'_id': IMAGE_SEQUENCE_COUNTER}, {'_id': 1})
+        if counter is None:
+            _seed_image_sequence()
+        _sequence_seeded = True
+    return increment_counter(IMAGE_SEQUENCE_COUNTER)
+
 def upload_image(file, filename=None):
     """Upload image to GridFS
     
+    The upload is streamed into GridFS one chunk at a time and hashed
+    (SHA-256) from the same chunks, and the renditions are decoded from the
+    upload file, so the image is never held in memory as a whole. Werkzeug
+    spools larger uploads to disk.
+    
+    An image whose content is already stored is not kept; its chunks are
+    removed again and the result describes the existing image and has
+    'duplicate' set. The index allows one record per content hash, so when
+    two copies are uploaded at once the one indexed second is removed too.
+    
     Args:
         file (file): The file object to upload
         filename (str, optional): The filename to use
@@ -145,12 +257,61 @@ def upload_image(file, filename=None):
             extension = os.path.splitext(file.filename)[1]
             filename = f"{uuid.uuid4().hex}{extension}"
         
-        # Save to GridFS
-        file_id = fs.put(
-            file.read(), 
-            filename=filename,
-            content_type=file.content_type
-        )
+        # Save to GridFS one chunk at a time, hashing the same chunks
+        stream = file.stream
+        file_id = ObjectId()
+        grid_in = fs.new_file(_id=file_id, filename=filename, content_type=file.content_type)
+        try:
+            hasher = hashlib.sha256()
+            for chunk in iter(lambda: stream.read(grid_in.chunk_size), b''):
+                hasher.update(chunk)
+                grid_in.write(chunk)
+            sha256 = hasher.hexdigest()
+            
+            # Return the stored copy of an image uploaded before
+            existing = find_image_by_hash(sha256)
+            if existing is not None:
+                grid_in.abort()
+                return _duplicate_result(existing)
+            
+            # Save the renditions before the original is complete, so a
+            # listed original always has them
+            stream.seek(0)
+            renditions, version = store_renditions(file_id, filename, stream)
+            stream.seek(0)
+            width, height = image_dimensions(stream)
+            grid_in.metadata = {'renditions': rendition_sizes(renditions),
+                                'rendition_version': version, 'sha256': sha256}
+            grid_in.close()
+        except Exception:
+            # Remove the chunks written so far and the renditions
+            grid_in.abort()
+            _delete_renditions(file_id)
+            raise
+        
+        # List it in the gallery
+        record = {
+            '_id': file_id,
+            'filename': filename,
+            'content_type': file.content_type,
+            'length': grid_in.length,
+            'width': width,
+            'height': height,
+            'upload_date': datetime.now(timezone.utc),
+            'renditions': renditions,
+            'rendition_version': version,
+            'sha256': sha256
+        }
+        try:
+            index_image(record)
+        except DuplicateKeyError:
+            # A concurrent upload of the same image was indexed first
+            existing = find_image_by_hash(sha256)
+            if existing is None:
+                raise
+            bucket.delete(file_id)
+            _delete_renditions(file_id)
+            return _duplicate_result(existing)
         
         return {
             'success': True,
@@ -167,6 +328,33 @@ def upload_image(file, filename=None):
             'message': f"Upload failed: {str(e)}"
         }
 
+def _duplicate_result(existing):
+    """Build the upload result for an image that is already stored
+    
+    Args:
+        existing (dict): Index record of the stored copy
+        
+    Returns:
+        dict: Upload result with 'duplicate' set
+    """
+    return {
+        'success': True,
+        'duplicate': True,
+        'message': 'Image already uploaded',
+        'filename': existing['filename'],
+        'id': str(existing['_id']),
+        'public_url': url_for('gallery.serve_image', file_id=str(existing['_id']), _external=True)
+    }
+
+def _delete_renditions(file_id):
+    """Delete the renditions of an image from GridFS
+    
+    Args:
+        file_id (ObjectId): The ID of the original image
+    """
+    for rendition in bucket.find({'metadata.rendition_of': file_id}):
+        bucket.delete(rendition._id)
+
 def delete_image(file_id):
     """Delete image from GridFS
     
@@ -186,21 +374,26 @@ def delete_image(file_id):
         # Convert string ID to ObjectId
         obj_id = ObjectId(file_id)
         
-        # Check if file exists
-        if not fs.exists(obj_id):
-            return {
-                'success': False,
-                'message': 'File not found'
-            }
+        # Take it out of the gallery first, so it is never listed without its file
+        get_db()[IMAGE_META_COLLECTION].delete_one({'_id': obj_id})
+        forget_image(str(obj_id))
+        
+        # Delete file; a missing file raises NoFile
+        bucket.delete(obj_id)
         
-        # Delete file
-        fs.delete(obj_id)
+        # Delete its renditions
+        _delete_renditions(obj_id)
         
         return {
             'success': True,
             'message': 'Image deleted successfully'
         }
-        
+    
+    except (InvalidId, NoFile):
+        return {
+            'success': False,
+            'message': 'File not found'
+        }
     except Exception as e:
         current_app.logger.error(f"GridFS delete error: {e}")
         return {
@@ -208,53 +401,306 @@ def delete_image(file_id):
             'message': f"Delete failed: {str(e)}"
         }
 
+def _listing_item(record):
+    """Build a gallery listing entry from an index record
+    
+    Args:
+        record (dict): Image index record
+        
+    Returns:
+        dict: Image with its name, id, URLs and other metadata
+    """
+    file_id = str(record['_id'])
+    version = record.get('rendition_version')
+    return {
+        'name': record['filename'],
+        'id': file_id,
+        'url': url_for('gallery.serve_image', file_id=file_id, _external=True),
+        'size': record.get('length'),
+        'width': record.get('width'),
+        'height': record.get('height'),
+        'updated': record.get('upload_date'),
+        'content_type': record.get('content_type'),
+        **rendition_sources(
+            lambda size, fmt: url_for('gallery.serve_image', file_id=file_id, size=size,
+                                      format=fmt, v=version if size else None),
+            rendition_sizes(record.get('renditions'))
+        )
+    }
+
+def _ensure_index():
+    """Build the image index from GridFS if it is still empty
+    
+    Only the first call in a process checks; images stored before the index
+    existed are indexed once.
+    """
+    global _index_checked
+    if _index_checked:
+        return
+    if get_db()[IMAGE_META_COLLECTION].estimated_document_count() == 0:
+        rebuild_image_index()
+    _index_checked = True
+
+def get_images_page(before=None, after=None, limit=GALLERY_PAGE_SIZE):
+    """Get one page of the gallery, newest images first
+    
+    The page is one indexed range query on the image index that loads only
+    the listed fields, however many images are stored. Concurrent requests
+    for the same page share one query.
+    
+    Args:
+        before (int, optional): Display order the page starts below
+        after (int, optional): Display order the page ends above
+        limit (int): Images per page
+        
+    Returns:
+        dict: 'images', 'next_cursor' and 'prev_cursor'
+    """
+    empty = {'images': [], 'next_cursor': None, 'prev_cursor': None}
+    if not USE_GRIDFS_STORAGE or not init_gridfs_storage():
+        return empty
+    
+    try:
+        _ensure_index()
+        meta = get_db()[IMAGE_META_COLLECTION]
+        
+        def fetch(before, after, limit):
+            if after is not None:
+                query, direction = {'display_order': {'$gt': after}}, ASCENDING
+            else:
+                query = {'display_order': {'$lt': before}} if before is not None else {}
+                direction = DESCENDING
+            return list(meta.find(query, LISTING_FIELDS)
+                        .sort('display_order', direction).limit(limit))
+        
+        page = image_flight.do(('page', before, after, limit),
+                               lambda: page_records(fetch, before, after, limit))
+        return {
+            'images': [_listing_item(record) for record in page['records']],
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor']
+        }
+        
+    except Exception as e:
+        current_app.logger.error(f"Error listing GridFS images: {e}")
+        return empty
+
 def get_image_files():
     """Get list of image files from GridFS
     
+    Concurrent calls share one query.
+    
     Returns:
-        list: List of image file objects with name, id and other metadata
+        list: List of image file objects with name, id and other metadata,
+            newest first
     """
     if not USE_GRIDFS_STORAGE or not init_gridfs_storage():
         return []
     
     try:
-        # Find all files in GridFS
-        files = []
-        for grid_out in fs.find():
-            # Skip files without filenames
-            if not hasattr(grid_out, 'filename'):
-                continue
-                
-            # Skip if not an image file
-            if not allowed_file(grid_out.filename):
-                continue
-                
-            files.append({
-                'name': grid_out.filename,
-                'id': str(grid_out._id),
-                'url': url_for('gallery.serve_image', file_id=str(grid_out._id), _external=True),
-                'size': grid_out.length,
-                'updated': grid_out.upload_date,
-                'content_type': grid_out.content_type
-            })
-        
-        # Sort by upload date (newest first)
-        files.sort(key=lambda x: x['updated'], reverse=True)
-        
-        return files
+        _ensure_index()
+        records = image_flight.do('all', lambda: list(
+            get_db()[IMAGE_META_COLLECTION].find({}, LISTING_FIELDS).sort(
+                'display_order', DESCENDING)))
+        return [_listing_item(record) for record in records]
         
     except Exception as e:
         current_app.logger.error(f"Error listing GridFS images: {e}")
         return []
 
-def get_image_file(file_id):
+def find_image_by_hash(sha256):
+    """Find a stored image by the SHA-256 of its content
+    
+    Args:
+        sha256 (str): Hex digest
+        
+    Returns:
+        dict: Index record with '_id' and 'filename' of the earliest copy,
+            or None if the content is not stored
+    """
+    _ensure_index()
+    return get_db()[IMAGE_META_COLLECTION].find_one(
+        {'sha256': sha256}, {'filename': 1}, sort=[('display_order', ASCENDING)]
+    )
+
+def dedup_images(apply=False):
+    """Find images stored more than once and optionally remove the copies
+    
+    Images are compared by the SHA-256 of their content. Hashes missing
+    from images stored before uploads were hashed are computed and saved,
+    so later uploads of those images are recognized too. Of each set of
+    copies the one uploaded first is kept.
+    
+    Args:
+        apply (bool): Delete the copies instead of only reporting them
+        
+    Returns:
+        dict: 'duplicates' (number of copies), 'bytes' (their size with
+            their renditions) and 'groups' (list of (kept file name, list
+            of copy file names))
+    """
+    report = {'duplicates': 0, 'bytes': 0, 'groups': []}
+    if not USE_GRIDFS_STORAGE or not init_gridfs_storage():
+        return report
+    
+    _ensure_index()
+    meta = get_db()[IMAGE_META_COLLECTION]
+    files = get_db()[f'{GRIDFS_COLLECTION}.files']
+    
+    def digest(record):
+        if record.get('sha256'):
+            return record['sha256']
+        try:
+            sha256 = file_sha256(bucket.open_download_stream(record['_id']))
+        except NoFile:
+            return None
+        try:
+            meta.update_one({'_id': record['_id']}, {'$set': {'sha256': sha256}})
+        except DuplicateKeyError:
+            # A copy of an image whose record already has the hash
+            pass
+        files.update_one({'_id': record['_id']}, {'$set': {'metadata.sha256': sha256}})
+        return sha256
+    
+    records = list(meta.find({}, {'filename': 1, 'length': 1, 'sha256': 1})
+                   .sort('display_order', ASCENDING))
+    for kept, copies in group_duplicates(records, digest):
+        report['groups'].append((kept['filename'], [copy['filename'] for copy in copies]))
+        for copy in copies:
+            renditions = files.find({'metadata.rendition_of': copy['_id']}, {'length': 1})
+            report['bytes'] += (copy.get('length') or 0) + sum(r['length'] for r in renditions)
+            report['duplicates'] += 1
+            if apply:
+                delete_image(str(copy['_id']))
+    return report
+
+def index_image(record):
+    """Add an image to the gallery index
+    
+    A new image gets the next display order; a re-indexed one keeps its own.
+    
+    Args:
+        record (dict): Index record, with the GridFS file ID as '_id'
+        
+    Returns:
+        bool: True if the image was indexed. An image that could not be is
+            stored but not listed until `flask gallery rebuild-index` runs.
+        
+    Raises:
+        DuplicateKeyError: Another image with the same content hash is indexed
+    """
+    try:
+        meta = get_db()[IMAGE_META_COLLECTION]
+        existing = meta.find_one({'_id': record['_id']}, {'display_order': 1})
+        record['display_order'] = (existing['display_order'] if existing
+                                   else increment_counter(DISPLAY_ORDER_COUNTER))
+        meta.replace_one({'_id': record['_id']}, record, upsert=True)
+        return True
+    except DuplicateKeyError:
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Error indexing GridFS image: {e}")
+        return False
+
+def _index_record(grid_out):
+    """Build the index record of a stored original image
+    
+    Args:
+        grid_out (GridOut): The original image; only its header is read
+        
+    Returns:
+        dict: Index record without a display order
+    """
+    metadata = grid_out.metadata or {}
+    renditions = [
+        {'size': rendition.metadata['size'], 'format': rendition.metadata['format'],
+         'id': rendition._id}
+        for rendition in bucket.find({'metadata.rendition_of': grid_out._id})
+    ]
+    width, height = image_dimensions(grid_out)
+    return {
+        '_id': grid_out._id,
+        'filename': grid_out.filename,
+        'content_type': grid_out.content_type,
+        'length': grid_out.length,
+        'width': width,
+        'height': height,
+        'upload_date': grid_out.upload_date,
+        'renditions': renditions,
+        'rendition_version': metadata.get('rendition_version'),
+        'sha256': metadata.get('sha256')
+    }
+
+def rebuild_image_index():
+    """Rebuild the gallery index from the images stored in GridFS
+    
+    Indexed images keep their display order; the others are added in
+    upload order. Records of images that no longer exist are removed, and
+    the image sequence is raised past any numbers stored meanwhile.
+    
+    Returns:
+        int: Number of images indexed
+    """
+    global _index_checked
+    if not USE_GRIDFS_STORAGE or not init_gridfs_storage():
+        return 0
+    
+    meta = get_db()[IMAGE_META_COLLECTION]
+    indexed = []
+    for grid_out in bucket.find(ORIGINALS_QUERY, sort=[('uploadDate', ASCENDING)]):
+        if not getattr(grid_out, 'filename', None) or not allowed_file(grid_out.filename):
+            continue
+        record = _index_record(grid_out)
+        try:
+            if index_image(record):
+                indexed.append(grid_out._id)
+        except DuplicateKeyError:
+            # A copy of an indexed image; listed without its hash, so
+            # `flask gallery dedup` still finds it
+            record['sha256'] = None
+            if index_image(record):
+                indexed.append(grid_out._id)
+    meta.delete_many({'_id': {'$nin': indexed}})
+    _seed_image_sequence()
+    _index_checked = True
+    return len(indexed)
+
+def _find_image_document(obj_id, size, fmt):
+    """Find the file document of an image or its rendition
+    
+    Args:
+        obj_id (ObjectId): The ID of the original image
+        size (str): Rendition to find instead of the original, or None
+        fmt (str): 'webp' for the WebP rendition
+        
+    Returns:
+        dict: The file document, or None if the image does not exist. The
+            original's is returned if the rendition does not exist.
+    """
+    files = _gridfs_db[GRIDFS_COLLECTION].files
+    if size:
+        query = {'metadata.rendition_of': obj_id, 'metadata.size': size,
+                 'metadata.format': 'webp' if fmt == 'webp' else {'$in': ['jpeg', 'png']}}
+        document = files.find_one(query)
+        if document is not None:
+            return document
+    return files.find_one({'_id': obj_id})
+
+def get_image_file(file_id, size=None, fmt=None):
     """Get an image file from GridFS by its ID
     
+    Concurrent requests for the same image share one query for its file
+    document; each gets its own GridOut to read.
+    
     Args:
         file_id (str): The ID of the file to retrieve
+        size (str, optional): Rendition to get instead of the original
+        fmt (str, optional): 'webp' for the WebP rendition
         
     Returns:
-        tuple: (file_data, filename, content_type) or None if not found
+        tuple: (grid_out, filename, content_type) or None if not found.
+            grid_out is an open GridOut whose chunks are only fetched as it
+            is read. The original is returned if the rendition does not exist.
     """
     if not USE_GRIDFS_STORAGE or not init_gridfs_storage():
         return None
@@ -263,16 +709,224 @@ def get_image_file(file_id):
         # Convert string ID to ObjectId
         obj_id = ObjectId(file_id)
         
-        # Check if file exists
-        if not fs.exists(obj_id):
+        document = image_flight.do(('file', file_id, size, fmt),
+                                   lambda: _find_image_document(obj_id, size, fmt))
+        if document is None:
             return None
         
-        # Get file
-        grid_out = fs.get(obj_id)
+        # Open the file from its document, without another query. Its
+        # chunks are read only as it is read
+        grid_out = GridOut(_gridfs_db[GRIDFS_COLLECTION], file_document=document)
         
-        # Return file data
-        return grid_out.read(), grid_out.filename, grid_out.content_type
+        return grid_out, grid_out.filename, grid_out.content_type
     
+    except InvalidId:
+        return None
     except Exception as e:
         current_app.logger.error(f"Error getting GridFS image: {e}")
         return None
+
+def get_cached_image(grid_out, fill=True):
+    """Get a local disk copy of a GridFS file
+    
+    GridFS files are never rewritten, so a copy keyed by file ID never
+    goes stale. Concurrent misses for the same file share one copy.
+    
+    Args:
+        grid_out (GridOut): The file, as returned by get_image_file
+        fill (bool): Copy the file into the cache on a miss; this reads all
+            of its chunks
+        
+    Returns:
+        str: Path of the local copy, or None if the cache is disabled or
+            the file is not cached
+    """
+    if image_cache is None:
+        return None
+    key = str(grid_out._id)
+    path = image_cache.get(key)
+    if path is None and fill:
+        # A fill that finished while this request waited is reused
+        path = image_flight.do(('disk', key), lambda: (
+            image_cache.get(key) or image_cache.put(key, grid_out, grid_out.length)))
+    return path
+
+def get_image_cache_stats():
+    """Get the statistics of the local disk image cache
+    
+    Returns:
+        dict: Cache statistics, or None if the cache is disabled
+    """
+    return image_cache.stats() if image_cache is not None else None
+
+def get_memory_image(file_id, size, fmt, version):
+    """Get a rendition from the in-memory cache by the version in its URL
+    
+    A hit is confirmed with an indexed lookup of the original's _id, so an
+    image deleted by another worker is not served from this one's memory;
+    the chunks are never read. Recreated renditions get a new version, so
+    a URL naming the current one is never answered with older bytes. If
+    MongoDB cannot be asked, the cached copy is served.
+    
+    Args:
+        file_id (str): The ID in the request
+        size (str): Requested rendition
+        fmt (str): Requested format
+        version (str): Version in the request (?v=)
+        
+    Returns:
+        dict: Entry stored by remember_image, or None on a miss or for a
+            request without a rendition version
+    """
+    if memory_cache is None or not size or version is None:
+        return None
+    key = (file_id, size, fmt, version)
+    entry = memory_cache.get(key)
+    if entry is None or not is_connected() or not init_gridfs_storage():
+        return entry
+    
+    def exists():
+        files = _gridfs_db[GRIDFS_COLLECTION].files
+        return files.find_one({'_id': ObjectId(file_id)}, {'_id': 1}) is not None
+    
+    try:
+        found = image_flight.do(('exists', file_id), exists)
+    except Exception as e:
+        current_app.logger.error(f"Error checking GridFS image: {e}")
+        return entry
+    if not found:
+        forget_image(file_id)
+        return None
+    return entry
+
+def remember_image(file_id, size, fmt, grid_out):
+    """Get a small image from the in-memory cache, or keep it there
+    
+    The entry is keyed by the file actually served, so it is found again
+    only while that file is current. Concurrent misses for the same image
+    share one read of its chunks.
+    
+    Args:
+        file_id (str): The ID in the request
+        size (str): Requested rendition, None for the original
+        fmt (str): Requested format
+        grid_out (GridOut): The file served for the request, unread
+        
+    Returns:
+        dict: Entry with 'data', 'content_type', 'filename', 'etag',
+            'last_modified', 'version' (the URL version that may be cached
+            for good) and 'immutable' (cached for good whatever the URL),
+            or None if the image is too large, is an original standing in
+            for a missing rendition or the cache is disabled
+    """
+    if memory_cache is None:
+        return None
+    metadata = grid_out.metadata or {}
+    rendition = 'rendition_of' in metadata
+    if size and not rendition:
+        # The original stands in until the rendition exists; never kept
+        return None
+    version = metadata.get('version') if rendition else None
+    key = (file_id, size, fmt, version)
+    entry = memory_cache.get(key)
+    if entry is not None or not memory_cache.accepts(grid_out.length):
+        return entry
+    
+    def load():
+        entry = {
+            'data': grid_out.read(),
+            'content_type': grid_out.content_type,
+            'filename': grid_out.filename,
+            'etag': str(grid_out._id),
+            'last_modified': grid_out.upload_date,
+            'version': version,
+            # Originals are never rewritten
+            'immutable': not rendition
+        }
+        memory_cache.set(key, entry)
+        return entry
+    
+    return image_flight.do(('memory',) + key, load)
+
+def forget_image(file_id):
+    """Drop an image and its renditions from the in-memory cache
+    
+    Args:
+        file_id (str): The ID of the original image
+    """
+    if memory_cache is not None:
+        memory_cache.delete_matching(lambda key: key[0] == file_id)
+
+def get_memory_cache_stats():
+    """Get the statistics of the in-memory image cache
+    
+    Returns:
+        dict: Cache statistics, or None if the cache is disabled
+    """
+    return memory_cache.stats() if memory_cache is not None else None
+
+def get_image_flight_stats():
+    """Get the statistics of coalesced GridFS loads
+    
+    Returns:
+        dict: Loads made, loads shared with a concurrent request and loads
+            in flight
+    """
+    return image_flight.stats()
+
+def store_renditions(file_id, filename, data):
+    """Create and save the renditions of an image
+    
+    Args:
+        file_id (ObjectId): ID of the original image
+        filename (str): File name of the original image
+        data (bytes or file): Original image data, or a seekable file holding it
+        
+    Returns:
+        tuple: (renditions saved, dicts with 'size', 'format' and 'id';
+            version token of this set of renditions, which goes into their
+            URLs so caches can keep them)
+    """
+    renditions = []
+    version = str(ObjectId())
+    for rendition in create_renditions(data):
+        rendition_id = fs.put(
+            rendition['data'],
+            filename=rendition_filename(filename, rendition['size'], rendition['format']),
+            content_type=rendition['content_type'],
+            metadata={'rendition_of': file_id, 'size': rendition['size'],
+                      'format': rendition['format'], 'version': version}
+        )
+        renditions.append({'size': rendition['size'], 'format': rendition['format'],
+                           'id': rendition_id})
+    return renditions, version
+
+def backfill_renditions(force=False):
+    """Create renditions for images stored before they existed
+    
+    Args:
+        force (bool): Recreate the renditions of every image
+        
+    Returns:
+        int: Number of images processed
+    """
+    if not USE_GRIDFS_STORAGE or not init_gridfs_storage():
+        return 0
+    
+    files = get_db()[f'{GRIDFS_COLLECTION}.files']
+    query = dict(ORIGINALS_QUERY)
+    if not force:
+        query['metadata.renditions'] = {'$exists': False}
+    processed = 0
+    for grid_out in bucket.find(query):
+        _delete_renditions(grid_out._id)
+        renditions, version = store_renditions(grid_out._id, grid_out.filename, grid_out)
+        files.update_one({'_id': grid_out._id}, {'$set': {'metadata.renditions': rendition_sizes(renditions),
+                                                          'metadata.rendition_version': version}})
+        get_db()[IMAGE_META_COLLECTION].update_one(
+            {'_id': grid_out._id},
+            {'$set': {'renditions': renditions, 'rendition_version': version}}
+        )
+        forget_image(str(grid_out._id))
+        processed += 1
+    return processed
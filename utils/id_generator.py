@@ -0,0 +1,189 @@
+"""
+Entry ID generation utilities.
+This module provides time-ordered, collision-free ID generators for journal
+entries and a registry to pick one by name.
+"""
+
+import os
+import time
+import socket
+import hashlib
+import logging
+import threading
+from bson import ObjectId
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; node ID leases are then not possible
+    fcntl = None
+
+# Custom epoch for Snowflake IDs (2024-01-01T00:00:00Z), in milliseconds
+SNOWFLAKE_EPOCH_MS = 1704067200000
+
+# Bit layout: 41 bits of milliseconds, 10 bits of node, 12 bits of sequence
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# Snowflake IDs are zero-padded so string order matches numeric order
+SNOWFLAKE_DIGITS = 19
+
+# Open lease files of this process, keyed by node ID; closing one releases it
+_node_leases = {}
+
+
+def default_node_id():
+    """Derive a node ID from the host name and process ID
+
+    Returns:
+        int: Node ID between 0 and MAX_NODE_ID
+    """
+    seed = f"{socket.gethostname()}:{os.getpid()}".encode('utf-8')
+    return int.from_bytes(hashlib.sha1(seed).digest()[:4], 'big') & MAX_NODE_ID
+
+
+def lease_node_id(directory, node_id=None):
+    """Reserve a node ID for this process with a lock file lease
+
+    The lease is an exclusive lock on ``<directory>/node-<id>.lock`` held
+    until the process exits, so processes sharing the directory never hold
+    the same node ID at the same time.
+
+    Args:
+        directory (str): Directory of the lease files
+        node_id (int, optional): Node ID to reserve; the first free one
+            (starting from default_node_id()) if None
+
+    Returns:
+        int: Reserved node ID, or None if none could be reserved
+    """
+    if fcntl is None:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    start = default_node_id() if node_id is None else node_id
+    candidates = [node_id] if node_id is not None else [
+        (start + i) & MAX_NODE_ID for i in range(MAX_NODE_ID + 1)]
+    for candidate in candidates:
+        lease = _node_leases.get(candidate)
+        if lease is not None and lease[0] == os.getpid():
+            return candidate
+        f = open(os.path.join(directory, f'node-{candidate}.lock'), 'a')
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            continue
+        _node_leases[candidate] = (os.getpid(), f)
+        return candidate
+    return None
+
+
+class SnowflakeIdGenerator:
+    """Snowflake-style ID generator
+
+    IDs combine the milliseconds since SNOWFLAKE_EPOCH_MS, a node ID and a
+    per-millisecond sequence, so they are unique across processes with
+    distinct node IDs and sort in creation order.
+    """
+
+    def __init__(self, node_id=None, allocate_node_id=None):
+        """Initialize the generator
+
+        Args:
+            node_id (int, optional): Fixed node ID; only safe when a single
+                process generates IDs with it
+            allocate_node_id (callable, optional): Returns a node ID reserved
+                for the calling process, or None; called again after a fork.
+                Without one, or if it returns None, the node ID is hashed
+                from the host name and process ID, which may collide
+        """
+        if node_id is not None and not 0 <= node_id <= MAX_NODE_ID:
+            raise ValueError(f"Node ID must be between 0 and {MAX_NODE_ID}")
+        self._fixed_node_id = node_id
+        self._allocate_node_id = allocate_node_id
+        self._lock = threading.Lock()
+        self._pid = None
+        self._node_id = None
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _check_process(self):
+        """Reset per-process state when running in a forked worker"""
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._node_id = self._fixed_node_id
+            if self._node_id is None and self._allocate_node_id is not None:
+                self._node_id = self._allocate_node_id()
+            if self._node_id is None:
+                self._node_id = default_node_id()
+                logging.warning(f"Using hashed Snowflake node ID {self._node_id}; "
+                                f"it may collide with another process's")
+            self._last_ms = -1
+            self._sequence = 0
+
+    def __call__(self):
+        """Generate a new ID
+
+        Returns:
+            str: Zero-padded decimal ID
+        """
+        with self._lock:
+            self._check_process()
+            # Never step backwards if the wall clock does
+            now_ms = max(int(time.time() * 1000) - SNOWFLAKE_EPOCH_MS, self._last_ms)
+            if now_ms == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Sequence exhausted for this millisecond; borrow the next one
+                    now_ms = self._last_ms + 1
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            value = ((now_ms << (NODE_BITS + SEQUENCE_BITS)) |
+                     (self._node_id << SEQUENCE_BITS) | self._sequence)
+        return str(value).zfill(SNOWFLAKE_DIGITS)
+
+
+def objectid_generator():
+    """Generate an ID from a BSON ObjectId
+
+    Returns:
+        str: 24 character hex string, ordered by creation second
+    """
+    return str(ObjectId())
+
+
+def timestamp_generator():
+    """Generate an ID from the current Unix time in seconds
+
+    This is the original ID scheme; entries created in the same second
+    get the same ID.
+
+    Returns:
+        str: Unix timestamp as a string
+    """
+    return str(int(time.time()))
+
+
+def get_id_generator(name='snowflake', node_id=None, allocate_node_id=None):
+    """Get an ID generator by name
+
+    Args:
+        name (str): 'snowflake', 'objectid' or 'timestamp'
+        node_id (int, optional): Fixed node ID for the Snowflake generator
+        allocate_node_id (callable, optional): Node ID allocator for the
+            Snowflake generator, see SnowflakeIdGenerator
+
+    Returns:
+        callable: Function returning a new ID string on each call
+    """
+    if name == 'objectid':
+        return objectid_generator
+    if name == 'timestamp':
+        return timestamp_generator
+    if name != 'snowflake':
+        raise ValueError(f"Unknown ID generator: {name}")
+    return SnowflakeIdGenerator(node_id, allocate_node_id)
@@ -0,0 +1,366 @@
+"""
+Gallery image index utilities.
+The gallery is listed from an index with one small record per original
+image: file name, size, dimensions, upload date, display order and
+renditions. GridFS deployments keep it in the IMAGE_META_COLLECTION
+collection and local storage in IMAGE_META_FILE. This module holds the
+paging and image numbering shared by both and the JSON file used by local
+storage.
+"""
+
+import os
+import re
+import bisect
+import threading
+from utils.file_utils import read_json_file, write_json_file, file_lock
+from config import GALLERY_PAGE_SIZE
+
+# Bump when the layout of the local index changes; older copies are rebuilt
+INDEX_VERSION = 2
+
+# Uploaded images are named by sequence number, e.g. '07.jpg'
+_NUMBERED_FILENAME = re.compile(r'^(\d+)\.')
+
+
+def image_number(filename):
+    """Get the sequence number in an uploaded image's file name
+
+    Args:
+        filename (str): File name such as '07.jpg'
+
+    Returns:
+        int: The number, or 0 if the name is not numbered
+    """
+    match = _NUMBERED_FILENAME.match(filename or '')
+    return int(match.group(1)) if match else 0
+
+
+def find_rendition(renditions, size, fmt=None):
+    """Find a rendition in an index record
+
+    Args:
+        renditions (list): Renditions of the record, dicts with 'size',
+            'format' and 'id'
+        size (str): Rendition name, e.g. 'thumb'
+        fmt (str, optional): 'webp' for the WebP rendition, otherwise the
+            JPEG or PNG one
+
+    Returns:
+        dict: The rendition, or None if it does not exist
+    """
+    for rendition in renditions or []:
+        if rendition['size'] == size and (rendition['format'] == 'webp') == (fmt == 'webp'):
+            return rendition
+    return None
+
+
+def rendition_sizes(renditions):
+    """Get the renditions of an index record that exist in both formats
+
+    Args:
+        renditions (list): Renditions of the record
+
+    Returns:
+        list: Rendition names
+    """
+    sizes = []
+    for rendition in renditions or []:
+        size = rendition['size']
+        if (size not in sizes and find_rendition(renditions, size)
+                and find_rendition(renditions, size, 'webp')):
+            sizes.append(size)
+    return sizes
+
+
+def group_duplicates(records, digest):
+    """Group index records of images with the same content
+
+    Args:
+        records (iterable): Index records, in the order copies should be
+            kept (the first copy of each content is kept)
+        digest (callable): Gets the SHA-256 of a record's image, or None
+            if it cannot be read; such records are skipped
+
+    Returns:
+        list: (kept record, list of duplicate records) for each content
+            stored more than once
+    """
+    groups = {}
+    for record in records:
+        sha256 = digest(record)
+        if sha256:
+            groups.setdefault(sha256, []).append(record)
+    return [(group[0], group[1:]) for group in groups.values() if len(group) > 1]
+
+
+def page_records(fetch, before=None, after=None, limit=GALLERY_PAGE_SIZE):
+    """Get one page of index records, highest display order first
+
+    Pages are keyed on the display order, so each page is one range read
+    however many images come before it.
+
+    Args:
+        fetch (callable): fetch(before, after, limit) returns up to limit
+            records with a display order below before in descending order,
+            or above after in ascending order
+        before (int, optional): Display order of the last record of the
+            previous page, for the page after it
+        after (int, optional): Display order of the first record of the
+            next page, for the page before it
+        limit (int): Records per page
+
+    Returns:
+        dict: 'records', 'next_cursor' (before= of the next page) and
+            'prev_cursor' (after= of the previous page), None at either end
+    """
+    if after is not None:
+        records = fetch(None, after, limit + 1)
+        if len(records) <= limit:
+            # Going back reached the start; show a full first page instead
+            return page_records(fetch, limit=limit)
+        has_prev, has_next = True, True
+        records = records[:limit][::-1]
+    else:
+        records = fetch(before, None, limit + 1)
+        has_prev, has_next = before is not None, len(records) > limit
+        records = records[:limit]
+    return {
+        'records': records,
+        'next_cursor': records[-1]['display_order'] if records and has_next else None,
+        'prev_cursor': records[0]['display_order'] if records and has_prev else None
+    }
+
+
+class LocalImageIndex:
+    """Gallery image index kept in a JSON file
+
+    The file holds ``{"version": 2, "next_order": n, "images": {filename:
+    record}}`` and is atomically rewritten under a file lock on every
+    change. Readers keep the parsed records, sorted by display order, until
+    the file changes.
+    """
+
+    def __init__(self, path):
+        """Initialize the index
+
+        Args:
+            path (str): Path of the index file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._records = []
+        self._orders = []
+        self._by_name = {}
+        self._by_hash = {}
+
+    def _read(self):
+        """Read the index file
+
+        Returns:
+            dict: Index data, or None if the file is missing or outdated
+        """
+        data = read_json_file(self.path) if os.path.exists(self.path) else None
+        if not isinstance(data, dict) or data.get('version') != INDEX_VERSION:
+            return None
+        return data
+
+    def _load(self):
+        """Get the records, re-reading the file only when it has changed
+
+        Returns:
+            bool: True if the index exists, False if it must be rebuilt
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        with self._lock:
+            if stamp == self._stamp:
+                return True
+            data = self._read()
+            if data is None:
+                return False
+            records = sorted(data['images'].values(), key=lambda r: r['display_order'])
+            self._records = records
+            self._orders = [record['display_order'] for record in records]
+            self._by_name = data['images']
+            self._by_hash = {}
+            for record in records:
+                self._by_hash.setdefault(record.get('sha256'), record)
+            self._stamp = stamp
+            return True
+
+    def _update(self, update):
+        """Read, modify and rewrite the index file under its lock
+
+        Args:
+            update (callable): Receives the index data and changes it in place
+
+        Returns:
+            bool: True if the file was written
+        """
+        with file_lock(self.path):
+            data = self._read() or {'version': INDEX_VERSION, 'next_order': 1, 'images': {}}
+            update(data)
+            return write_json_file(self.path, data, indent=None)
+
+    def exists(self):
+        """Check whether the index file exists and is current
+
+        Returns:
+            bool: True if the index can be read
+        """
+        return self._load()
+
+    def modified(self):
+        """Get when the index file was last written
+
+        Returns:
+            int: Modification time in nanoseconds, or None if there is no file
+        """
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self, filename):
+        """Get the record of an image
+
+        Args:
+            filename (str): File name of the image
+
+        Returns:
+            dict: The record, or None if the image is not indexed
+        """
+        if not self._load():
+            return None
+        return self._by_name.get(filename)
+
+    def find_by_hash(self, sha256):
+        """Get the record of an image by the SHA-256 of its content
+
+        Args:
+            sha256 (str): Hex digest
+
+        Returns:
+            dict: The record with the lowest display order, or None
+        """
+        if not sha256 or not self._load():
+            return None
+        return self._by_hash.get(sha256)
+
+    def page(self, before=None, after=None, limit=GALLERY_PAGE_SIZE):
+        """Get one page of records, highest display order first
+
+        Args:
+            before (int, optional): Display order the page starts below
+            after (int, optional): Display order the page ends above
+            limit (int): Records per page
+
+        Returns:
+            dict: Page as returned by page_records
+        """
+        records, orders = (self._records, self._orders) if self._load() else ([], [])
+
+        def fetch(before, after, limit):
+            if after is not None:
+                start = bisect.bisect_right(orders, after)
+                return records[start:start + limit]
+            end = bisect.bisect_left(orders, before) if before is not None else len(records)
+            return records[max(0, end - limit):end][::-1]
+
+        return page_records(fetch, before, after, limit)
+
+    def all(self):
+        """Get all records, highest display order first
+
+        Returns:
+            list: Records
+        """
+        return self._records[::-1] if self._load() else []
+
+    def put(self, record):
+        """Add or replace the record of an image
+
+        A new image gets the next display order; a replaced one keeps its own.
+
+        Args:
+            record (dict): Record with at least 'filename'
+
+        Returns:
+            bool: True if the index was written
+        """
+        def update(data):
+            existing = data['images'].get(record['filename'])
+            if existing is not None:
+                record['display_order'] = existing['display_order']
+            else:
+                record['display_order'] = data['next_order']
+                data['next_order'] += 1
+            data['images'][record['filename']] = record
+
+        return self._update(update)
+
+    def add_unique(self, record, stored=None):
+        """Add or replace an image's record unless its content is indexed
+        for another image
+
+        The check and the write happen under the file lock, so of two
+        concurrent uploads of the same content only one is added.
+
+        Args:
+            record (dict): Record with 'filename' and 'sha256'
+            stored (callable, optional): Checks whether the image of another
+                record is still stored; records of missing images are ignored
+
+        Returns:
+            dict: Record of the image with the same content, or None if the
+                record was added
+        """
+        found = []
+
+        def update(data):
+            for other in data['images'].values():
+                if (other.get('sha256') == record['sha256'] and other['filename'] != record['filename']
+                        and (stored is None or stored(other))):
+                    found.append(other)
+                    return
+            existing = data['images'].get(record['filename'])
+            if existing is not None:
+                record['display_order'] = existing['display_order']
+            else:
+                record['display_order'] = data['next_order']
+                data['next_order'] += 1
+            data['images'][record['filename']] = record
+
+        self._update(update)
+        return found[0] if found else None
+
+    def remove(self, filename):
+        """Remove the record of an image
+
+        Args:
+            filename (str): File name of the image
+
+        Returns:
+            bool: True if the index was written
+        """
+        return self._update(lambda data: data['images'].pop(filename, None))
+
+    def replace(self, records):
+        """Replace the whole index
+
+        Args:
+            records (list): Records, each with its display order
+
+        Returns:
+            bool: True if the index was written
+        """
+        def update(data):
+            data['images'] = {record['filename']: record for record in records}
+            data['next_order'] = max([data['next_order']] +
+                                     [record['display_order'] + 1 for record in records])
+
+        return self._update(update)
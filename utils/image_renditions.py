@@ -0,0 +1,159 @@
+"""
+Image rendition utilities.
+This module resizes gallery images into the fixed-width renditions
+configured in IMAGE_RENDITIONS, each encoded once in the original's format
+family (JPEG, or PNG for images with transparency) and once as WebP.
+"""
+
+import io
+import logging
+from flask import current_app
+from config import IMAGE_RENDITIONS, IMAGE_RENDITION_QUALITY
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    # Without Pillow no renditions are made and the originals are served
+    Image = None
+
+# Content type and file extension of each rendition format
+RENDITION_CONTENT_TYPES = {'jpeg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+RENDITION_EXTENSIONS = {'jpeg': 'jpg', 'png': 'png', 'webp': 'webp'}
+
+
+def _log(level, message):
+    """Log through the Flask app logger, or the logging module outside of an app context"""
+    try:
+        getattr(current_app.logger, level)(message)
+    except RuntimeError:
+        getattr(logging, level)(message)
+
+
+def renditions_enabled():
+    """Check whether renditions can be generated
+
+    Returns:
+        bool: True if Pillow is installed
+    """
+    return Image is not None
+
+
+def rendition_filename(filename, size, fmt):
+    """Get the file name of a rendition
+
+    Args:
+        filename (str): File name of the original image
+        size (str): Rendition name, e.g. 'thumb'
+        fmt (str): Rendition format, 'jpeg', 'png' or 'webp'
+
+    Returns:
+        str: File name such as '01.jpg.thumb.webp'
+    """
+    return f"{filename}.{size}.{RENDITION_EXTENSIONS[fmt]}"
+
+
+def _encode(image, fmt):
+    """Encode an image in a rendition format"""
+    buffer = io.BytesIO()
+    if fmt == 'jpeg':
+        image.save(buffer, 'JPEG', quality=IMAGE_RENDITION_QUALITY, optimize=True, progressive=True)
+    elif fmt == 'png':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.save(buffer, 'WEBP', quality=IMAGE_RENDITION_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def create_renditions(data):
+    """Resize an image into all configured renditions
+
+    Images are never enlarged; a rendition wider than the original keeps
+    the original's size but is still re-encoded.
+
+    Args:
+        data (bytes or file): Original image data, or a seekable file holding it
+
+    Returns:
+        list: Dicts with 'size', 'format', 'content_type' and 'data', or an
+            empty list if Pillow is missing or the image cannot be decoded
+    """
+    if Image is None:
+        return []
+
+    renditions = []
+    try:
+        with Image.open(io.BytesIO(data) if isinstance(data, bytes) else data) as original:
+            # Let the JPEG decoder downscale while decoding, which is much faster
+            widest = max(IMAGE_RENDITIONS.values())
+            if original.width > widest:
+                original.draft(original.mode, (widest, original.height * widest // original.width))
+            # Phone photos are often stored sideways with an EXIF rotation
+            image = ImageOps.exif_transpose(original)
+            transparent = (image.mode in ('RGBA', 'LA') or
+                           (image.mode == 'P' and 'transparency' in image.info))
+            image = image.convert('RGBA' if transparent else 'RGB')
+            base_format = 'png' if transparent else 'jpeg'
+
+            for size, width in IMAGE_RENDITIONS.items():
+                resized = image
+                if image.width > width:
+                    height = max(1, round(image.height * width / image.width))
+                    resized = image.resize((width, height), Image.LANCZOS)
+                for fmt in (base_format, 'webp'):
+                    renditions.append({
+                        'size': size,
+                        'format': fmt,
+                        'content_type': RENDITION_CONTENT_TYPES[fmt],
+                        'data': _encode(resized, fmt)
+                    })
+    except Exception as e:
+        _log('warning', f"Could not create image renditions: {e}")
+        return []
+    return renditions
+
+
+def image_dimensions(data):
+    """Read the displayed size of an image from its header
+
+    Args:
+        data (bytes or file): Image data, or a seekable file holding it;
+            only the header is read
+
+    Returns:
+        tuple: (width, height) after EXIF rotation, or (None, None) if
+            Pillow is missing or the image cannot be decoded
+    """
+    if Image is None:
+        return None, None
+    try:
+        with Image.open(io.BytesIO(data) if isinstance(data, bytes) else data) as image:
+            width, height = image.size
+            # EXIF orientations 5 to 8 turn the image by 90 degrees
+            if image.getexif().get(0x0112) in (5, 6, 7, 8):
+                width, height = height, width
+            return width, height
+    except Exception as e:
+        _log('warning', f"Could not read image dimensions: {e}")
+        return None, None
+
+
+def rendition_sources(url, sizes):
+    """Build the src and srcset attributes for an image
+
+    Args:
+        url (callable): Gets the URL of a rendition from (size, fmt), where
+            fmt is None for the original's format family or 'webp'
+        sizes (iterable): Rendition names available for the image
+
+    Returns:
+        dict: 'src' (the largest rendition, or the original if there are
+            none), 'srcset' and 'webp_srcset' (empty without renditions)
+    """
+    available = sorted((IMAGE_RENDITIONS[size], size) for size in sizes if size in IMAGE_RENDITIONS)
+    if not available:
+        return {'src': url(None, None), 'srcset': '', 'webp_srcset': ''}
+    return {
+        'src': url(available[-1][1], None),
+        'srcset': ', '.join(f"{url(size, None)} {width}w" for width, size in available),
+        'webp_srcset': ', '.join(f"{url(size, 'webp')} {width}w" for width, size in available)
+    }
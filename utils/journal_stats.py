@@ -0,0 +1,137 @@
+"""
+Journal statistics utilities.
+This module computes the journal statistics (totals, entries per author and
+per month, first and last entry) and the deltas that keep them up to date
+incrementally as entries are written.
+"""
+
+from datetime import datetime
+from config import CHINA_TIMEZONE
+
+# Bump when the layout of the statistics changes; older copies are rebuilt
+STATS_VERSION = 1
+
+
+def month_key(timestamp):
+    """Get the month an entry belongs to
+
+    Args:
+        timestamp (float): Unix timestamp
+
+    Returns:
+        str: Month as 'YYYY-MM' in China timezone
+    """
+    return datetime.fromtimestamp(timestamp or 0, CHINA_TIMEZONE).strftime('%Y-%m')
+
+
+def empty_stats():
+    """Get the statistics of an empty journal
+
+    Returns:
+        dict: Statistics with all counters at zero
+    """
+    return {
+        'version': STATS_VERSION,
+        'total': 0,
+        'words': 0,
+        'authors': {},
+        'months': {},
+        'first_timestamp': None,
+        'last_timestamp': None
+    }
+
+
+def entry_delta(author, timestamp, words, sign=1):
+    """Get the change in statistics from adding or removing one entry
+
+    Args:
+        author (str): Entry author
+        timestamp (float): Entry timestamp
+        words (int): Entry word count
+        sign (int): 1 when the entry is added, -1 when it is removed
+
+    Returns:
+        dict: Statistics delta
+    """
+    return {
+        'total': sign,
+        'words': sign * (words or 0),
+        'authors': {author or '': sign},
+        'months': {month_key(timestamp): sign},
+        'added': [timestamp or 0] if sign > 0 else [],
+        'removed': [timestamp or 0] if sign < 0 else []
+    }
+
+
+def merge_deltas(deltas):
+    """Combine several statistics deltas into one
+
+    Args:
+        deltas (iterable): Statistics deltas
+
+    Returns:
+        dict: Combined delta
+    """
+    merged = {'total': 0, 'words': 0, 'authors': {}, 'months': {}, 'added': [], 'removed': []}
+    for delta in deltas:
+        merged['total'] += delta['total']
+        merged['words'] += delta['words']
+        for field in ('authors', 'months'):
+            for key, count in delta[field].items():
+                merged[field][key] = merged[field].get(key, 0) + count
+        merged['added'].extend(delta['added'])
+        merged['removed'].extend(delta['removed'])
+    return merged
+
+
+def apply_delta(stats, delta):
+    """Apply a delta to statistics in place
+
+    Removing the first or last entry cannot be undone from the delta alone,
+    so the caller must reset the bounds when delta['removed'] is not empty.
+
+    Args:
+        stats (dict): Statistics to update
+        delta (dict): Statistics delta
+    """
+    stats['total'] += delta['total']
+    stats['words'] += delta['words']
+    for field in ('authors', 'months'):
+        counts = stats[field]
+        for key, count in delta[field].items():
+            counts[key] = counts.get(key, 0) + count
+            if counts[key] <= 0:
+                del counts[key]
+    if delta['added']:
+        first, last = min(delta['added']), max(delta['added'])
+        if stats['first_timestamp'] is None or first < stats['first_timestamp']:
+            stats['first_timestamp'] = first
+        if stats['last_timestamp'] is None or last > stats['last_timestamp']:
+            stats['last_timestamp'] = last
+
+
+def format_stats(stats):
+    """Prepare statistics for display
+
+    Args:
+        stats (dict): Statistics
+
+    Returns:
+        dict: Statistics with zero counts dropped, months in order and the
+            first and last entry dates formatted
+    """
+    def format_date(timestamp):
+        if timestamp is None:
+            return None
+        return datetime.fromtimestamp(timestamp, CHINA_TIMEZONE).strftime('%Y年%m月%d日')
+
+    return {
+        'total': stats['total'],
+        'words': stats['words'],
+        'authors': {k: v for k, v in sorted(stats['authors'].items()) if v > 0},
+        'months': {k: v for k, v in sorted(stats['months'].items()) if v > 0},
+        'first_timestamp': stats['first_timestamp'],
+        'last_timestamp': stats['last_timestamp'],
+        'first_date': format_date(stats['first_timestamp']),
+        'last_date': format_date(stats['last_timestamp'])
+    }
@@ -0,0 +1,539 @@
+"""
+Append-only journal storage.
+This module stores journal entries on local disk as an NDJSON operation log
+with a sidecar offset index, so a write is a single append and a lookup by
+id reads a single record.
+"""
+
+import os
+import json
+import bisect
+import logging
+import threading
+from flask import current_app
+from utils.file_utils import (
+    ensure_directory_exists, read_json_file, write_json_file,
+    file_lock, sync_file, sync_directory
+)
+
+# Bump when the layout of the index sidecar changes
+INDEX_VERSION = 3
+
+
+def _log(level, message):
+    """Log through the Flask app logger, or the logging module outside of an app context"""
+    try:
+        getattr(current_app.logger, level)(message)
+    except RuntimeError:
+        getattr(logging, level)(message)
+
+
+def _encode(record):
+    """Encode an operation record as one NDJSON line"""
+    return json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+class JournalLogStore:
+    """Journal entry store backed by an append-only operation log
+
+    Every line of the log is either ``{"op": "put", "entry": {...}}`` or
+    ``{"op": "del", "id": "..."}``. The in-memory index maps each live entry
+    id to the offset, length, timestamp and month-day of its latest put
+    record, keeps the (timestamp, id) keys sorted for paging and groups them
+    by month-day for calendar lookups. It is checkpointed
+    to a sidecar file every few writes, and records appended after the
+    checkpoint are replayed when the index is loaded. Compaction rewrites the
+    log as a snapshot holding only the live records.
+    """
+
+    def __init__(self, log_path, index_path, legacy_path=None,
+                 compact_min_dead=100, checkpoint_interval=50):
+        """Initialize the store; nothing is read until first use
+
+        Args:
+            log_path (str): Path of the NDJSON operation log
+            index_path (str): Path of the offset index sidecar
+            legacy_path (str, optional): journal.json file to migrate from
+            compact_min_dead (int): Superseded records needed before compacting
+            checkpoint_interval (int): Appends between index checkpoints
+        """
+        self.log_path = log_path
+        self.index_path = index_path
+        self.legacy_path = legacy_path
+        self.compact_min_dead = compact_min_dead
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self):
+        """Forget the in-memory index"""
+        self._offsets = {}
+        self._keys = None
+        self._days = None
+        self._size = 0
+        self._inode = None
+        self._dead = 0
+        self._pending = 0
+
+    # Index maintenance
+
+    def _refresh(self):
+        """Bring the in-memory index up to date with the log on disk
+
+        A log that was replaced (compacted) or truncated is reloaded, a log
+        that grew is replayed from the last known offset.
+        """
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            if not self._loaded or self._inode is not None:
+                self._load()
+            return
+
+        if not self._loaded or st.st_ino != self._inode or st.st_size < self._size:
+            self._load()
+        elif st.st_size > self._size:
+            self._replay(self._size)
+
+    def _load(self, use_checkpoint=True):
+        """Load the index from its checkpoint and replay the rest of the log"""
+        self._reset()
+        if not os.path.exists(self.log_path):
+            self._migrate_legacy()
+        if not os.path.exists(self.log_path):
+            self._loaded = True
+            return
+
+        st = os.stat(self.log_path)
+        index = read_json_file(self.index_path) if use_checkpoint else None
+        if (isinstance(index, dict) and
+                index.get('version') == INDEX_VERSION and
+                index.get('inode') == st.st_ino and
+                index.get('size', 0) <= st.st_size):
+            self._offsets = {k: tuple(v) for k, v in index.get('entries', {}).items()}
+            self._keys = None
+            self._days = None
+            self._size = index['size']
+            self._dead = index.get('dead', 0)
+
+        self._inode = st.st_ino
+        self._loaded = True
+        self._replay(self._size)
+
+    def _replay(self, start):
+        """Apply log records from the given offset to the index"""
+        offset = start
+        with open(self.log_path, 'rb') as f:
+            f.seek(start)
+            for line in f:
+                # A line without a newline is an interrupted write
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    self._apply(json.loads(line), offset, len(line))
+                except ValueError:
+                    _log('warning', f"Skipping corrupt journal log record at offset {offset}")
+                offset += len(line)
+        self._size = offset
+
+    def _apply(self, record, offset, length):
+        """Apply a single operation record to the index"""
+        op = record.get('op')
+        if op == 'put':
+            entry = record.get('entry', {})
+            entry_id = entry.get('id')
+            timestamp = entry.get('timestamp') or 0
+            month_day = entry.get('month_day')
+            if self._discard(entry_id):
+                self._dead += 1
+            self._offsets[entry_id] = (offset, length, timestamp, month_day)
+            if self._keys is not None:
+                bisect.insort(self._keys, (timestamp, entry_id))
+            if self._days is not None and month_day:
+                bisect.insort(self._days.setdefault(month_day, []), (timestamp, entry_id))
+        elif op == 'del':
+            if self._discard(record.get('id')):
+                self._dead += 1
+            # The delete record itself is also dead weight
+            self._dead += 1
+
+    def _discard(self, entry_id):
+        """Remove an entry from the index
+
+        Returns:
+            bool: True if the entry was in the index
+        """
+        location = self._offsets.pop(entry_id, None)
+        if location is None:
+            return False
+        if self._keys is not None:
+            key = (location[2], entry_id)
+            i = bisect.bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+        if self._days is not None and location[3] in self._days:
+            keys = self._days[location[3]]
+            key = (location[2], entry_id)
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+        return True
+
+    def _sorted_keys(self):
+        """Get the (timestamp, id) keys of all live entries in ascending order"""
+        if self._keys is None:
+            self._keys = sorted((location[2], entry_id)
+                                for entry_id, location in self._offsets.items())
+        return self._keys
+
+    def _day_keys(self, month_day):
+        """Get the (timestamp, id) keys of the live entries on a month-day in ascending order"""
+        if self._days is None:
+            days = {}
+            for entry_id, location in self._offsets.items():
+                if location[3]:
+                    days.setdefault(location[3], []).append((location[2], entry_id))
+            for keys in days.values():
+                keys.sort()
+            self._days = days
+        return self._days.get(month_day, [])
+
+    def _checkpoint(self):
+        """Write the in-memory index to the sidecar file"""
+        self._pending = 0
+        return write_json_file(self.index_path, {
+            'version': INDEX_VERSION,
+            'inode': self._inode,
+            'size': self._size,
+            'dead': self._dead,
+            'entries': self._offsets
+        }, indent=None)
+
+    def _migrate_legacy(self):
+        """Convert an existing journal.json list into a new operation log
+
+        The legacy file is left in place; a ``<legacy_path>.migrated`` marker
+        records the migration so it is never imported a second time.
+        """
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        marker_path = self.legacy_path + '.migrated'
+        if os.path.exists(marker_path):
+            return
+
+        with file_lock(self.log_path):
+            # Another process may have migrated while we waited for the lock
+            if (os.path.exists(self.log_path) or os.path.exists(marker_path) or
+                    not os.path.exists(self.legacy_path)):
+                return
+            entries = read_json_file(self.legacy_path)
+            ensure_directory_exists(os.path.dirname(self.log_path))
+            tmp_path = self.log_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                for entry in entries:
+                    f.write(_encode({'op': 'put', 'entry': entry}))
+                sync_file(f, replace=True)
+            os.replace(tmp_path, self.log_path)
+            sync_directory(os.path.dirname(self.log_path))
+            write_json_file(marker_path, {'log': os.path.basename(self.log_path),
+                                          'entries': len(entries)})
+        _log('info', f"Migrated {len(entries)} entries from {self.legacy_path} to {self.log_path}")
+
+    def _append(self, records):
+        """Append operation records to the log and apply them to the index
+
+        Must be called with the log's file lock held and the index refreshed.
+        """
+        ensure_directory_exists(os.path.dirname(self.log_path))
+        with open(self.log_path, 'ab') as f:
+            # Drop an interrupted write left at the end of the log
+            f.seek(0, os.SEEK_END)
+            if f.tell() != self._size:
+                f.truncate(self._size)
+
+            for record in records:
+                line = _encode(record)
+                f.write(line)
+                self._apply(record, self._size, len(line))
+                self._size += len(line)
+            sync_file(f)
+
+            if self._inode is None:
+                self._inode = os.fstat(f.fileno()).st_ino
+
+        self._pending += len(records)
+        if self._dead >= self.compact_min_dead and self._dead > len(self._offsets):
+            self.compact()
+        elif self._pending >= self.checkpoint_interval:
+            self._checkpoint()
+
+    def _read_entry(self, f, entry_id):
+        """Read the put record for an entry from an open log file"""
+        offset, length = self._offsets[entry_id][:2]
+        f.seek(offset)
+        record = json.loads(f.read(length))
+        entry = record.get('entry', {})
+        if record.get('op') != 'put' or entry.get('id') != entry_id:
+            raise ValueError(f"Index points to the wrong record for {entry_id}")
+        return entry
+
+    # Public API
+
+    def get(self, entry_id):
+        """Get a journal entry by ID
+
+        Args:
+            entry_id (str): Entry ID
+
+        Returns:
+            dict: Journal entry or None if not found
+        """
+        with self._lock:
+            try:
+                self._refresh()
+                if entry_id not in self._offsets:
+                    return None
+                with open(self.log_path, 'rb') as f:
+                    try:
+                        return self._read_entry(f, entry_id)
+                    except ValueError:
+                        # Stale checkpoint, rebuild the index from the log
+                        self._load(use_checkpoint=False)
+                        if entry_id not in self._offsets:
+                            return None
+                with open(self.log_path, 'rb') as f:
+                    return self._read_entry(f, entry_id)
+            except Exception as e:
+                _log('error', f"Error reading journal log: {e}")
+                return None
+
+    def exists(self, entry_id):
+        """Check whether an entry exists
+
+        Args:
+            entry_id (str): Entry ID
+
+        Returns:
+            bool: True if the entry exists
+        """
+        with self._lock:
+            self._refresh()
+            return entry_id in self._offsets
+
+    def all(self, sort_key='timestamp', sort_desc=True):
+        """Get all live journal entries
+
+        Args:
+            sort_key (str): Key to sort by
+            sort_desc (bool): Sort in descending order if True, ascending if False
+
+        Returns:
+            list: List of journal entries as dictionaries
+        """
+        with self._lock:
+            try:
+                self._refresh()
+                if not self._offsets:
+                    return []
+                with open(self.log_path, 'rb') as f:
+                    # Read in log order to keep disk access sequential
+                    ids = sorted(self._offsets, key=lambda k: self._offsets[k][0])
+                    entries = [self._read_entry(f, entry_id) for entry_id in ids]
+            except Exception as e:
+                _log('error', f"Error reading journal log: {e}")
+                return []
+
+        entries.sort(key=lambda x: x.get(sort_key, 0), reverse=sort_desc)
+        return entries
+
+    def _read_selected(self, selected, fields):
+        """Read the entries for a list of (timestamp, id) keys"""
+        if not selected:
+            return []
+        with open(self.log_path, 'rb') as f:
+            entries = [self._read_entry(f, entry_id) for _, entry_id in selected]
+        if fields:
+            entries = [{k: entry[k] for k in fields if k in entry} for entry in entries]
+        return entries
+
+    def page(self, sort_desc=True, limit=20, after=None, before=None, fields=None,
+             start=None, end=None):
+        """Get one page of journal entries ordered by (timestamp, id)
+
+        Args:
+            sort_desc (bool): Newest first if True, oldest first if False
+            limit (int): Maximum number of entries to return
+            after (tuple, optional): (timestamp, id) key the page starts after
+            before (tuple, optional): (timestamp, id) key the page ends before
+            fields (tuple, optional): Fields to return, all fields if None
+            start (float, optional): Only entries at or after this timestamp
+            end (float, optional): Only entries before this timestamp
+
+        Returns:
+            list: Up to limit journal entries, in display order
+        """
+        with self._lock:
+            try:
+                self._refresh()
+                keys = self._sorted_keys()
+                # A 1-tuple sorts before every (timestamp, id) key with that timestamp
+                lo = bisect.bisect_left(keys, (start,)) if start is not None else 0
+                hi = bisect.bisect_left(keys, (end,)) if end is not None else len(keys)
+                if after is None and before is None:
+                    selected = keys[max(lo, hi - limit):hi] if sort_desc else keys[lo:min(hi, lo + limit)]
+                elif (after is not None) != sort_desc:
+                    # Moving towards newer entries
+                    key = tuple(after if after is not None else before)
+                    i = max(lo, bisect.bisect_right(keys, key))
+                    selected = keys[i:min(hi, i + limit)]
+                else:
+                    # Moving towards older entries
+                    key = tuple(after if after is not None else before)
+                    i = min(hi, bisect.bisect_left(keys, key))
+                    selected = keys[max(lo, i - limit):i]
+                if sort_desc:
+                    selected = selected[::-1]
+                return self._read_selected(selected, fields)
+            except Exception as e:
+                _log('error', f"Error reading journal log: {e}")
+                return []
+
+    def on_day(self, month_day, fields=None):
+        """Get the entries written on a calendar day of any year, newest first
+
+        Args:
+            month_day (str): Day as 'MM-DD'
+            fields (tuple, optional): Fields to return, all fields if None
+
+        Returns:
+            list: Journal entries whose 'month_day' matches
+        """
+        with self._lock:
+            try:
+                self._refresh()
+                return self._read_selected(self._day_keys(month_day)[::-1], fields)
+            except Exception as e:
+                _log('error', f"Error reading journal log: {e}")
+                return []
+
+    def version(self):
+        """Get a cheap stamp that changes whenever the log changes
+
+        Every write appends to the log and compaction replaces it, so the
+        inode and size identify its contents without reading it.
+
+        Returns:
+            tuple: (inode, size) of the log, or None if it does not exist
+        """
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size)
+
+    def count(self):
+        """Get the number of live journal entries
+
+        Returns:
+            int: Number of entries
+        """
+        with self._lock:
+            self._refresh()
+            return len(self._offsets)
+
+    def put(self, entry):
+        """Insert or replace a journal entry
+
+        Args:
+            entry (dict): Journal entry, must contain an 'id'
+
+        Returns:
+            bool: True if the entry was written, False otherwise
+        """
+        with self._lock, file_lock(self.log_path):
+            try:
+                self._refresh()
+                self._append([{'op': 'put', 'entry': entry}])
+                return True
+            except Exception as e:
+                _log('error', f"Error writing journal log: {e}")
+                return False
+
+    def put_many(self, entries):
+        """Insert or replace several journal entries with one append
+
+        Args:
+            entries (list): Journal entries, each must contain an 'id'
+
+        Returns:
+            bool: True if the entries were written, False otherwise
+        """
+        if not entries:
+            return True
+        with self._lock, file_lock(self.log_path):
+            try:
+                self._refresh()
+                self._append([{'op': 'put', 'entry': entry} for entry in entries])
+                return True
+            except Exception as e:
+                _log('error', f"Error writing journal log: {e}")
+                return False
+
+    def delete(self, entry_id):
+        """Delete a journal entry
+
+        Args:
+            entry_id (str): Entry ID
+
+        Returns:
+            bool: True if the entry existed and was deleted, False otherwise
+        """
+        with self._lock, file_lock(self.log_path):
+            try:
+                self._refresh()
+                if entry_id not in self._offsets:
+                    return False
+                self._append([{'op': 'del', 'id': entry_id}])
+                return True
+            except Exception as e:
+                _log('error', f"Error writing journal log: {e}")
+                return False
+
+    def compact(self):
+        """Rewrite the log as a snapshot of the live records
+
+        Returns:
+            bool: True if the log was compacted, False otherwise
+        """
+        with self._lock, file_lock(self.log_path):
+            try:
+                self._refresh()
+                if not os.path.exists(self.log_path):
+                    return True
+
+                tmp_path = self.log_path + '.compact'
+                offsets = {}
+                offset = 0
+                with open(self.log_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                    for entry_id, (src_offset, length, *rest) in sorted(
+                            self._offsets.items(), key=lambda item: item[1][0]):
+                        src.seek(src_offset)
+                        dst.write(src.read(length))
+                        offsets[entry_id] = (offset, length, *rest)
+                        offset += length
+                    sync_file(dst, replace=True)
+                os.replace(tmp_path, self.log_path)
+                sync_directory(os.path.dirname(self.log_path))
+
+                dead = self._dead
+                self._offsets = offsets
+                self._size = offset
+                self._dead = 0
+                self._inode = os.stat(self.log_path).st_ino
+                self._checkpoint()
+                _log('info', f"Compacted journal log, dropped {dead} superseded records")
+                return True
+            except Exception as e:
+                _log('error', f"Error compacting journal log: {e}")
+                return False
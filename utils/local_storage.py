@@ -1,20 +1,51 @@
 """
 Local file storage utility functions.
 This module handles all image-related operations with local file storage.
+Renditions of each image are stored in IMAGE_RENDITION_DIR next to the
+originals. The gallery is listed from the image index in IMAGE_META_FILE,
+which is kept in sync on upload and delete and also finds images by
+content hash, so the same image is only stored once.
 """
 
 import os
 import uuid
 import shutil
 import logging
+import mimetypes
 from flask import current_app, url_for, send_from_directory
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from utils.cache import ByteLRUCache
+from utils.image_renditions import (
+    create_renditions, rendition_filename, rendition_sources, image_dimensions,
+    RENDITION_CONTENT_TYPES
+)
+from utils.image_meta import (
+    LocalImageIndex, find_rendition, rendition_sizes, image_number, group_duplicates
+)
+from utils.file_utils import read_json_file, write_json_file, file_lock, file_sha256
 from config import (
     ALLOWED_EXTENSIONS,
     UPLOAD_FOLDER,
-    MAX_CONTENT_LENGTH
+    MAX_CONTENT_LENGTH,
+    IMAGE_RENDITIONS,
+    IMAGE_RENDITION_DIR,
+    IMAGE_META_FILE,
+    IMAGE_SEQUENCE_FILE,
+    GALLERY_PAGE_SIZE,
+    IMAGE_MEMORY_CACHE_SIZE,
+    IMAGE_MEMORY_CACHE_MAX_ITEM
 )
 
+# Gallery image index
+image_index = LocalImageIndex(IMAGE_META_FILE)
+
+# Small images kept in memory, keyed by (filename, size, format, version)
+# of the file served; a replaced file changes version
+memory_cache = (ByteLRUCache(IMAGE_MEMORY_CACHE_SIZE, IMAGE_MEMORY_CACHE_MAX_ITEM,
+                             sizeof=lambda entry: len(entry['data']))
+                if IMAGE_MEMORY_CACHE_SIZE > 0 else None)
+
 def ensure_upload_dir():
     """Ensure the upload directory exists
     
@@ -59,9 +90,34 @@ def check_file_size(file, max_size=None):
     
     return True, "File size is appropriate"
 
+def next_image_number():
+    """Allocate the number for the next uploaded image's file name
+    
+    The last number is kept in IMAGE_SEQUENCE_FILE and advanced under its
+    lock, so concurrent uploads never share one and deleted images'
+    numbers are not reused. Without the file, numbering continues after
+    the highest number in the upload directory.
+    
+    Returns:
+        int: The allocated number
+    """
+    with file_lock(IMAGE_SEQUENCE_FILE):
+        data = read_json_file(IMAGE_SEQUENCE_FILE) if os.path.exists(IMAGE_SEQUENCE_FILE) else None
+        if isinstance(data, dict) and isinstance(data.get('value'), int):
+            number = data['value'] + 1
+        else:
+            number = max((image_number(name) for name in os.listdir(ensure_upload_dir())),
+                         default=0) + 1
+        if not write_json_file(IMAGE_SEQUENCE_FILE, {'value': number}, indent=None):
+            raise OSError(f"Could not write {IMAGE_SEQUENCE_FILE}")
+        return number
+
 def upload_image(file, filename=None):
     """Upload image to local storage
     
+    An image whose content is already stored is not stored again; the
+    result then describes the existing image and has 'duplicate' set.
+    
     Args:
         file (file): The file object to upload
         filename (str, optional): The filename to use
@@ -83,6 +139,13 @@ def upload_image(file, filename=None):
         if not size_ok:
             return {'success': False, 'message': size_message}
             
+        # Return the stored copy of an image uploaded before
+        sha256 = file_sha256(file.stream)
+        _ensure_index()
+        existing = image_index.find_by_hash(sha256)
+        if existing is not None and _is_stored(existing):
+            return _duplicate_result(existing)
+            
         # Generate unique filename if not provided
         if not filename:
             extension = os.path.splitext(secure_filename(file.filename))[1]
@@ -91,13 +154,25 @@ def upload_image(file, filename=None):
         # Ensure upload directory exists
         upload_dir = ensure_upload_dir()
         
-        # Save file
+        # Save file and its renditions
         file_path = os.path.join(upload_dir, filename)
+        forget_image(filename)
         file.save(file_path)
+        with open(file_path, 'rb') as f:
+            save_renditions(filename, f)
+        
+        # List it in the gallery, unless a concurrent upload of the same
+        # image was listed first
+        existing = image_index.add_unique(_index_record(filename, sha256), _is_stored)
+        if existing is not None:
+            os.remove(file_path)
+            remove_renditions(filename)
+            return _duplicate_result(existing)
         
         return {
             'success': True,
             'message': 'File uploaded successfully',
+            'filename': filename,
             'id': filename,
             'url': url_for('gallery.serve_local_image', filename=filename)
         }
@@ -108,6 +183,28 @@ def upload_image(file, filename=None):
             logging.error(f"Error uploading file: {e}")
         return {'success': False, 'message': f'Error uploading file: {e}'}
 
+def _is_stored(record):
+    """Check whether the image of an index record still exists"""
+    return os.path.exists(os.path.join(UPLOAD_FOLDER, record['filename']))
+
+def _duplicate_result(existing):
+    """Build the upload result for an image that is already stored
+    
+    Args:
+        existing (dict): Index record of the stored copy
+        
+    Returns:
+        dict: Upload result with 'duplicate' set
+    """
+    return {
+        'success': True,
+        'duplicate': True,
+        'message': 'Image already uploaded',
+        'filename': existing['filename'],
+        'id': existing['filename'],
+        'url': url_for('gallery.serve_local_image', filename=existing['filename'])
+    }
+
 def delete_image(file_id):
     """Delete image from local storage
     
@@ -125,8 +222,11 @@ def delete_image(file_id):
         if not os.path.exists(file_path):
             return {'success': False, 'message': 'File not found'}
         
-        # Delete file
+        # Delete file and its renditions, taking it out of the gallery first
+        image_index.remove(file_id)
+        forget_image(file_id)
         os.remove(file_path)
+        remove_renditions(file_id)
         
         return {
             'success': True,
@@ -139,27 +239,80 @@ def delete_image(file_id):
             logging.error(f"Error deleting file: {e}")
         return {'success': False, 'message': f'Error deleting file: {e}'}
 
+def _listing_item(record):
+    """Build a gallery listing entry from an index record
+    
+    Args:
+        record (dict): Image index record
+        
+    Returns:
+        dict: Image with its id and URLs
+    """
+    filename = record['filename']
+    renditions = record.get('renditions', [])
+    
+    def url(size, fmt):
+        rendition = find_rendition(renditions, size, fmt) if size else record
+        return url_for('gallery.serve_local_image', filename=filename, size=size, format=fmt,
+                       v=rendition.get('version') if rendition else None)
+    
+    return {
+        'id': filename,
+        'filename': filename,
+        'url': url(None, None),
+        'width': record.get('width'),
+        'height': record.get('height'),
+        **rendition_sources(url, rendition_sizes(renditions))
+    }
+
+def _ensure_index():
+    """Build the image index from the upload directory if it is missing or stale
+    
+    Adding or removing a file changes the directory's modification time, so
+    images copied into the folder by hand are picked up on the next listing.
+    Uploads and deletes through the app write the index afterwards, which
+    keeps it newer than the directory.
+    """
+    modified = image_index.modified()
+    if (modified is None or not image_index.exists() or
+            os.stat(ensure_upload_dir()).st_mtime_ns > modified):
+        rebuild_image_index()
+
+def get_images_page(before=None, after=None, limit=GALLERY_PAGE_SIZE):
+    """Get one page of the gallery, newest images first
+    
+    Args:
+        before (int, optional): Display order the page starts below
+        after (int, optional): Display order the page ends above
+        limit (int): Images per page
+        
+    Returns:
+        dict: 'images', 'next_cursor' and 'prev_cursor'
+    """
+    try:
+        _ensure_index()
+        page = image_index.page(before, after, limit)
+        return {
+            'images': [_listing_item(record) for record in page['records']],
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor']
+        }
+    except Exception as e:
+        try:
+            current_app.logger.error(f"Error getting files: {e}")
+        except RuntimeError:
+            logging.error(f"Error getting files: {e}")
+        return {'images': [], 'next_cursor': None, 'prev_cursor': None}
+
 def get_image_files():
     """Get all images from local storage
     
     Returns:
-        list: List of image objects with id and url
+        list: List of image objects with id and url, newest first
     """
     try:
-        # Ensure upload directory exists
-        upload_dir = ensure_upload_dir()
-        
-        # List files in directory
-        files = []
-        for filename in os.listdir(upload_dir):
-            if allowed_file(filename):
-                files.append({
-                    'id': filename,
-                    'filename': filename,
-                    'url': url_for('gallery.serve_local_image', filename=filename)
-                })
-        
-        return files
+        _ensure_index()
+        return [_listing_item(record) for record in image_index.all()]
     except Exception as e:
         try:
             current_app.logger.error(f"Error getting files: {e}")
@@ -190,7 +343,8 @@ def get_image_file(file_id):
             '.jpg': 'image/jpeg',
             '.jpeg': 'image/jpeg',
             '.png': 'image/png',
-            '.gif': 'image/gif'
+            '.gif': 'image/gif',
+            '.webp': 'image/webp'
         }.get(extension, 'application/octet-stream')
         
         # Return file path (will be read by Flask's send_from_directory)
@@ -201,3 +355,305 @@ def get_image_file(file_id):
         except RuntimeError:
             logging.error(f"Error getting file: {e}")
         return None
+
+def save_renditions(filename, data):
+    """Create and save the renditions of an image
+    
+    Args:
+        filename (str): File name of the original image
+        data (bytes or file): Original image data, or a seekable file holding it
+        
+    Returns:
+        list: Names of the sizes saved
+    """
+    os.makedirs(IMAGE_RENDITION_DIR, exist_ok=True)
+    sizes = []
+    for rendition in create_renditions(data):
+        name = rendition_filename(filename, rendition['size'], rendition['format'])
+        with open(os.path.join(IMAGE_RENDITION_DIR, name), 'wb') as f:
+            f.write(rendition['data'])
+        if rendition['size'] not in sizes:
+            sizes.append(rendition['size'])
+    return sizes
+
+def remove_renditions(filename):
+    """Delete the renditions of an image
+    
+    Args:
+        filename (str): File name of the original image
+    """
+    for size in IMAGE_RENDITIONS:
+        for fmt in RENDITION_CONTENT_TYPES:
+            path = os.path.join(IMAGE_RENDITION_DIR, rendition_filename(filename, size, fmt))
+            if os.path.exists(path):
+                os.remove(path)
+
+def get_rendition_file(filename, size, fmt=None):
+    """Find a rendition of an image
+    
+    Args:
+        filename (str): File name of the original image
+        size (str): Rendition name, e.g. 'thumb'
+        fmt (str, optional): 'webp' for the WebP rendition
+        
+    Returns:
+        str: File name of the rendition in IMAGE_RENDITION_DIR, or None if
+            it does not exist
+    """
+    for candidate in (('webp',) if fmt == 'webp' else ('jpeg', 'png')):
+        name = rendition_filename(filename, size, candidate)
+        if os.path.exists(os.path.join(IMAGE_RENDITION_DIR, name)):
+            return name
+    return None
+
+def get_image_version(filename, size=None, fmt=None):
+    """Get a version token for an image or one of its renditions
+    
+    The token changes whenever the file is replaced, so it can go into the
+    image's URL and let browsers cache that URL forever.
+    
+    Args:
+        filename (str): File name of the original image
+        size (str, optional): Rendition name, the original if None
+        fmt (str, optional): 'webp' for the WebP rendition
+        
+    Returns:
+        str: Modification time and size of the file, or None if it does not exist
+    """
+    if size:
+        name = get_rendition_file(filename, size, fmt)
+        if name is None:
+            return None
+        path = os.path.join(IMAGE_RENDITION_DIR, name)
+    else:
+        path = os.path.join(UPLOAD_FOLDER, filename)
+    try:
+        return _file_version(os.stat(path))
+    except OSError:
+        return None
+
+def _file_version(st):
+    """Get the version token of a file from its stat result"""
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+def get_memory_image(filename, size, fmt, version):
+    """Get a small image from the in-memory cache
+    
+    Args:
+        filename (str): The filename in the request
+        size (str): Requested rendition, None for the original
+        fmt (str): Requested format
+        version (str): Current version of the file served, from
+            get_image_version; files changed or deleted since they were
+            cached are never found
+        
+    Returns:
+        dict: Entry stored by remember_image, or None on a miss
+    """
+    if memory_cache is None or version is None:
+        return None
+    return memory_cache.get((filename, size, fmt, version))
+
+def remember_image(filename, size, fmt, directory, name):
+    """Keep a small image in the in-memory cache under its current version
+    
+    Not meant for an original standing in for a missing rendition, which
+    must not be kept under the rendition's key.
+    
+    Args:
+        filename (str): The filename in the request
+        size (str): Requested rendition, None for the original
+        fmt (str): Requested format
+        directory (str): Directory of the file served for the request
+        name (str): Name of the file served for the request
+        
+    Returns:
+        dict: Entry with 'data', 'content_type', 'filename', 'etag',
+            'last_modified', 'version' and 'immutable', or None if the
+            image is too large, cannot be read or the cache is disabled
+    """
+    if memory_cache is None:
+        return None
+    path = safe_join(directory, name)
+    if path is None:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            if not memory_cache.accepts(st.st_size):
+                return None
+            data = f.read()
+    except OSError:
+        return None
+    version = _file_version(st)
+    entry = {
+        'data': data,
+        'content_type': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+        'filename': name,
+        'etag': version,
+        'last_modified': st.st_mtime,
+        'version': version,
+        'immutable': False
+    }
+    memory_cache.set((filename, size, fmt, version), entry)
+    return entry
+
+def forget_image(filename):
+    """Drop an image and its renditions from the in-memory cache
+    
+    Args:
+        filename (str): File name of the original image
+    """
+    if memory_cache is not None:
+        memory_cache.delete_matching(lambda key: key[0] == filename)
+
+def get_memory_cache_stats():
+    """Get the statistics of the in-memory image cache
+    
+    Returns:
+        dict: Cache statistics, or None if the cache is disabled
+    """
+    return memory_cache.stats() if memory_cache is not None else None
+
+def get_rendition_sizes(filename):
+    """Get the renditions that exist for an image
+    
+    Args:
+        filename (str): File name of the original image
+        
+    Returns:
+        list: Rendition names with both formats present
+    """
+    return [size for size in IMAGE_RENDITIONS
+            if get_rendition_file(filename, size) and get_rendition_file(filename, size, 'webp')]
+
+def backfill_renditions(force=False):
+    """Create renditions for images stored before they existed
+    
+    Args:
+        force (bool): Recreate the renditions of every image
+        
+    Returns:
+        int: Number of images processed
+    """
+    upload_dir = ensure_upload_dir()
+    processed = 0
+    for filename in sorted(os.listdir(upload_dir)):
+        if not allowed_file(filename):
+            continue
+        if not force and len(get_rendition_sizes(filename)) == len(IMAGE_RENDITIONS):
+            continue
+        remove_renditions(filename)
+        forget_image(filename)
+        with open(os.path.join(upload_dir, filename), 'rb') as f:
+            save_renditions(filename, f)
+        record = image_index.get(filename)
+        image_index.put(_index_record(filename, record and record.get('sha256')))
+        processed += 1
+    return processed
+
+def _index_record(filename, sha256=None):
+    """Build the index record of a stored image
+    
+    Args:
+        filename (str): File name of the original image
+        sha256 (str, optional): SHA-256 of the image, computed if None
+        
+    Returns:
+        dict: Index record without a display order
+    """
+    path = os.path.join(UPLOAD_FOLDER, filename)
+    st = os.stat(path)
+    with open(path, 'rb') as f:
+        if sha256 is None:
+            sha256 = file_sha256(f)
+        width, height = image_dimensions(f)
+    renditions = []
+    for size in IMAGE_RENDITIONS:
+        for fmt in RENDITION_CONTENT_TYPES:
+            name = rendition_filename(filename, size, fmt)
+            try:
+                rendition_st = os.stat(os.path.join(IMAGE_RENDITION_DIR, name))
+            except OSError:
+                continue
+            renditions.append({'size': size, 'format': fmt, 'id': name,
+                               'version': _file_version(rendition_st)})
+    return {
+        'filename': filename,
+        'length': st.st_size,
+        'width': width,
+        'height': height,
+        'upload_date': st.st_mtime,
+        'version': _file_version(st),
+        'sha256': sha256,
+        'renditions': renditions
+    }
+
+def rebuild_image_index():
+    """Rebuild the gallery index from the upload directory
+    
+    Indexed images keep their display order; the others are added oldest
+    first. Records of images that no longer exist are dropped. The index
+    lock is held throughout, so uploads finishing meanwhile are not lost.
+    
+    Returns:
+        int: Number of images indexed
+    """
+    with file_lock(image_index.path):
+        return _rebuild_image_index()
+
+def _rebuild_image_index():
+    """Rebuild the gallery index, see rebuild_image_index"""
+    upload_dir = ensure_upload_dir()
+    records = []
+    for filename in os.listdir(upload_dir):
+        if not allowed_file(filename) or not os.path.isfile(os.path.join(upload_dir, filename)):
+            continue
+        existing = image_index.get(filename)
+        # The hash of an unchanged file is kept rather than recomputed
+        unchanged = existing is not None and existing.get('version') == get_image_version(filename)
+        record = _index_record(filename, existing.get('sha256') if unchanged else None)
+        if existing is not None:
+            record['display_order'] = existing['display_order']
+        records.append(record)
+    records.sort(key=lambda record: (record['upload_date'], record['filename']))
+    
+    next_order = 1
+    for record in records:
+        next_order = max(next_order, record.get('display_order', 0) + 1)
+    for record in records:
+        if 'display_order' not in record:
+            record['display_order'] = next_order
+            next_order += 1
+    image_index.replace(records)
+    return len(records)
+
+def dedup_images(apply=False):
+    """Find images stored more than once and optionally remove the copies
+    
+    Images are compared by the SHA-256 of their content. Of each set of
+    copies the one uploaded first is kept.
+    
+    Args:
+        apply (bool): Delete the copies instead of only reporting them
+        
+    Returns:
+        dict: 'duplicates' (number of copies), 'bytes' (their size with
+            their renditions) and 'groups' (list of (kept file name, list
+            of copy file names))
+    """
+    report = {'duplicates': 0, 'bytes': 0, 'groups': []}
+    _ensure_index()
+    records = sorted(image_index.all(), key=lambda record: record['display_order'])
+    for kept, copies in group_duplicates(records, lambda record: record.get('sha256')):
+        report['groups'].append((kept['filename'], [copy['filename'] for copy in copies]))
+        for copy in copies:
+            paths = [os.path.join(UPLOAD_FOLDER, copy['filename'])] + [
+                os.path.join(IMAGE_RENDITION_DIR, rendition['id'])
+                for rendition in copy.get('renditions', [])
+            ]
+            report['bytes'] += sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+            report['duplicates'] += 1
+            if apply:
+                delete_image(copy['filename'])
+    return report
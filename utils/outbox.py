@@ -0,0 +1,252 @@
+"""
+Write-ahead outbox utilities.
+This module records journal writes made while MongoDB was unavailable in an
+NDJSON file and replays them into MongoDB once it is reachable again.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from flask import current_app
+from utils.file_utils import (
+    ensure_directory_exists, read_json_file, write_json_file,
+    file_lock, sync_file
+)
+
+
+def _log(level, message):
+    """Log through the Flask app logger, or the logging module outside of an app context"""
+    try:
+        getattr(current_app.logger, level)(message)
+    except RuntimeError:
+        getattr(logging, level)(message)
+
+
+class Outbox:
+    """Append-only queue of pending write operations
+
+    Operations are NDJSON lines, ``{"op": "put", "entry": {...}}`` or
+    ``{"op": "del", "id": "..."}``. The offset of the first unreplayed line
+    is kept in a ``<path>.offset`` sidecar; once everything is replayed both
+    files are removed. Operations the target rejects for good are moved to
+    a ``<path>.rejected`` dead-letter file instead of being dropped.
+    """
+
+    def __init__(self, path):
+        """Initialize the outbox
+
+        Args:
+            path (str): Path of the outbox file
+        """
+        self.path = path
+        self.offset_path = path + '.offset'
+        self.rejected_path = path + '.rejected'
+        # Held while replaying, so only one process drains the outbox
+        self.drain_lock_path = path + '.drain'
+
+    def _read_offset(self):
+        """Get the offset of the first unreplayed operation"""
+        data = read_json_file(self.offset_path) if os.path.exists(self.offset_path) else None
+        return data.get('offset', 0) if isinstance(data, dict) else 0
+
+    def append(self, records):
+        """Queue operations
+
+        Args:
+            records (list): Operation records
+
+        Returns:
+            bool: True if the operations were written, False otherwise
+        """
+        try:
+            ensure_directory_exists(os.path.dirname(self.path))
+            data = b''.join(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+                            for record in records)
+            with file_lock(self.path):
+                with open(self.path, 'ab') as f:
+                    f.write(data)
+                    sync_file(f)
+            return True
+        except Exception as e:
+            _log('error', f"Error writing outbox: {e}")
+            return False
+
+    def reject(self, records):
+        """Move operations the target will never accept to the dead-letter file
+
+        Args:
+            records (list): Operation records, each with an added 'error'
+
+        Returns:
+            bool: True if the operations were written, False otherwise
+        """
+        try:
+            ensure_directory_exists(os.path.dirname(self.rejected_path))
+            data = b''.join(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+                            for record in records)
+            with file_lock(self.rejected_path):
+                with open(self.rejected_path, 'ab') as f:
+                    f.write(data)
+                    sync_file(f)
+            return True
+        except Exception as e:
+            _log('error', f"Error writing outbox dead letters: {e}")
+            return False
+
+    def rejected(self):
+        """Count the operations in the dead-letter file
+
+        Returns:
+            int: Number of rejected operations
+        """
+        try:
+            with open(self.rejected_path, 'rb') as f:
+                return sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(65536), b''))
+        except FileNotFoundError:
+            return 0
+
+    def pending(self):
+        """Count the operations waiting to be replayed
+
+        Returns:
+            int: Number of pending operations
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._read_offset())
+                return sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(65536), b''))
+        except FileNotFoundError:
+            return 0
+
+    def read_batch(self, limit):
+        """Read the next pending operations
+
+        Args:
+            limit (int): Maximum number of operations to read
+
+        Returns:
+            tuple: (list of operation records, offset just past the last one)
+        """
+        offset = self._read_offset()
+        records = []
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                while len(records) < limit:
+                    line = f.readline()
+                    # A line without a newline is still being written
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        _log('warning', f"Skipping corrupt outbox record at offset {offset}")
+                    offset += len(line)
+        except FileNotFoundError:
+            pass
+        return records, offset
+
+    def ack(self, offset):
+        """Mark the operations before an offset as replayed
+
+        Args:
+            offset (int): Offset returned by read_batch
+        """
+        with file_lock(self.path):
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                size = 0
+            if offset >= size:
+                # Fully drained; start over with an empty outbox
+                for path in (self.path, self.offset_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+            else:
+                write_json_file(self.offset_path, {'offset': offset})
+
+
+class OutboxReconciler:
+    """Background thread that drains an outbox in batches
+
+    Each batch is handed to a replay function; the outbox only advances
+    past a batch once it returns True. Batches are spaced out so a large
+    backlog does not flood the database.
+    """
+
+    def __init__(self, outbox, replay, can_replay, interval=10, batch_size=100, pause=0.2):
+        """Initialize the reconciler
+
+        Args:
+            outbox (Outbox): Outbox to drain
+            replay (callable): Receives a list of records, returns True on success
+            can_replay (callable): Returns True when the target is reachable
+            interval (float): Seconds between checks for pending operations
+            batch_size (int): Maximum operations per batch
+            pause (float): Seconds to wait between batches
+        """
+        self.outbox = outbox
+        self.replay = replay
+        self.can_replay = can_replay
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._thread = None
+
+    def drain(self):
+        """Replay pending operations until the outbox is empty or a batch fails
+
+        Returns:
+            int: Number of operations replayed, or -1 if another process is
+                already draining the outbox
+        """
+        replayed = 0
+        with file_lock(self.outbox.drain_lock_path, blocking=False) as acquired:
+            if not acquired:
+                return -1
+            while self.can_replay():
+                records, offset = self.outbox.read_batch(self.batch_size)
+                if not records:
+                    # Clears the outbox, or skips corrupt records at its end
+                    self.outbox.ack(offset)
+                    break
+                if not self.replay(records):
+                    break
+                self.outbox.ack(offset)
+                replayed += len(records)
+                time.sleep(self.pause)
+        if replayed:
+            _log('info', f"Replayed {replayed} outbox operations")
+        return replayed
+
+    def _run(self, app):
+        """Thread body: drain the outbox every interval"""
+        while True:
+            time.sleep(self.interval)
+            try:
+                with app.app_context():
+                    if self.outbox.pending():
+                        self.drain()
+            except Exception as e:
+                logging.error(f"Outbox reconciler error: {e}")
+
+    def start(self, app):
+        """Start the background thread if it is not running
+
+        Args:
+            app (Flask): Application whose context the replay runs in
+
+        Returns:
+            bool: True if the thread is running
+        """
+        if self.interval <= 0:
+            return False
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        self._thread = threading.Thread(
+            target=self._run, args=(app,), name='outbox-reconciler', daemon=True
+        )
+        self._thread.start()
+        return True
@@ -0,0 +1,362 @@
+"""
+Full-text search utility functions.
+This module tokenizes journal text (with character bigrams for Chinese) and
+keeps an incremental inverted index for entries in local storage, persisted
+as an append-only log.
+"""
+
+import os
+import re
+import json
+import math
+import logging
+import threading
+from flask import current_app
+from utils.file_utils import ensure_directory_exists, file_lock, sync_file, sync_directory
+
+# Bump when tokenization or the index file layout changes
+INDEX_VERSION = 2
+
+# Characters treated as CJK ideographs
+CJK_CHARS = r'\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+
+# Runs of CJK characters, or runs of other letters/digits
+TOKEN_PATTERN = re.compile(rf'([{CJK_CHARS}]+)|([^\W_{CJK_CHARS}]+)')
+
+# Relative weight of each indexed field
+FIELD_WEIGHTS = {'title': 3, 'author': 2, 'content': 1}
+
+# BM25 ranking parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _log(level, message):
+    """Log through the Flask app logger, or the logging module outside of an app context"""
+    try:
+        getattr(current_app.logger, level)(message)
+    except RuntimeError:
+        getattr(logging, level)(message)
+
+
+def _encode(record):
+    """Encode a record as one NDJSON line"""
+    return json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def tokenize(text):
+    """Split text into search tokens
+
+    Latin words and numbers become lowercase word tokens. Chinese text has
+    no spaces between words, so runs of CJK characters become overlapping
+    character bigrams; a single CJK character stays a token of its own.
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        list: List of tokens in order of appearance
+    """
+    tokens = []
+    for cjk, word in TOKEN_PATTERN.findall(text or ''):
+        if word:
+            tokens.append(word.lower())
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+
+def document_terms(title='', content='', author=''):
+    """Compute the weighted term frequencies of a journal entry
+
+    Args:
+        title (str): Entry title
+        content (str): Entry content
+        author (str): Entry author
+
+    Returns:
+        dict: Mapping of token to weighted frequency
+    """
+    terms = {}
+    for field, text in (('title', title), ('content', content), ('author', author)):
+        weight = FIELD_WEIGHTS[field]
+        for token in tokenize(text):
+            terms[token] = terms.get(token, 0) + weight
+    return terms
+
+
+class SearchIndex:
+    """Inverted index over journal entries, persisted as an append-only log
+
+    The file starts with a ``{"version": ...}`` header line, followed by
+    ``{"op": "put", "id": "...", "terms": {...}}`` and ``{"op": "del",
+    "id": "..."}`` records, so indexing an entry appends the terms of that
+    entry only. Postings are built in memory on load; records appended by
+    other processes are replayed from the last known offset. Compaction
+    rewrites the log as a snapshot of the live documents once enough
+    superseded records pile up.
+    """
+
+    def __init__(self, path, compact_min_dead=100):
+        """Initialize the index; the file is read on first use
+
+        Args:
+            path (str): Path of the index log
+            compact_min_dead (int): Superseded records needed before compacting
+        """
+        self.path = path
+        self.compact_min_dead = compact_min_dead
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self):
+        """Forget the in-memory index"""
+        self._inode = None
+        self._size = 0
+        self._dead = 0
+        # False when the file is missing or has another version's header
+        self._valid = False
+        self._docs = {}
+        self._lengths = {}
+        self._postings = {}
+        self._total_length = 0
+
+    def _refresh(self):
+        """Bring the in-memory index up to date with the log on disk
+
+        A log that was replaced (compacted) or truncated is reloaded, a log
+        that grew is replayed from the last known offset.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if not self._loaded or self._inode is not None:
+                self._reset()
+                self._loaded = True
+            return
+
+        if not self._loaded or st.st_ino != self._inode or st.st_size < self._size:
+            self._load()
+        elif st.st_size > self._size and self._valid:
+            self._replay(self._size)
+
+    def _load(self):
+        """Read the whole log"""
+        self._reset()
+        self._loaded = True
+        with open(self.path, 'rb') as f:
+            self._inode = os.fstat(f.fileno()).st_ino
+            header = f.readline()
+            try:
+                self._valid = (header.endswith(b'\n') and
+                               json.loads(header).get('version') == INDEX_VERSION)
+            except (ValueError, AttributeError):
+                self._valid = False
+            if not self._valid:
+                # Written by another version; searched as empty until rebuilt
+                self._size = os.fstat(f.fileno()).st_size
+                return
+            self._size = len(header)
+        self._replay(self._size)
+
+    def _replay(self, start):
+        """Apply log records from the given offset to the postings"""
+        offset = start
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            for line in f:
+                # A line without a newline is an interrupted write
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    self._apply(json.loads(line))
+                except ValueError:
+                    _log('warning', f"Skipping corrupt search index record at offset {offset}")
+                offset += len(line)
+        self._size = offset
+
+    def _apply(self, record):
+        """Apply a single operation record to the postings"""
+        doc_id = record.get('id')
+        if self._remove(doc_id):
+            self._dead += 1
+        if record.get('op') == 'put':
+            self._add(doc_id, record.get('terms', {}))
+        else:
+            # The delete record itself is also dead weight
+            self._dead += 1
+
+    def _append(self, records):
+        """Append operation records to the log and apply them to the postings
+
+        Must be called with the log's file lock held and the index refreshed.
+        """
+        if not self._valid:
+            # Start a new log rather than appending to another version's
+            for record in records:
+                self._apply(record)
+            self._write_snapshot()
+            return
+
+        with open(self.path, 'ab') as f:
+            # Drop an interrupted write left at the end of the log
+            f.seek(0, os.SEEK_END)
+            if f.tell() != self._size:
+                f.truncate(self._size)
+            for record in records:
+                line = _encode(record)
+                f.write(line)
+                self._apply(record)
+                self._size += len(line)
+            sync_file(f)
+
+        if self._dead >= self.compact_min_dead and self._dead > len(self._docs):
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        """Replace the log with a header and one put record per live document"""
+        ensure_directory_exists(os.path.dirname(self.path))
+        tmp_path = self.path + '.compact'
+        with open(tmp_path, 'wb') as f:
+            f.write(_encode({'version': INDEX_VERSION}))
+            for doc_id, terms in self._docs.items():
+                f.write(_encode({'op': 'put', 'id': doc_id, 'terms': terms}))
+            size = f.tell()
+            sync_file(f, replace=True)
+        os.replace(tmp_path, self.path)
+        sync_directory(os.path.dirname(self.path))
+        if self._dead:
+            _log('info', f"Compacted search index, dropped {self._dead} superseded records")
+        self._inode = os.stat(self.path).st_ino
+        self._size = size
+        self._dead = 0
+        self._valid = True
+
+    def _add(self, doc_id, terms):
+        """Add a document's terms to the in-memory postings"""
+        self._docs[doc_id] = terms
+        self._lengths[doc_id] = sum(terms.values())
+        self._total_length += self._lengths[doc_id]
+        for token, frequency in terms.items():
+            self._postings.setdefault(token, {})[doc_id] = frequency
+
+    def _remove(self, doc_id):
+        """Remove a document's terms from the in-memory postings"""
+        terms = self._docs.pop(doc_id, None)
+        if terms is None:
+            return False
+        self._total_length -= self._lengths.pop(doc_id)
+        for token in terms:
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[token]
+        return True
+
+    def _write(self, records):
+        """Append records under the file lock, logging failures"""
+        with self._lock, file_lock(self.path):
+            try:
+                self._refresh()
+                self._append(records)
+                return True
+            except Exception as e:
+                _log('error', f"Error updating search index: {e}")
+                # Reread the file next time rather than trust a partial update
+                self._loaded = False
+                return False
+
+    def index_entry(self, entry):
+        """Add or replace a journal entry in the index
+
+        Args:
+            entry (dict): Journal entry with id, title, content and author
+
+        Returns:
+            bool: True if the index was saved
+        """
+        return self.index_entries([entry])
+
+    def index_entries(self, entries):
+        """Add or replace several journal entries with one append
+
+        Args:
+            entries (list): Journal entries with id, title, content and author
+
+        Returns:
+            bool: True if the index was saved
+        """
+        if not entries:
+            return True
+        return self._write([{'op': 'put', 'id': entry['id'], 'terms': document_terms(
+            entry.get('title'), entry.get('content'), entry.get('author'))} for entry in entries])
+
+    def remove_entry(self, entry_id):
+        """Remove a journal entry from the index
+
+        Args:
+            entry_id (str): Entry ID
+
+        Returns:
+            bool: True if the index was saved
+        """
+        with self._lock:
+            self._refresh()
+            if entry_id not in self._docs:
+                return True
+        return self._write([{'op': 'del', 'id': entry_id}])
+
+    def rebuild(self, entries):
+        """Replace the index with the given entries
+
+        Args:
+            entries (iterable): Journal entries to index
+
+        Returns:
+            int: Number of entries indexed
+        """
+        with self._lock, file_lock(self.path):
+            self._reset()
+            self._loaded = True
+            for entry in entries:
+                self._add(entry['id'], document_terms(
+                    entry.get('title'), entry.get('content'), entry.get('author')))
+            self._write_snapshot()
+            return len(self._docs)
+
+    def search(self, query, limit=20, offset=0):
+        """Rank indexed entries against a query with BM25
+
+        Args:
+            query (str): Search query
+            limit (int): Maximum number of results to return
+            offset (int): Number of results to skip
+
+        Returns:
+            tuple: (list of (entry_id, score) pairs, total number of matches)
+        """
+        tokens = set(tokenize(query))
+        with self._lock:
+            self._refresh()
+            count = len(self._docs)
+            if not tokens or not count:
+                return [], 0
+
+            average_length = self._total_length / count
+            scores = {}
+            for token in tokens:
+                posting = self._postings.get(token)
+                if not posting:
+                    continue
+                idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, frequency in posting.items():
+                    length = self._lengths[doc_id]
+                    norm = frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0) + idf * frequency * (BM25_K1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        return ranked[offset:offset + limit], len(ranked)
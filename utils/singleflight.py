@@ -0,0 +1,83 @@
+"""
+Request coalescing utilities.
+This module provides a single-flight group, which lets concurrent callers
+loading the same key share one call instead of each making their own.
+"""
+
+import threading
+
+
+class _Call:
+    """A load in progress and its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key
+
+    The first caller for a key runs the load; callers arriving while it is
+    still running wait for it and get its result, or its exception. Nothing
+    is kept once the load finishes, so the next caller loads again; results
+    are shared between threads and must not be modified by the callers.
+    """
+
+    def __init__(self):
+        """Initialize an empty group"""
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """Run a load, or wait for the one already running for the key
+
+        Args:
+            key: Hashable key identifying the load
+            fn (callable): Takes no arguments and returns the result
+
+        Returns:
+            The result of fn, from this call or the one it joined
+
+        Raises:
+            Exception: Whatever fn raised
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.loads += 1
+            else:
+                leader = False
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        """Get coalescing statistics
+
+        Returns:
+            dict: 'loads' (calls that ran), 'shared' (calls that joined a
+                running one) and 'in_flight'
+        """
+        with self._lock:
+            return {'loads': self.loads, 'shared': self.shared, 'in_flight': len(self._calls)}
@@ -0,0 +1,390 @@
+"""
+SQLite journal storage.
+This module stores journal entries in a local SQLite database in WAL mode,
+with indexes on id, timestamp, author and month-day.
+"""
+
+import os
+import json
+import logging
+import sqlite3
+import threading
+from flask import current_app
+from utils.file_utils import ensure_directory_exists
+
+# Bump when the schema changes and add the matching step to _migrate_schema
+SCHEMA_VERSION = 4
+
+# Entry fields stored in their own columns; anything else goes into 'extra'
+ENTRY_COLUMNS = ('id', 'title', 'content', 'author', 'date', 'time', 'timestamp',
+                 'excerpt', 'content_length', 'word_count', 'ymd', 'month_day')
+
+# Columns that listings may be sorted by
+SORT_COLUMNS = {'timestamp', 'title', 'author', 'id'}
+
+
+def _log(level, message):
+    """Log through the Flask app logger, or the logging module outside of an app context"""
+    try:
+        getattr(current_app.logger, level)(message)
+    except RuntimeError:
+        getattr(logging, level)(message)
+
+
+class SQLiteJournalStore:
+    """Journal entry store backed by a SQLite database
+
+    The database runs in WAL mode so several worker processes can read while
+    one of them writes. Each thread gets its own connection.
+    """
+
+    def __init__(self, db_path, migrate_from=None, busy_timeout=5.0):
+        """Initialize the store; the database is opened on first use
+
+        Args:
+            db_path (str): Path of the SQLite database file
+            migrate_from (object, optional): Store whose entries are copied
+                into a newly created database
+            busy_timeout (float): Seconds to wait for another writer's lock
+        """
+        self.db_path = db_path
+        self.migrate_from = migrate_from
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        """Get the connection for the current thread and process"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        ensure_directory_exists(os.path.dirname(self.db_path))
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+
+        with self._schema_lock:
+            if not self._schema_ready:
+                self._migrate_schema(conn)
+                self._schema_ready = True
+        return conn
+
+    def _migrate_schema(self, conn):
+        """Create or upgrade the schema"""
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+            return
+
+        # Take the write lock first so concurrent workers migrate only once
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version < 1:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS entries (
+                        id TEXT NOT NULL,
+                        title TEXT NOT NULL DEFAULT '',
+                        content TEXT NOT NULL DEFAULT '',
+                        author TEXT NOT NULL DEFAULT '',
+                        date TEXT,
+                        time TEXT,
+                        timestamp REAL NOT NULL DEFAULT 0,
+                        extra TEXT
+                    )
+                ''')
+                conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_entries_id ON entries(id)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries(timestamp, id)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_author ON entries(author)')
+
+            if version < 2:
+                # Precomputed list view fields, filled by the backfill command
+                conn.execute('ALTER TABLE entries ADD COLUMN excerpt TEXT')
+                conn.execute('ALTER TABLE entries ADD COLUMN content_length INTEGER')
+                conn.execute('ALTER TABLE entries ADD COLUMN word_count INTEGER')
+
+            if version < 3:
+                # Normalized dates, filled by the backfill command
+                conn.execute('ALTER TABLE entries ADD COLUMN ymd TEXT')
+                conn.execute('ALTER TABLE entries ADD COLUMN month_day TEXT')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_month_day '
+                             'ON entries(month_day, timestamp)')
+
+            if version < 4:
+                # Write counter, bumped in the same transaction as every write
+                conn.execute('CREATE TABLE IF NOT EXISTS meta '
+                             '(key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+                conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+
+            if version < 1 and self.migrate_from is not None:
+                entries = self.migrate_from.all()
+                conn.executemany(self._upsert_sql(), [self._to_row(e) for e in entries])
+                if entries:
+                    _log('info', f"Migrated {len(entries)} journal entries into {self.db_path}")
+
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    @staticmethod
+    def _upsert_sql():
+        """SQL statement that inserts or replaces an entry row"""
+        columns = ENTRY_COLUMNS + ('extra',)
+        return (f"INSERT OR REPLACE INTO entries ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})")
+
+    @staticmethod
+    def _bump_version(conn):
+        """Increment the write counter inside the current transaction"""
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    @staticmethod
+    def _to_row(entry):
+        """Convert an entry dictionary to a row tuple"""
+        extra = {k: v for k, v in entry.items() if k not in ENTRY_COLUMNS}
+        return (
+            str(entry.get('id')),
+            entry.get('title') or '',
+            entry.get('content') or '',
+            entry.get('author') or '',
+            entry.get('date'),
+            entry.get('time'),
+            entry.get('timestamp') or 0,
+            entry.get('excerpt'),
+            entry.get('content_length'),
+            entry.get('word_count'),
+            entry.get('ymd'),
+            entry.get('month_day'),
+            json.dumps(extra, ensure_ascii=False) if extra else None
+        )
+
+    @staticmethod
+    def _from_row(row):
+        """Convert a (possibly partial) row to an entry dictionary"""
+        keys = row.keys()
+        entry = {column: row[column] for column in ENTRY_COLUMNS
+                 if column in keys and row[column] is not None}
+        if 'extra' in keys and row['extra']:
+            entry.update(json.loads(row['extra']))
+        return entry
+
+    def get(self, entry_id):
+        """Get a journal entry by ID
+
+        Args:
+            entry_id (str): Entry ID
+
+        Returns:
+            dict: Journal entry or None if not found
+        """
+        try:
+            row = self._connect().execute(
+                'SELECT * FROM entries WHERE id = ?', (entry_id,)
+            ).fetchone()
+            return self._from_row(row) if row else None
+        except Exception as e:
+            _log('error', f"Error reading journal database: {e}")
+            return None
+
+    def exists(self, entry_id):
+        """Check whether an entry exists
+
+        Args:
+            entry_id (str): Entry ID
+
+        Returns:
+            bool: True if the entry exists
+        """
+        try:
+            row = self._connect().execute(
+                'SELECT 1 FROM entries WHERE id = ?', (entry_id,)
+            ).fetchone()
+            return row is not None
+        except Exception as e:
+            _log('error', f"Error reading journal database: {e}")
+            return False
+
+    def all(self, sort_key='timestamp', sort_desc=True):
+        """Get all journal entries
+
+        Args:
+            sort_key (str): Key to sort by
+            sort_desc (bool): Sort in descending order if True, ascending if False
+
+        Returns:
+            list: List of journal entries as dictionaries
+        """
+        if sort_key not in SORT_COLUMNS:
+            sort_key = 'timestamp'
+        direction = 'DESC' if sort_desc else 'ASC'
+        try:
+            rows = self._connect().execute(
+                f'SELECT * FROM entries ORDER BY {sort_key} {direction}, id {direction}'
+            ).fetchall()
+            return [self._from_row(row) for row in rows]
+        except Exception as e:
+            _log('error', f"Error reading journal database: {e}")
+            return []
+
+    def page(self, sort_desc=True, limit=20, after=None, before=None, fields=None,
+             start=None, end=None):
+        """Get one page of journal entries ordered by (timestamp, id)
+
+        Args:
+            sort_desc (bool): Newest first if True, oldest first if False
+            limit (int): Maximum number of entries to return
+            after (tuple, optional): (timestamp, id) key the page starts after
+            before (tuple, optional): (timestamp, id) key the page ends before
+            fields (tuple, optional): Fields to return, all fields if None
+            start (float, optional): Only entries at or after this timestamp
+            end (float, optional): Only entries before this timestamp
+
+        Returns:
+            list: Up to limit journal entries, in display order
+        """
+        key = after if after is not None else before
+        # Paging backwards walks the index in the opposite direction
+        descending = sort_desc if before is None else not sort_desc
+        direction = 'DESC' if descending else 'ASC'
+        columns = [f for f in fields if f in ENTRY_COLUMNS] if fields else ['*']
+        sql = f"SELECT {', '.join(columns)} FROM entries"
+        conditions = []
+        params = []
+        if key is not None:
+            op = '<' if descending else '>'
+            conditions.append(f'(timestamp {op} ? OR (timestamp = ? AND id {op} ?))')
+            params.extend([key[0], key[0], key[1]])
+        if start is not None:
+            conditions.append('timestamp >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('timestamp < ?')
+            params.append(end)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += f' ORDER BY timestamp {direction}, id {direction} LIMIT ?'
+        params.append(limit)
+        try:
+            rows = self._connect().execute(sql, params).fetchall()
+            entries = [self._from_row(row) for row in rows]
+            if before is not None:
+                entries.reverse()
+            return entries
+        except Exception as e:
+            _log('error', f"Error reading journal database: {e}")
+            return []
+
+    def on_day(self, month_day, fields=None):
+        """Get the entries written on a calendar day of any year, newest first
+
+        Args:
+            month_day (str): Day as 'MM-DD'
+            fields (tuple, optional): Fields to return, all fields if None
+
+        Returns:
+            list: Journal entries whose 'month_day' matches
+        """
+        columns = [f for f in fields if f in ENTRY_COLUMNS] if fields else ['*']
+        try:
+            rows = self._connect().execute(
+                f"SELECT {', '.join(columns)} FROM entries WHERE month_day = ? "
+                f"ORDER BY timestamp DESC, id DESC", (month_day,)
+            ).fetchall()
+            return [self._from_row(row) for row in rows]
+        except Exception as e:
+            _log('error', f"Error reading journal database: {e}")
+            return []
+
+    def version(self):
+        """Get a cheap stamp that changes whenever the database changes
+
+        Every write bumps a counter row in the same transaction, so the stamp
+        does not depend on file times or sizes, which checkpoints can leave
+        unchanged.
+
+        Returns:
+            int: Write counter, or a stamp equal to no other if it cannot be
+                read, so nothing is served from a cache
+        """
+        try:
+            return self._connect().execute(
+                "SELECT value FROM meta WHERE key = 'version'"
+            ).fetchone()[0]
+        except Exception as e:
+            _log('error', f"Error reading journal database: {e}")
+            return object()
+
+    def count(self):
+        """Get the number of journal entries
+
+        Returns:
+            int: Number of entries
+        """
+        try:
+            return self._connect().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        except Exception as e:
+            _log('error', f"Error reading journal database: {e}")
+            return 0
+
+    def put(self, entry):
+        """Insert or replace a journal entry
+
+        Args:
+            entry (dict): Journal entry, must contain an 'id'
+
+        Returns:
+            bool: True if the entry was written, False otherwise
+        """
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(self._upsert_sql(), self._to_row(entry))
+                self._bump_version(conn)
+            return True
+        except Exception as e:
+            _log('error', f"Error writing journal database: {e}")
+            return False
+
+    def put_many(self, entries):
+        """Insert or replace several journal entries in one transaction
+
+        Args:
+            entries (list): Journal entries, each must contain an 'id'
+
+        Returns:
+            bool: True if the entries were written, False otherwise
+        """
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany(self._upsert_sql(), [self._to_row(entry) for entry in entries])
+                self._bump_version(conn)
+            return True
+        except Exception as e:
+            _log('error', f"Error writing journal database: {e}")
+            return False
+
+    def delete(self, entry_id):
+        """Delete a journal entry
+
+        Args:
+            entry_id (str): Entry ID
+
+        Returns:
+            bool: True if the entry existed and was deleted, False otherwise
+        """
+        try:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute('DELETE FROM entries WHERE id = ?', (entry_id,))
+                if cursor.rowcount > 0:
+                    self._bump_version(conn)
+            return cursor.rowcount > 0
+        except Exception as e:
+            _log('error', f"Error writing journal database: {e}")
+            return False